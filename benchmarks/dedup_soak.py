@@ -0,0 +1,71 @@
+"""
+Soak test for the Slack event dedup store: memory must stay flat however many events go through.
+
+Feeds unique event_ids (each delivered twice, like a Slack retry) through a store and samples the
+Python heap (tracemalloc) and the store size at regular intervals, e.g.:
+
+    python -m benchmarks.dedup_soak --backend memory --events 2000000
+    python -m benchmarks.dedup_soak --backend sqlite --events 200000 --ttl 5
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from src.slack.dedup_store import create_dedup_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", default="memory", choices=["memory", "sqlite"])
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--ttl", type=float, default=3600)
+    parser.add_argument("--max-size", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    store = create_dedup_store(args.backend, ttl=args.ttl, max_size=args.max_size,
+                               path=os.path.join(directory, "events.db"), redis_url="")
+
+    tracemalloc.start()
+    interval = max(1, args.events // args.samples)
+    samples = []
+    missed_duplicates = 0
+    started = time.monotonic()
+    for i in range(args.events):
+        event_id = f"Ev{i:012d}"
+        if not store.claim(event_id):
+            print(f"Fresh event {event_id} reported as duplicate", file=sys.stderr)
+            sys.exit(1)
+        # Slack's retry of the same delivery
+        if store.claim(event_id):
+            missed_duplicates += 1
+        if (i + 1) % interval == 0:
+            current, peak = tracemalloc.get_traced_memory()
+            samples.append({
+                "events": i + 1,
+                "heap_kb": round(current / 1024, 1),
+                "store_size": store.stats()["size"],
+                "elapsed_s": round(time.monotonic() - started, 1),
+            })
+
+    # Flat means the second half of the run didn't grow the heap beyond noise
+    half = samples[len(samples) // 2]["heap_kb"]
+    result = {
+        "backend": args.backend,
+        "events": args.events,
+        "claims_per_sec": round(2 * args.events / (time.monotonic() - started)),
+        "missed_duplicates": missed_duplicates,
+        "heap_growth_second_half": round(samples[-1]["heap_kb"] / half, 3) if half else None,
+        "samples": samples,
+        "stats": store.stats(),
+    }
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if missed_duplicates or (half and samples[-1]["heap_kb"] > 1.1 * half) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Throughput of the micro-batching inference wrapper (requests/sec vs max batch size).
+
+Runs on CPU with any small causal LM that ships a chat template, e.g.:
+
+    python -m benchmarks.inference_batching --model <path-or-hub-name> --requests 32 --batch-sizes 1 4 8
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from src.commands.command_generation import generate_cot
+from src.model.batching import BatchedGenerator
+
+INTENTS = [
+    "list pods in staging",
+    "scale deployment api to 3 replicas in staging",
+    "describe service web in staging",
+    "restart the deployment worker in staging",
+    "create namespace review-42",
+    "show the rollout status of deployment api in staging",
+]
+
+
+def run(model, tokenizer, batch_size: int, requests: int, max_wait: float) -> dict:
+    batched = BatchedGenerator(model, max_batch_size=batch_size, max_wait=max_wait)
+    intents = [INTENTS[i % len(INTENTS)] for i in range(requests)]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        list(pool.map(lambda intent: generate_cot(intent, batched, tokenizer), intents))
+    elapsed = time.monotonic() - started
+
+    stats = batched.stats()
+    return {
+        "max_batch_size": batch_size,
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 3),
+        "avg_batch_size": round(stats["avg_batch_size"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--max-wait", type=float, default=0.05)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model).to("cpu")
+    model.eval()
+
+    results = [run(model, tokenizer, size, args.requests, args.max_wait) for size in args.batch_sizes]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
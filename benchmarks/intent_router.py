@@ -0,0 +1,123 @@
+"""
+Hit rate, accuracy and latency of the intent router's template fast path against the model, on a labelled
+corpus of Slack messages (each with the commands the router should produce, or null when the message should
+fall back to the model). The resource index is seeded with a small fixed cluster, e.g.:
+
+    python -m benchmarks.intent_router
+    python -m benchmarks.intent_router --model <path-or-hub-name> --backend cpu-fp32   # also time the model path
+
+The routed path is timed up to OPA-approved commands (routing plus the local policy engine); with --model
+the two-pass model path (CoT, then commands, then the same policy check) is timed on every message.
+"""
+import argparse
+import json
+import time
+from src.commands.resource_index import ResourceIndex
+from src.intent_processing.intent_router import IntentRouter
+from src.opa.policy_engine import PolicyEngine
+
+CORPUS = "benchmarks/data/routing_intents.jsonl"
+
+# kind -> namespace -> names the index knows before the replay
+KNOWN_RESOURCES = {
+    "pods": {"staging": ["web-0", "web-1", "api-7d9f8-x2kq", "worker-5c6d7-abcde"]},
+    "deployments": {"staging": ["api", "worker", "web"], "production": ["api", "web"], "qa": ["web-canary"]},
+}
+
+
+def _percentiles(durations: list) -> dict:
+    if not durations:
+        return None
+    ordered = sorted(durations)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(1000 * pick(0.50), 3),
+        "p95_ms": round(1000 * pick(0.95), 3),
+        "p99_ms": round(1000 * pick(0.99), 3),
+    }
+
+
+def _model_path(args):
+    from src.commands.command_generation import LocalGenerator
+    from src.model import model_loader
+    model, tokenizer = model_loader.load_model(backend=args.backend, base_model_name=args.model,
+                                               adapter_path=args.adapter, merged_path="")
+    generator = LocalGenerator(model, tokenizer)
+
+    def plan(text: str) -> list:
+        return generator.generate_commands(generator.generate_cot(text))
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--policy", default="policy.rego")
+    parser.add_argument("--threshold", type=float, default=0.75, help="intentRouterThreshold")
+    parser.add_argument("--iterations", type=int, default=200, help="Routing passes over the corpus for timing")
+    parser.add_argument("--model", default=None, help="Also time the model path with this model")
+    parser.add_argument("--adapter", default=None)
+    parser.add_argument("--backend", default="cpu-fp32")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    index = ResourceIndex()
+    for kind, namespaces in KNOWN_RESOURCES.items():
+        for namespace, names in namespaces.items():
+            for name in names:
+                index.add(kind, name, namespace)
+    router = IntentRouter(index, threshold=args.threshold)
+    engine = PolicyEngine.from_file(args.policy)
+
+    outcomes = {"correct": [], "wrong": [], "false_route": [], "missed": [], "fallback": []}
+    for entry in corpus:
+        routed = router.route(entry["text"])
+        expected = entry["expected"]
+        if routed is None:
+            outcome = "missed" if expected else "fallback"
+        elif expected is None:
+            outcome = "false_route"
+        else:
+            outcome = "correct" if routed.commands == expected else "wrong"
+        outcomes[outcome].append({"text": entry["text"], "expected": expected,
+                                  "routed": routed.to_dict() if routed else None})
+
+    routed_latencies = []
+    for _ in range(args.iterations):
+        for entry in corpus:
+            started = time.perf_counter()
+            routed = router.route(entry["text"])
+            if routed is not None:
+                engine.evaluate_all(routed.commands)
+                routed_latencies.append(time.perf_counter() - started)
+
+    routed_count = len(outcomes["correct"]) + len(outcomes["wrong"]) + len(outcomes["false_route"])
+    report = {
+        "messages": len(corpus),
+        "routed": routed_count,
+        "hit_rate": round(routed_count / len(corpus), 3),
+        "routable": sum(1 for entry in corpus if entry["expected"]),
+        "accuracy": round(len(outcomes["correct"]) / routed_count, 3) if routed_count else None,
+        "counts": {outcome: len(entries) for outcome, entries in outcomes.items()},
+        "routed_latency": _percentiles(routed_latencies),
+        "errors": outcomes["wrong"] + outcomes["false_route"] + outcomes["missed"],
+    }
+
+    if args.model:
+        plan = _model_path(args)
+        model_latencies = []
+        for entry in corpus:
+            started = time.perf_counter()
+            engine.evaluate_all(plan(entry["text"]))
+            model_latencies.append(time.perf_counter() - started)
+        report["model_latency"] = _percentiles(model_latencies)
+        if routed_latencies:
+            report["speedup_p50"] = round(report["model_latency"]["p50_ms"] / max(report["routed_latency"]["p50_ms"], 1e-6), 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Decode throughput (tokens/sec) and peak RSS per model backend.
+
+Each backend is measured in a fresh subprocess so peak RSS isn't shared between runs.
+Runs on CPU with a small stand-in model, e.g.:
+
+    python -m benchmarks.model_backends --model <path-or-hub-name> --backends cpu-fp32 cpu-int8
+    python -m benchmarks.model_backends --model <base> --adapter model --backends cpu-fp32 cpu-int8
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+PROMPT = "List the pods in the staging namespace and describe the api deployment."
+
+
+def measure(args) -> dict:
+    from src.model.model_loader import load_model
+
+    started = time.monotonic()
+    model, tokenizer = load_model(
+        backend=args.backend,
+        base_model_name=args.model,
+        adapter_path=args.adapter,
+        merged_path=""
+    )
+    load_seconds = time.monotonic() - started
+
+    inputs = tokenizer(PROMPT, return_tensors="pt").to(model.device)
+    generate = dict(max_new_tokens=args.tokens, min_new_tokens=args.tokens, do_sample=False,
+                    pad_token_id=tokenizer.eos_token_id)
+    model.generate(**inputs, max_new_tokens=2, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+
+    started = time.monotonic()
+    for _ in range(args.runs):
+        model.generate(**inputs, **generate)
+    elapsed = time.monotonic() - started
+
+    return {
+        "backend": args.backend,
+        "load_seconds": round(load_seconds, 2),
+        "tokens_per_sec": round(args.tokens * args.runs / elapsed, 2),
+        # ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--adapter", default=None)
+    parser.add_argument("--backends", nargs="+", default=["cpu-fp32", "cpu-int8"])
+    parser.add_argument("--backend", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(measure(args)))
+        return
+
+    results = []
+    for backend in args.backends:
+        command = [sys.executable, "-m", "benchmarks.model_backends", "--model", args.model,
+                   "--backend", backend, "--tokens", str(args.tokens), "--runs", str(args.runs)]
+        if args.adapter:
+            command += ["--adapter", args.adapter]
+        output = subprocess.run(command, capture_output=True, text=True)
+        if output.returncode != 0:
+            results.append({"backend": backend, "error": output.stderr.strip().splitlines()[-1:]})
+            continue
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Parity and latency of the in-process policy engine against the OPA server.
+
+    python -m benchmarks.policy_parity                      # local engine only
+    python -m benchmarks.policy_parity --opa-url http://localhost:8181
+"""
+import argparse
+import json
+import time
+import requests
+from src.opa.policy_engine import PolicyEngine
+
+CORPUS = [
+    "kubectl get pods",
+    "kubectl get pods -n staging",
+    "kubectl get pods --namespace=staging",
+    "kubectl get pods -A",
+    "kubectl get svc web -n staging",
+    "kubectl describe deployment api --namespace=staging",
+    "kubectl scale deployment api --replicas=3 -n staging",
+    "kubectl rollout restart deployment/worker -n staging",
+    "kubectl rollout status deployment api --namespace=staging",
+    "kubectl create namespace review-42",
+    "kubectl create namespace <name>",
+    "KUBECTL DELETE pod web-1 -n staging",
+    "kubectl delete namespace staging",
+    "kubectl delete pod web-1",
+    "kubectl get pods <pod-name> -n staging",
+    "kubectl logs <pod> --namespace=staging",
+    "kubectl apply -f deployment.yaml",
+    "kubectl apply -f deployment.yaml -n staging",
+    "kubectl get deployments -nstaging",
+    "kubectl get events --namespace=",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--policy", default="policy.rego")
+    parser.add_argument("--opa-url", default=None)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = PolicyEngine.from_file(args.policy)
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        local = engine.evaluate_all(CORPUS)
+    local_us = (time.perf_counter() - started) / (args.iterations * len(CORPUS)) * 1e6
+
+    report = {"commands": len(CORPUS), "local_us_per_command": round(local_us, 2)}
+
+    if args.opa_url:
+        session = requests.Session()
+        url = args.opa_url.rstrip("/") + "/v1/data/k8s/allow"
+        mismatches = []
+        started = time.perf_counter()
+        for command, (local_allowed, local_reason) in zip(CORPUS, local):
+            result = session.post(url, json={"input": {"command": command}}, timeout=5).json().get("result", {})
+            deny_list = result.get("deny", [])
+            remote = (bool(result.get("allow", True)) and not deny_list, "; ".join(deny_list))
+            if remote != (local_allowed, local_reason):
+                mismatches.append({"command": command, "opa": remote, "local": (local_allowed, local_reason)})
+        remote_us = (time.perf_counter() - started) / len(CORPUS) * 1e6
+        report.update({
+            "remote_us_per_command": round(remote_us, 2),
+            "speedup": round(remote_us / local_us, 1),
+            "mismatches": mismatches,
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Prompt-prefix cache: greedy-decoding parity with the uncached path, and prefill latency with/without it.
+
+Every intent is generated twice with greedy decoding, once prefilling the full prompt and once
+reusing the cached system-prompt key/values; the token ids must be identical. Prefill latency is
+measured as the time to produce the first token. Runs on CPU with a small stand-in model, e.g.:
+
+    python -m benchmarks.prefix_cache --model <path-or-hub-name> --backend cpu-fp32
+"""
+import argparse
+import json
+import sys
+import time
+import torch
+from src.commands.command_generation import _cot_messages
+from src.model.prefix_cache import PrefixCache
+
+INTENTS = [
+    "List the pods in the staging namespace",
+    "Scale the api deployment to 3 replicas in staging",
+    "Restart the worker deployment and show its rollout status",
+    "Create a namespace called payments",
+]
+
+
+def time_first_token(model, inputs, pad_token_id: int, extra, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        started = time.monotonic()
+        model.generate(inputs, max_new_tokens=1, do_sample=False, pad_token_id=pad_token_id, **extra())
+        best = min(best, time.monotonic() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--adapter", default=None)
+    parser.add_argument("--backend", default="cpu-fp32")
+    parser.add_argument("--tokens", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    from src.model.model_loader import load_model
+    model, tokenizer = load_model(backend=args.backend, base_model_name=args.model,
+                                  adapter_path=args.adapter, merged_path="")
+    cache = PrefixCache(model, tokenizer)
+
+    mismatches = []
+    uncached, cached = [], []
+    for intent in INTENTS:
+        messages = _cot_messages(intent)
+        inputs = tokenizer.apply_chat_template(messages, return_tensors="pt", add_generation_prompt=True).to(model.device)
+        greedy = dict(max_new_tokens=args.tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        with torch.no_grad():
+            expected = model.generate(inputs, **greedy)
+            actual = model.generate(inputs, **greedy, **cache.generation_kwargs(messages[0], inputs))
+            if not torch.equal(expected, actual):
+                mismatches.append(intent)
+            uncached.append(time_first_token(model, inputs, tokenizer.eos_token_id, lambda: {}, args.runs))
+            cached.append(time_first_token(model, inputs, tokenizer.eos_token_id,
+                                           lambda: cache.generation_kwargs(messages[0], inputs), args.runs))
+
+    result = {
+        "backend": args.backend,
+        "greedy_parity": not mismatches,
+        "mismatches": mismatches,
+        "prefill_ms_uncached": round(1000 * sum(uncached) / len(uncached), 2),
+        "prefill_ms_cached": round(1000 * sum(cached) / len(cached), 2),
+        "cache": cache.stats(),
+    }
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
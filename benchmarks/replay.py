@@ -0,0 +1,338 @@
+"""
+Replays recorded Slack events through handle_message_event and reports per-stage latency percentiles,
+throughput and peak memory as JSON, for comparing the full pipeline between commits.
+
+Everything outside the bot is stubbed: the model (canned answers recorded with the events, or a small
+CPU model), OPA (the local rules of policy.rego), kubectl (a fake on PATH) and the Slack WebClient behind slack_delivery.
+Stage latencies come from the pipeline's own trace spans, e.g.:
+
+    python -m benchmarks.replay --concurrency 4 --repeat 10 --output before.json
+    python -m benchmarks.replay --concurrency 4 --repeat 10 --compare before.json
+    python -m benchmarks.replay --model <path-or-hub-name> --backend cpu-fp32 --repeat 1
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CORPUS = "benchmarks/data/slack_events.jsonl"
+
+FAKE_KUBECTL = """#!{python}
+import os, sys, time
+time.sleep(float(os.environ.get("FAKE_KUBECTL_DELAY", "0")))
+args = sys.argv[1:]
+if any(arg.startswith("missing") for arg in args):
+    sys.stderr.write('error: "%s" not found\\n' % next(arg for arg in args if arg.startswith("missing")))
+    sys.exit(1)
+verb = args[0] if args else ""
+if verb in ("get", "describe", "logs"):
+    print("NAME       READY   STATUS    RESTARTS   AGE")
+    for i in range(int(os.environ.get("FAKE_KUBECTL_ROWS", "5"))):
+        print("web-%d      1/1     Running   0          %dd" % (i, i + 1))
+elif verb == "rollout":
+    print("deployment successfully rolled out")
+else:
+    print("%s done" % " ".join(args[:3]))
+"""
+
+
+class FakeWebClient:
+    """
+    Stands in for slack.WebClient (and for requests, to the file upload URL): every call takes `delay` seconds
+    and succeeds.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = {"chat_postMessage": 0, "chat_update": 0, "files.getUploadURLExternal": 0,
+                      "files.completeUploadExternal": 0, "upload_url": 0}
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _call(self, method: str) -> dict:
+        time.sleep(self.delay)
+        with self._lock:
+            self.calls[method] += 1
+        return {"ok": True, "ts": f"{time.time():.6f}"}
+
+    def chat_postMessage(self, channel: str, text: str, **kwargs) -> dict:
+        if "busy right now" in text:
+            with self._lock:
+                self.rejected += 1
+        return self._call("chat_postMessage")
+
+    def chat_update(self, channel: str, ts: str, text: str, **kwargs) -> dict:
+        return self._call("chat_update")
+
+    def api_call(self, api_method: str, **kwargs) -> dict:
+        return dict(self._call(api_method), upload_url="https://files.slack.invalid/upload", file_id="F0")
+
+    def post(self, url: str, data: bytes, **kwargs):
+        """
+        Stands in for requests.post to the upload URL.
+        """
+        self._call("upload_url")
+        return self
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class CannedGenerator:
+    """
+    Answers each intent with the CoT and commands recorded next to its event, after `delay` seconds per
+    generation. Records the same span names as the real generation functions.
+    """
+
+    def __init__(self, answers: dict, delay: float = 0.0):
+        self.answers = answers
+        self.delay = delay
+
+    def _answer(self, text: str) -> dict:
+        return self.answers.get(text, {"cot": "Step 1: Nothing recorded for this intent.", "commands": []})
+
+    def _generate(self, name: str, value):
+        from src.tracing.tracing import span
+        with span(name, canned=True):
+            time.sleep(self.delay)
+        return value
+
+    def generate_cot(self, instruction: str) -> str:
+        return self._generate("generate_cot", self._answer(instruction)["cot"])
+
+    def generate_cot_stream(self, instruction: str):
+        cot = self.generate_cot(instruction)
+        lines = cot.splitlines(keepends=True)
+        for i in range(1, len(lines) + 1):
+            yield "".join(lines[:i])
+
+    def generate_plan_stream(self, instruction: str):
+        answer = self._answer(instruction)
+        yield "steps", self._generate("generate_plan", answer["cot"]).splitlines()
+        yield "commands", answer["commands"]
+
+    def generate_commands(self, cot: str) -> list:
+        answer = next((answer for answer in self.answers.values() if answer["cot"] == cot), {"commands": []})
+        return self._generate("generate_commands", answer["commands"])
+
+    def refine_commands(self, intent: str, previous_commands: list, error_message: str,
+                        succeeded_commands: list = None) -> list:
+        return self._generate("refine_commands", self._answer(intent).get("refined_commands", []))
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _summary(durations: list) -> dict:
+    return {
+        "count": len(durations),
+        "p50_ms": round(1000 * _percentile(durations, 0.50), 2),
+        "p95_ms": round(1000 * _percentile(durations, 0.95), 2),
+        "p99_ms": round(1000 * _percentile(durations, 0.99), 2),
+        "mean_ms": round(1000 * sum(durations) / len(durations), 2),
+    }
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def _configure_environment(args, workdir: str) -> None:
+    """
+    The bot reads its settings from the environment at import, so this runs before any src import.
+    """
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir)
+    kubectl = os.path.join(bin_dir, "kubectl")
+    with open(kubectl, "w") as f:
+        f.write(FAKE_KUBECTL.replace("{python}", sys.executable))
+    os.chmod(kubectl, 0o755)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    os.environ["FAKE_KUBECTL_DELAY"] = str(args.kubectl_delay)
+    os.environ["FAKE_KUBECTL_ROWS"] = str(args.kubectl_rows)
+
+    os.environ.update({
+        "signToken": os.environ.get("signToken") or "benchmark",
+        "slackToken": os.environ.get("slackToken") or "xoxb-benchmark",
+        "slackWorkers": str(args.concurrency),
+        "slackQueueSize": str(args.queue_size),
+        "slackUpdateInterval": str(args.update_interval),
+        "slackChannelRate": str(args.slack_rate),
+        "policyMode": "local",
+        "intentRouterEnabled": "false" if args.no_router else "true",
+        "executionBackend": "subprocess",
+        "resourceWatch": "false",
+        "dedupBackend": "memory",
+        "responseCacheEnabled": "true" if args.response_cache else "false",
+        "responseCachePath": "",
+        "structuredGeneration": "true" if args.structured else "false",
+        "modelServerUrls": "",
+        "logDir": os.path.join(workdir, "logs"),
+        "logLevel": args.log_level,
+        "traceExportPath": "",
+        "traceBufferSize": "1000000",
+    })
+
+
+def _compare(result: dict, baseline: dict) -> dict:
+    """
+    Relative change against an earlier run (positive = slower / more).
+    """
+    def change(new, old):
+        return round((new - old) / old, 3) if old else None
+
+    stages = {}
+    for name, summary in result["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before:
+            stages[name] = {key: change(summary[key], before[key]) for key in ("p50_ms", "p95_ms", "p99_ms")}
+    return {
+        "baseline_commit": baseline.get("commit"),
+        "requests_per_sec": change(result["requests_per_sec"], baseline.get("requests_per_sec", 0)),
+        "peak_rss_mb": change(result["peak_rss_mb"] or 0, baseline.get("peak_rss_mb") or 0),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=5, help="Times the corpus is replayed (fresh event_ids each time)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Event queue workers (slackWorkers)")
+    parser.add_argument("--queue-size", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=0, help="Events per second (0 = all at once)")
+    parser.add_argument("--model", default="canned", help="'canned' or a model path/hub name")
+    parser.add_argument("--adapter", default=None)
+    parser.add_argument("--backend", default="cpu-fp32")
+    parser.add_argument("--model-delay", type=float, default=0.2, help="Seconds per canned generation")
+    parser.add_argument("--kubectl-delay", type=float, default=0.05)
+    parser.add_argument("--kubectl-rows", type=int, default=5, help="Rows the fake kubectl prints for get/describe/logs")
+    parser.add_argument("--slack-delay", type=float, default=0.05)
+    parser.add_argument("--slack-rate", type=float, default=1.0, help="Slack calls per second per channel (slackChannelRate)")
+    parser.add_argument("--update-interval", type=float, default=0.0, help="slackUpdateInterval")
+    parser.add_argument("--structured", action="store_true")
+    parser.add_argument("--response-cache", action="store_true")
+    parser.add_argument("--no-router", action="store_true", help="Send every message to the model (intentRouterEnabled=false)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="Earlier --output file to compare against")
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    workdir = tempfile.mkdtemp(prefix="kubecom-replay-")
+    _configure_environment(args, workdir)
+
+    from src.model import model_loader
+    from src.model.batching import wrap_model
+    from src.slack import slack_handler
+    from src.slack.slack_delivery import slack_delivery
+    from src.tracing.tracing import recent_traces
+
+    slack = FakeWebClient(args.slack_delay)
+    slack_delivery.client = slack
+    slack_delivery.http = slack
+    if args.model == "canned":
+        answers = {entry["payload"]["event"]["text"]: entry["canned"] for entry in corpus}
+        model_loader.use_model(CannedGenerator(answers, args.model_delay))
+    else:
+        model, tokenizer = model_loader.load_model(backend=args.backend, base_model_name=args.model,
+                                                   adapter_path=args.adapter, merged_path="")
+        model_loader.use_model(wrap_model(model), tokenizer)
+    slack_handler.event_queue.start()
+
+    events = []
+    for run in range(args.repeat):
+        for entry in corpus:
+            payload = json.loads(json.dumps(entry["payload"]))
+            payload["event_id"] = f"{payload['event_id']}-{run}"
+            events.append(payload)
+
+    rss_before = _peak_rss_mb()
+    started = time.monotonic()
+    # The executor prints every command's output; keep stdout for the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i, payload in enumerate(events):
+            if args.rate:
+                time.sleep(max(0.0, started + i / args.rate - time.monotonic()))
+            slack_handler.handle_message_event(payload)
+        expected = len(events)
+        while len(recent_traces(expected)) + slack.rejected < expected:
+            if time.monotonic() - started > args.timeout:
+                break
+            time.sleep(0.01)
+            if len(recent_traces(expected)) + slack_handler.event_queue.depth() >= expected:
+                # Busy replies are only counted once they are sent
+                slack_delivery.flush(timeout=args.timeout)
+    elapsed = time.monotonic() - started
+    # Slack calls still queued when the last pipeline finished
+    slack_delivery.flush(timeout=args.timeout)
+    drained = time.monotonic() - started
+
+    traces = recent_traces(expected)
+    stages = {}
+    end_to_end = []
+    for trace in traces:
+        queue_wait = 0.0
+        for recorded in trace["spans"]:
+            stages.setdefault(recorded["name"], []).append(recorded["duration"])
+            if recorded["name"] == "queue_wait":
+                queue_wait = recorded["duration"]
+        stages.setdefault("pipeline", []).append(trace["duration"])
+        end_to_end.append(queue_wait + trace["duration"])
+
+    result = {
+        "commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "events": len(events),
+        "completed": len(traces),
+        "rejected": slack.rejected,
+        "routed": sum(1 for trace in traces if trace["attributes"].get("routed_intent")),
+        "errors": sum(1 for trace in traces for recorded in trace["spans"] if recorded.get("error")),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(traces) / elapsed, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_before_replay_mb": rss_before,
+        "slack_calls": slack.calls,
+        "slack_delivery": dict(slack_delivery.stats(), drained_seconds=round(drained, 3)),
+        "end_to_end": _summary(end_to_end) if end_to_end else None,
+        "stages": {name: _summary(durations) for name, durations in sorted(stages.items())},
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = _compare(result, json.load(f))
+
+    report = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    print(report)
+    slack_handler.event_queue.stop(timeout=5)
+    slack_delivery.stop(timeout=5)
+    sys.exit(0 if len(traces) + slack.rejected == len(events) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Command generation latency and tokens/sec per speculative decoding mode, on recorded intents.
+
+Modes:
+    baseline       plain decoding without the kubectl stop criterion (the previous path)
+    off            plain decoding with the stop criterion
+    prompt-lookup  n-gram drafts copied from the prompt/CoT
+    draft          a small draft model (--draft-model, must share the tokenizer)
+
+Each recorded intent carries the CoT it was answered with, so every mode generates commands
+from the same prompt. Runs on CPU with a small stand-in model, e.g.:
+
+    python -m benchmarks.speculative_decoding --model <path-or-hub-name> --draft-model <small-model>
+"""
+import argparse
+import json
+import statistics
+import time
+import torch
+from src.commands import command_generation
+from src.model import model_loader
+
+CORPUS = "benchmarks/data/recorded_intents.jsonl"
+
+
+class CountingModel:
+    """
+    Counts generated tokens; `strip_stop` drops the stop criterion to reproduce the previous path.
+    """
+
+    def __init__(self, model, strip_stop: bool = False):
+        self.model = model
+        self.strip_stop = strip_stop
+        self.tokens = 0
+
+    def __getattr__(self, name):
+        # device, modules() etc. come from the wrapped model
+        return getattr(self.model, name)
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+    def generate(self, inputs, **kwargs):
+        if self.strip_stop:
+            kwargs.pop("stopping_criteria", None)
+        outputs = self.model.generate(inputs, **kwargs)
+        self.tokens += outputs.shape[1] - inputs.shape[1]
+        return outputs
+
+
+def run_mode(mode: str, model, tokenizer, corpus: list, runs: int) -> dict:
+    counting = CountingModel(model, strip_stop=mode == "baseline")
+    speculative = "off" if mode == "baseline" else mode
+    latencies = []
+    commands = []
+    started = time.monotonic()
+    for run in range(runs):
+        for i, entry in enumerate(corpus):
+            torch.manual_seed(run * len(corpus) + i)
+            call_started = time.monotonic()
+            result = command_generation.generate_commands(entry["cot"], counting, tokenizer, speculative=speculative)
+            latencies.append(time.monotonic() - call_started)
+            if run == 0:
+                commands.append(result)
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        "mode": mode,
+        "tokens_per_sec": round(counting.tokens / elapsed, 2),
+        "generated_tokens": counting.tokens,
+        "latency_ms_mean": round(1000 * statistics.mean(latencies), 1),
+        "latency_ms_p50": round(1000 * latencies[len(latencies) // 2], 1),
+        "latency_ms_p95": round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        "commands": commands,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--adapter", default=None)
+    parser.add_argument("--backend", default="cpu-fp32")
+    parser.add_argument("--draft-model", default=None)
+    parser.add_argument("--modes", nargs="+", default=None)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--runs", type=int, default=2)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    model, tokenizer = model_loader.load_model(backend=args.backend, base_model_name=args.model,
+                                               adapter_path=args.adapter, merged_path="")
+    modes = args.modes or ["baseline", "off", "prompt-lookup"] + (["draft"] if args.draft_model else [])
+    if "draft" in modes:
+        model_loader.get_draft_model(name=args.draft_model or model_loader.DRAFT_MODEL_NAME, backend=args.backend)
+
+    results = [run_mode(mode, model, tokenizer, corpus, args.runs) for mode in modes]
+    baseline = results[0]["commands"]
+    for result in results:
+        # Share of intents whose commands match the first mode's (sampling makes some drift expected)
+        same = sum(a == b for a, b in zip(result.pop("commands"), baseline))
+        result["commands_agreement"] = round(same / len(baseline), 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,28 @@
 import os
 from pathlib import Path
 import atexit
+import threading
 from dotenv import load_dotenv
 from src.slack.slack_handler import start_slack_bot
+from src.intent_processing.message_processor import start_model
+from src.model.model_loader import wait_for_model
 from src.lifecycle.lifecycle import send_readiness_message, send_shutdown_message
 
 env_path = Path('.') / '.env'
 load_dotenv(dotenv_path=env_path)
 
+def announce_when_ready():
+    # Only report online once the model can actually answer
+    if wait_for_model():
+        send_readiness_message()
+
 # Start the Slack bot
 if __name__ == "__main__":
+    # Load the model in the background so the HTTP server (and /health, /ready) comes up right away
+    start_model()
+
     # Readiness Message
-    send_readiness_message()
+    threading.Thread(target=announce_when_ready, name="readiness-message", daemon=True).start()
     
     # Shutdown Message
     atexit.register(send_shutdown_message)
@@ -23,3 +23,9 @@ deny contains msg if {
     regex.match("(?i).*<[^>]+>.*", input.command)
     msg := "Command contains placeholder values. Please replace with actual resource names."
 }
+
+# Decisions for a batch of commands in one query: input.commands -> {command: [deny messages]}
+decisions[cmd] := msgs if {
+    some cmd in input.commands
+    msgs := deny with input as {"command": cmd}
+}
@@ -1,107 +1,332 @@
 import subprocess
 import os
+import threading
 import time
 import re
-from datetime import datetime
+from src.config.config import (
+    EXECUTION_MODE,
+    EXECUTION_WORKERS,
+    READINESS_TIMEOUT,
+    EXECUTION_BACKEND,
+    RESOURCE_WATCH,
+    NAME_RESOLUTION_THRESHOLD,
+    KUBECTL_OUTPUT_LIMIT,
+    LOG_DIR
+)
+from src.config.logging_config import add_file_logger
+from src.commands.execution_planner import execute_plan, build_plan, classify_command
+from src.commands.k8s_api import get_api_backend, current_namespace
+from src.commands.resource_index import ResourceIndex, ResourceWatcher
+from src.commands.name_resolver import resolve_command
+from src.tracing.tracing import span
 
-LOG_DIR = "logs"
-LOG_FILE = os.path.join(LOG_DIR, "cluster_execution.log")
-
-os.makedirs(LOG_DIR, exist_ok=True)
+# Full outputs of large commands are offloaded by the logging writer thread, see OutputOffloadFilter
+execution_logger = add_file_logger("ClusterExecution", os.path.join(LOG_DIR, "cluster_execution.log"),
+                                   offload_outputs=True)
 
 def log(command: str, output: str, success: bool = True) -> None:
     status = "SUCCESS" if success else "FAILED"
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, "a") as f:
-        f.write(f"[{timestamp}] [{status}] Executed: {command}\n")
-        f.write(f"{output}\n{'-' * 50}\n")
+    execution_logger.info(f"[{status}] Executed: {command}", extra={"command": command, "success": success, "output": output})
 
-known_resources = {
-    "services": set(),
-    "pods": set(),
-    "deployments": set()
-}
+# Known resource names per kind and namespace, kept warm by the resource watch when it runs
+# and otherwise learned from `kubectl get` output
+resource_index = ResourceIndex()
 
-def parse_resource_names(command: str, output: str) -> None:
+def start_resource_watch() -> None:
+    """
+    Starts list+watch of pods, services and deployments into resource_index
+    (requires the Kubernetes API backend).
+    """
+    backend = get_api_backend(EXECUTION_WORKERS, READINESS_TIMEOUT) if RESOURCE_WATCH else None
+    if backend is None:
+        return
+    # Watches hold their connections open, so they get their own pool
+    api_client = type(backend.api_client)(backend.api_client.configuration)
+    ResourceWatcher(resource_index, api_client).start()
 
-    lower_cmd = command.lower()
-    if "kubectl get" in lower_cmd:
-        if "svc" in lower_cmd or "services" in lower_cmd:
-            resource_type = "services"
-        elif "pods" in lower_cmd:
-            resource_type = "pods"
-        elif "deployments" in lower_cmd:
-            resource_type = "deployments"
-        else:
+class ResourceNameParser:
+    """
+    Learns resource names from `kubectl get` output line by line, as it is read from the subprocess,
+    so listings too big to keep in memory still reach the index. Names listed without -n are recorded
+    under the namespace of the active kubeconfig context, as that's where kubectl listed them.
+    """
+
+    def __init__(self, command: str):
+        self.command = command
+        self.info = classify_command(command)
+        self.active = self.info.verb == "get" and self.info.kind is not None
+        self.all_namespaces = False
+        self.items = []
+        self.empty = False
+        self._header_seen = False
+
+    def feed(self, line: str) -> None:
+        if not self.active:
+            return
+        if not self._header_seen:
+            # Printed on stdout by the API backend, on stderr by kubectl (see finish)
+            self.empty = line.startswith("No resources found")
+            if not line.startswith(("NAME", "NAMESPACE")):
+                self.active = False
+                return
+            # `kubectl get -A` prints the namespace before the name
+            self.all_namespaces = line.startswith("NAMESPACE")
+            self._header_seen = True
             return
+        parts = line.split()
+        if self.all_namespaces and len(parts) > 1:
+            self.items.append((parts[0], parts[1]))
+        elif parts and not self.all_namespaces:
+            self.items.append((None, parts[0].strip()))
 
-        lines = output.splitlines()
-        
-        # Find the line that starts with 'NAME' or so
-        if len(lines) > 1:
-            for line in lines[1:]:
-                parts = line.split()
-                if parts:
-                    resource_name = parts[0].strip()
-                    known_resources[resource_type].add(resource_name)
+    def finish(self, stderr: str = "") -> None:
+        info = self.info
+        if info.verb != "get" or info.kind is None:
+            return
+        empty = self.empty or (not self._header_seen and stderr.startswith("No resources found"))
+        if not self.items and not empty:
+            return
+        namespace = info.namespace or current_namespace()
+        items = [(item_namespace or namespace, name) for item_namespace, name in self.items]
+        # A plain listing of one namespace is complete, so it also drops names that are gone
+        if info.name is None and not self.all_namespaces and not info.all_namespaces \
+                and not re.search(r"\s(-l|--selector)[\s=]", self.command):
+            resource_index.replace(info.kind, items, namespace)
+        elif self.items:
+            for item_namespace, name in items:
+                resource_index.add(info.kind, name, item_namespace)
+
+def parse_resource_names(command: str, output: str) -> None:
+    parser = ResourceNameParser(command)
+    for line in output.splitlines():
+        parser.feed(line)
+    parser.finish()
 
 def rewrite_command(command: str) -> str:
-    lower_cmd = command.lower()
-
-    if "svc" in lower_cmd or "service" in lower_cmd:
-        resource_type = "services"
-    elif "pods" in lower_cmd:
-        resource_type = "pods"
-    elif "deployment" in lower_cmd:
-        resource_type = "deployments"
-    else:
-        return command 
-
-    # Find 'svc <name>' or 'service <name>' or 'pods <name>' etc.
-    match = re.search(r'(?:svc|service|pods|deployment)\s+([\w-]+)', command, re.IGNORECASE)
-    if match:
-        guessed_name = match.group(1)
-
-        if guessed_name not in known_resources[resource_type]:
-            if len(known_resources[resource_type]) == 1:
-                real_name = list(known_resources[resource_type])[0]
-                new_command = command.replace(guessed_name, real_name)
-                print(f"[Rewrite] Replacing '{guessed_name}' with '{real_name}' in command: {new_command}")
-                return new_command
-    return command
-
-def execute_kubectl_commands(commands, delay: int = 10) -> str:
     """
-    Executes a sequence of kubectl commands. 
+    Corrects hallucinated resource names against the resource index.
     """
-    if isinstance(commands, str):
-        cleaned = commands.replace("", "")
-        commands = [cmd.strip() for cmd in cleaned.split(";") if cmd.strip()]
-    
-    aggregated_output = []
+    new_command = resolve_command(command, resource_index, NAME_RESOLUTION_THRESHOLD)
+    if new_command != command:
+        print(f"[Rewrite] '{command}' -> '{new_command}'")
+    return new_command
 
-    for i, command in enumerate(commands):
-        command = rewrite_command(command)
+# Error lines kept per command, whatever the size of its output
+ERROR_LINE_LIMIT = 20
+# Characters read from the subprocess at a time
+READ_CHUNK = 64 * 1024
 
-        print(f"\nExecuting: {command}")
-        # Execute command
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        success = (result.returncode == 0)
+class OutputCapture:
+    """
+    Collects one output stream chunk by chunk: keeps the first `limit` characters, counts what is dropped
+    beyond them, and passes every complete line to `on_line` (and error lines to `error_lines`) as it arrives.
+    """
 
-        if success:
-            output = result.stdout.strip() or "Command executed successfully with no output."
-        else:
-            output = f"STDOUT: {result.stdout.strip()}\nSTDERR: {result.stderr.strip()}"
+    def __init__(self, limit: int = KUBECTL_OUTPUT_LIMIT, on_line=None, error_lines: list = None):
+        self.limit = limit
+        self.on_line = on_line
+        self.error_lines = error_lines if error_lines is not None else []
+        self._chunks = []
+        self.kept = 0
+        self.dropped = 0
+        self._partial = ""
+
+    def feed(self, chunk: str) -> None:
+        room = self.limit - self.kept
+        if room > 0:
+            self._chunks.append(chunk[:room])
+            self.kept += min(room, len(chunk))
+        self.dropped += max(0, len(chunk) - max(room, 0))
+
+        lines = (self._partial + chunk).split("\n")
+        # A line longer than a chunk is only scanned up to the chunk size
+        self._partial = lines.pop()[-READ_CHUNK:]
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line: str) -> None:
+        if "error" in line.lower() and len(self.error_lines) < ERROR_LINE_LIMIT:
+            self.error_lines.append(line.strip()[:500])
+        if self.on_line is not None:
+            self.on_line(line)
 
-        log(command, output, success)
+    def close(self) -> str:
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ""
+        text = "".join(self._chunks)
+        self._chunks = [text]
+        return text
 
-        aggregated_output.append(f"Command: {command}\nOutput: {output}")
-        print(output)
+def _read_stream(stream, capture: OutputCapture) -> None:
+    for chunk in iter(lambda: stream.read(READ_CHUNK), ""):
+        capture.feed(chunk)
 
-        if success:
-            parse_resource_names(command, output)
+class CommandResult:
+    def __init__(self, command: str, returncode: int, stdout: str, stderr: str, duration: float, data=None,
+                 truncated: int = 0, error_lines: list = None, stderr_error_lines: list = None):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        # Structured API objects when the command ran through the Kubernetes API backend
+        self.data = data
+        # Characters of output beyond KUBECTL_OUTPUT_LIMIT that were read but not kept
+        self.truncated = truncated
+        # Lines mentioning an error, from the whole output (even the part that wasn't kept); stdout's and
+        # stderr's are kept apart so table rows that mention "error" can't crowd out kubectl's own error line
+        self.error_lines = error_lines or []
+        self.stderr_error_lines = stderr_error_lines or []
 
-        print(f"Waiting for {delay} seconds before next command...")
-        time.sleep(delay)
+    @classmethod
+    def skipped(cls, command: str) -> "CommandResult":
+        """
+        A command that wasn't run because a command it depends on failed.
+        """
+        return cls(command, None, "", "", 0.0)
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def was_skipped(self) -> bool:
+        return self.returncode is None
+
+    @property
+    def has_error(self) -> bool:
+        # Only kubectl's own stderr counts: stdout "error:" lines are data (logs, describe events)
+        return not self.was_skipped and (not self.success or any("error:" in line.lower()
+                                                                 for line in self.stderr_error_lines))
+
+    @property
+    def status(self) -> str:
+        if self.was_skipped:
+            return "skipped"
+        return "failed" if self.has_error else "succeeded"
+
+    @property
+    def error(self) -> str:
+        """
+        What went wrong, as precisely as the output tells: stderr's error lines, then stdout's, else the end of stderr.
+        """
+        if self.was_skipped:
+            return "Not run: a command it depends on failed."
+        if self.stderr_error_lines:
+            return "\n".join(self.stderr_error_lines)
+        if self.error_lines:
+            return "\n".join(self.error_lines)
+        return self.stderr.strip()[-500:] or self.stdout.strip()[-500:] or f"exit code {self.returncode}"
+
+    def to_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "status": self.status,
+            "returncode": self.returncode,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "duration": round(self.duration, 3),
+            "truncated": self.truncated,
+            "error_lines": self.error_lines,
+            "stderr_error_lines": self.stderr_error_lines,
+        }
+
+    @property
+    def output(self) -> str:
+        if self.was_skipped:
+            return self.error
+        note = f"\n... [{self.truncated} more characters not captured]" if self.truncated else ""
+        if self.success:
+            return (self.stdout.strip() or "Command executed successfully with no output.") + note
+        return f"STDOUT: {self.stdout.strip()}\nSTDERR: {self.stderr.strip()}{note}"
+
+def _run_subprocess(command: str, parser: ResourceNameParser) -> tuple:
+    """
+    Runs the command with both pipes read in chunks as the output arrives (stderr on a helper thread),
+    so memory is bounded by KUBECTL_OUTPUT_LIMIT however much kubectl prints.
+    Returns (returncode, stdout, stderr, truncated, stdout_error_lines, stderr_error_lines).
+    """
+    stdout = OutputCapture(on_line=parser.feed)
+    stderr = OutputCapture()
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, errors="replace")
+    stderr_reader = threading.Thread(target=_read_stream, args=(process.stderr, stderr), daemon=True)
+    stderr_reader.start()
+    _read_stream(process.stdout, stdout)
+    stderr_reader.join()
+    returncode = process.wait()
+    return (returncode, stdout.close(), stderr.close(), stdout.dropped + stderr.dropped,
+            stdout.error_lines, stderr.error_lines)
+
+def run_kubectl_command(command: str, rewrite: bool = True) -> CommandResult:
+    """
+    Executes a single kubectl command, logging it and learning resource names from its output.
+    Commands the Kubernetes API backend can map skip the kubectl subprocess.
+    """
+    if rewrite:
+        command = rewrite_command(command)
+
+    print(f"\nExecuting: {command}")
+    parser = ResourceNameParser(command)
+    with span("kubectl", command=command) as execution:
+        started = time.monotonic()
+        backend = get_api_backend(EXECUTION_WORKERS, READINESS_TIMEOUT) if EXECUTION_BACKEND == "api" else None
+        api_result = backend.execute(command) if backend else None
+        if api_result is not None:
+            returncode, stdout, stderr, data = api_result
+            captured = [OutputCapture(on_line=parser.feed), OutputCapture()]
+            captured[0].feed(stdout)
+            captured[1].feed(stderr)
+            command_result = CommandResult(command, returncode, captured[0].close(), captured[1].close(),
+                                           time.monotonic() - started, data,
+                                           captured[0].dropped + captured[1].dropped,
+                                           captured[0].error_lines, captured[1].error_lines)
+        else:
+            returncode, stdout, stderr, truncated, error_lines, stderr_error_lines = _run_subprocess(command, parser)
+            command_result = CommandResult(command, returncode, stdout, stderr, time.monotonic() - started,
+                                           truncated=truncated, error_lines=error_lines,
+                                           stderr_error_lines=stderr_error_lines)
+        execution.set(backend="api" if api_result is not None else "subprocess", returncode=command_result.returncode,
+                      output_chars=len(command_result.stdout) + len(command_result.stderr) + command_result.truncated)
+
+    log(command, command_result.output, command_result.success)
+    print(command_result.output)
+
+    if command_result.success:
+        parser.finish(command_result.stderr)
+    return command_result
+
+def execute_kubectl_commands(commands, delay: int = 10) -> list:
+    """
+    Executes a sequence of kubectl commands, returning a CommandResult per command in order.
+    In "dag" execution mode independent commands run concurrently and `delay` is unused:
+    commands only wait (via rollout status / kubectl wait) for the mutations they depend on.
+    In both modes commands depending on one that failed (by `status`, so exit code 0 with an `error:` line
+    counts) aren't run and come back as skipped.
+    """
+    if isinstance(commands, str):
+        cleaned = commands.replace("", "")
+        commands = [cmd.strip() for cmd in cleaned.split(";") if cmd.strip()]
+    
+    if EXECUTION_MODE == "dag":
+        return execute_plan(
+            commands,
+            run_kubectl_command,
+            workers=EXECUTION_WORKERS,
+            readiness_timeout=READINESS_TIMEOUT,
+            skip=CommandResult.skipped
+        )
 
-    return "\n\n".join(aggregated_output)
\ No newline at end of file
+    results = []
+    for info, dependencies in build_plan(commands):
+        if any(results[j].status != "succeeded" for j in dependencies):
+            results.append(CommandResult.skipped(info.command))
+            continue
+        # The delay separates commands that run; skipped ones don't wait for it
+        if any(not result.was_skipped for result in results):
+            print(f"Waiting for {delay} seconds before next command...")
+            with span("sleep", seconds=delay):
+                time.sleep(delay)
+        results.append(run_kubectl_command(info.command))
+    return results
@@ -1,15 +1,17 @@
+import json
 import logging
 import re
+import threading
+import time
 import torch
-from src.config.config import MAX_NEW_TOKENS 
+from transformers import TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+from src.config.config import MAX_NEW_TOKENS, PREFIX_CACHE, SPECULATIVE_DECODING, PROMPT_LOOKUP_TOKENS
+from src.model.prefix_cache import prefix_cache_for
+from src.model.model_loader import get_draft_model
+from src.tracing.tracing import span, propagate
 
-def generate_cot(instruction: str, model, tokenizer) -> str:
-    """
-    Generate the chain-of-thought (CoT) from the model in a series of steps.
-    """
-    logging.info(f"Generating Chain-of-Thought for instruction: {instruction}")
-    
-    messages = [
+def _cot_messages(instruction: str) -> list:
+    return [
         {
             "role": "system", 
             "content": (
@@ -24,32 +26,318 @@ def generate_cot(instruction: str, model, tokenizer) -> str:
             "role": "user", 
             "content": instruction
         }
-    ]    
+    ]
+
+def _prefix_kwargs(messages: list, inputs, model, tokenizer) -> dict:
+    """
+    past_key_values for the prompt's system message, so generate only prefills the rest.
+    """
+    if not PREFIX_CACHE:
+        return {}
+    try:
+        return prefix_cache_for(model, tokenizer).generation_kwargs(messages[0], inputs)
+    except Exception as e:
+        logging.warning(f"Prompt prefix cache unavailable, prefilling the full prompt: {e}")
+        return {}
+
+COT_GENERATION_KWARGS = dict(
+    max_new_tokens=200,
+    do_sample=True,
+    temperature=0.7,
+    top_p=0.9,
+    repetition_penalty=1.0,
+    num_return_sequences=1
+)
 
+def _token_counts(inputs, outputs) -> dict:
+    return {"prompt_tokens": inputs.shape[1], "tokens": outputs.shape[1] - inputs.shape[1]}
+
+def generate_cot(instruction: str, model, tokenizer) -> str:
+    """
+    Generate the chain-of-thought (CoT) from the model in a series of steps.
+    """
+    logging.info(f"Generating Chain-of-Thought for instruction: {instruction}")
+    
+    messages = _cot_messages(instruction)
     inputs = tokenizer.apply_chat_template(
         messages,
         return_tensors="pt",
         add_generation_prompt=True
     ).to(model.device)
     
-    outputs = model.generate(
-        inputs,
-        max_new_tokens=200,
-        do_sample=True,
-        temperature=0.7,
-        top_p=0.9,
-        repetition_penalty=1.0,
-        num_return_sequences=1,
-        pad_token_id=tokenizer.eos_token_id,
-        eos_token_id=tokenizer.eos_token_id
-    )
+    with span("generate_cot") as generation:
+        outputs = model.generate(
+            inputs,
+            **COT_GENERATION_KWARGS,
+            **_prefix_kwargs(messages, inputs, model, tokenizer),
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id
+        )
+        generation.set(**_token_counts(inputs, outputs))
     
-    raw_output = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    # Only the generated tokens, like the streamed variant (skip_prompt)
+    raw_output = tokenizer.decode(outputs[0, inputs.shape[1]:], skip_special_tokens=True)
     logging.info(f"Raw CoT output: {raw_output}")
 
     return raw_output.strip()
 
-def generate_commands(cot: str, model, tokenizer) -> list:
+def _stream_generate(span_name: str, model, tokenizer, inputs, **kwargs):
+    """
+    Runs model.generate on a background thread and yields the generated text accumulated so far.
+    The generation is traced as `span_name`, with token counts and time to first token.
+    """
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    errors = []
+    outputs = []
+
+    def run():
+        try:
+            outputs.append(model.generate(
+                inputs,
+                **kwargs,
+                pad_token_id=tokenizer.eos_token_id,
+                eos_token_id=tokenizer.eos_token_id,
+                streamer=streamer
+            ))
+        except Exception as e:
+            errors.append(e)
+            # Unblock the consumer loop below
+            streamer.end()
+
+    with span(span_name, stream=True) as generation:
+        started = time.monotonic()
+        thread = threading.Thread(target=propagate(run), name="generation-streamer", daemon=True)
+        thread.start()
+
+        text = ""
+        for chunk in streamer:
+            if not chunk:
+                continue
+            if not text:
+                generation.set(time_to_first_token=round(time.monotonic() - started, 4))
+            text += chunk
+            yield text
+        thread.join()
+
+        if errors:
+            raise errors[0]
+        generation.set(**_token_counts(inputs, outputs[0]))
+
+def generate_cot_stream(instruction: str, model, tokenizer):
+    """
+    Streaming variant of generate_cot.
+    Yields the generated chain-of-thought text accumulated so far as tokens are decoded;
+    the last value yielded is the complete CoT.
+    """
+    logging.info(f"Streaming Chain-of-Thought for instruction: {instruction}")
+
+    messages = _cot_messages(instruction)
+    inputs = tokenizer.apply_chat_template(
+        messages,
+        return_tensors="pt",
+        add_generation_prompt=True
+    ).to(model.device)
+
+    text = ""
+    for text in _stream_generate("generate_cot", model, tokenizer, inputs, **COT_GENERATION_KWARGS,
+                                 **_prefix_kwargs(messages, inputs, model, tokenizer)):
+        yield text
+
+    logging.info(f"Streamed CoT output: {text}")
+    yield text.strip()
+
+def _plan_messages(instruction: str) -> list:
+    return [
+        {
+            "role": "system",
+            "content": (
+                "You are a Kubernetes expert assistant. Reason step by step about the following task, "
+                "then give the kubectl commands that implement that reasoning. "
+                "Respond with a single JSON object and nothing else, in this format:\n"
+                '{"steps": ["<reasoning>", "<reasoning>"], "commands": ["kubectl ...", "kubectl ..."]}\n'
+                "List each step in concise form. Each command must start with 'kubectl'."
+            )
+        },
+        {
+            "role": "user",
+            "content": instruction
+        }
+    ]
+
+# The assistant turn is started with this text, so the model can only continue the JSON object
+PLAN_PREFIX = '{"steps": ["'
+
+PLAN_GENERATION_KWARGS = dict(
+    max_new_tokens=350,
+    do_sample=True,
+    temperature=0.6,
+    top_p=0.9,
+    repetition_penalty=1.0,
+    num_return_sequences=1
+)
+
+def _json_value_end(text: str, start: int):
+    """
+    Index just past the JSON array/object opening at `start`, or None while it is still open.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+def _json_array(text: str, key: str):
+    """
+    The value of `"key": [...]` once the array is closed, else None.
+    """
+    key_at = text.find(f'"{key}"')
+    if key_at == -1:
+        return None
+    start = text.find("[", key_at)
+    end = _json_value_end(text, start) if start != -1 else None
+    if end is None:
+        return None
+    try:
+        value = json.loads(text[start:end])
+    except ValueError:
+        return None
+    return [str(item).strip() for item in value] if isinstance(value, list) else None
+
+class JsonObjectClosed(StoppingCriteria):
+    """
+    Stops generation as soon as the top-level JSON object is closed, instead of running to max_new_tokens.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, prefix: str):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.prefix = prefix
+
+    def __call__(self, input_ids, scores, **kwargs):
+        text = self.prefix + self.tokenizer.decode(input_ids[0, self.prompt_length:], skip_special_tokens=True)
+        closed = _json_value_end(text, 0) is not None
+        return torch.full((input_ids.shape[0],), closed, dtype=torch.bool, device=input_ids.device)
+
+def generate_plan_stream(instruction: str, model, tokenizer):
+    """
+    Single-pass generation of the steps and the commands as one JSON object.
+    Yields ("steps", [...]) as soon as the steps array is closed, then ("commands", [...]).
+    Raises ValueError when the output isn't a valid plan.
+    """
+    logging.info(f"Generating structured plan for instruction: {instruction}")
+
+    messages = _plan_messages(instruction)
+    prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True) + PLAN_PREFIX
+    inputs = tokenizer(prompt, return_tensors="pt", add_special_tokens=False).input_ids.to(model.device)
+    stopping_criteria = StoppingCriteriaList([JsonObjectClosed(tokenizer, inputs.shape[1], PLAN_PREFIX)])
+
+    text = PLAN_PREFIX
+    steps = None
+    for generated in _stream_generate("generate_plan", model, tokenizer, inputs, **PLAN_GENERATION_KWARGS,
+                                      **_prefix_kwargs(messages, inputs, model, tokenizer),
+                                      stopping_criteria=stopping_criteria):
+        text = PLAN_PREFIX + generated
+        if steps is None:
+            steps = _json_array(text, "steps")
+            if steps is not None:
+                yield "steps", steps
+    logging.info(f"Raw structured plan output: {text}")
+
+    if steps is None:
+        raise ValueError("no complete steps array in the model output")
+    commands = _json_array(text, "commands")
+    if commands is None:
+        raise ValueError("no complete commands array in the model output")
+    yield "commands", [command for command in commands if command.startswith("kubectl")]
+
+COMMAND_GENERATION_KWARGS = dict(
+    max_new_tokens=150,
+    do_sample=True,
+    temperature=0.6,
+    top_p=0.9,
+    num_beams=1,
+    early_stopping=True,
+    repetition_penalty=1.0,
+    num_return_sequences=1
+)
+
+def _kubectl_block_ended(text: str) -> bool:
+    """
+    True once a blank line follows the last kubectl line and the text after it can't be another command.
+    """
+    lines = text.split("\n")
+    last = max((i for i, line in enumerate(lines) if line.strip().startswith("kubectl")), default=None)
+    if last is None:
+        return False
+    blank = next((i for i in range(last + 1, len(lines) - 1) if not lines[i].strip()), None)
+    if blank is None:
+        return False
+    return any(line.strip() and not "kubectl".startswith(line.strip()) for line in lines[blank + 1:])
+
+class KubectlBlockEnded(StoppingCriteria):
+    """
+    Stops command generation after the command block instead of decoding up to max_new_tokens.
+    Only generated text is inspected. Without an explicit prompt_length it is taken from the first call
+    (plain decoding adds one token per step), which also holds for left-padded batches.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int = None):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1] - 1
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor([_kubectl_block_ended(text) for text in texts], dtype=torch.bool, device=input_ids.device)
+
+class _SharedStoppingCriteria(StoppingCriteriaList):
+    """
+    Criteria that only look at generated text work for any request, so lists of the same criteria
+    compare equal and requests using them can still share a BatchedGenerator batch.
+    """
+
+    def __hash__(self):
+        return hash(tuple(type(criteria) for criteria in self))
+
+    def __eq__(self, other):
+        return isinstance(other, StoppingCriteriaList) and [type(c) for c in self] == [type(c) for c in other]
+
+def _command_stop_kwargs(tokenizer, inputs, speculative: str) -> dict:
+    # Speculative decoding accepts several tokens per step, so the prompt length is given up front
+    prompt_length = inputs.shape[1] if speculative != "off" else None
+    return {"stopping_criteria": _SharedStoppingCriteria([KubectlBlockEnded(tokenizer, prompt_length)])}
+
+def _speculative_kwargs(speculative: str) -> dict:
+    """
+    Assisted-generation kwargs for the configured speculative decoding mode.
+    Commands largely copy the CoT, so prompt lookup drafts them well without a second model.
+    """
+    if speculative == "prompt-lookup":
+        return {"prompt_lookup_num_tokens": PROMPT_LOOKUP_TOKENS}
+    if speculative == "draft":
+        draft_model = get_draft_model()
+        if draft_model is not None:
+            return {"assistant_model": draft_model}
+    return {}
+
+def generate_commands(cot: str, model, tokenizer, speculative: str = SPECULATIVE_DECODING) -> list:
     """
     Generates kubectl commands based on the provided Chain-of-Thought (CoT).
     """
@@ -76,20 +364,19 @@ def generate_commands(cot: str, model, tokenizer) -> list:
         add_generation_prompt=True
     ).to(model.device)
 
-    outputs = model.generate(
-        inputs,
-        max_new_tokens=150,
-        do_sample=True,
-        temperature=0.6,
-        top_p=0.9,
-        num_beams=1,
-        early_stopping=True,
-        repetition_penalty=1.0,
-        num_return_sequences=1,
-        pad_token_id=tokenizer.eos_token_id,
-        eos_token_id=tokenizer.eos_token_id
-    )
-    full_output = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    with span("generate_commands", speculative=speculative) as generation:
+        outputs = model.generate(
+            inputs,
+            **COMMAND_GENERATION_KWARGS,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            **_prefix_kwargs(messages, inputs, model, tokenizer),
+            **_command_stop_kwargs(tokenizer, inputs, speculative),
+            **_speculative_kwargs(speculative)
+        )
+        generation.set(**_token_counts(inputs, outputs))
+    # Only the generated tokens: a "kubectl" line in the prompt (CoT, known resources) is not a command
+    full_output = tokenizer.decode(outputs[0, inputs.shape[1]:], skip_special_tokens=True)
     logging.info(f"Raw commands output: {full_output}")
 
     commands = [
@@ -100,11 +387,14 @@ def generate_commands(cot: str, model, tokenizer) -> list:
     logging.info(f"Extracted Commands: {commands}")
     return commands
 
-def refine_commands(intent: str, previous_commands: list, error_message: str, model, tokenizer) -> list:
+def refine_commands(intent: str, previous_commands: list, error_message: str, model, tokenizer,
+                    speculative: str = SPECULATIVE_DECODING, succeeded_commands: list = None) -> list:
     """
-    Re-prompts the model to refine kubectl commands.
+    Re-prompts the model to refine kubectl commands. `previous_commands` are the ones still to get right
+    (failed, or not run because of a failure); `succeeded_commands` already ran and must not be repeated.
     """
     logging.info("Refining commands with error feedback...")
+    succeeded = f"Already succeeded, do not repeat: {succeeded_commands}\n" if succeeded_commands else ""
     messages = [
         {
             "role": "system",
@@ -118,6 +408,7 @@ def refine_commands(intent: str, previous_commands: list, error_message: str, mo
             "role": "assistant",
             "content": (
                 f"Original Intent: {intent}\n"
+                f"{succeeded}"
                 f"Previously tried commands: {previous_commands}\n"
                 f"Error encountered: {error_message}\n"
                 "Refine your reasoning and generate corrected kubectl commands. "
@@ -131,22 +422,48 @@ def refine_commands(intent: str, previous_commands: list, error_message: str, mo
         add_generation_prompt=True
     ).to(model.device)
 
-    outputs = model.generate(
-        inputs,
-        max_new_tokens=150,
-        do_sample=True,
-        temperature=0.6,
-        top_p=0.9,
-        num_beams=1,
-        early_stopping=True,
-        repetition_penalty=1.0,
-        num_return_sequences=1,
-        pad_token_id=tokenizer.eos_token_id,
-        eos_token_id=tokenizer.eos_token_id
-    )
-    raw_output = tokenizer.decode(outputs[0], skip_special_tokens=True)
+    with span("refine_commands", speculative=speculative) as generation:
+        outputs = model.generate(
+            inputs,
+            **COMMAND_GENERATION_KWARGS,
+            pad_token_id=tokenizer.eos_token_id,
+            eos_token_id=tokenizer.eos_token_id,
+            **_prefix_kwargs(messages, inputs, model, tokenizer),
+            **_command_stop_kwargs(tokenizer, inputs, speculative),
+            **_speculative_kwargs(speculative)
+        )
+        generation.set(**_token_counts(inputs, outputs))
+    # Only the generated tokens, or the previously tried commands in the prompt come back as "refined"
+    raw_output = tokenizer.decode(outputs[0, inputs.shape[1]:], skip_special_tokens=True)
     logging.info(f"Refined commands output: {raw_output}")
     
     refined_commands = [line.strip() for line in raw_output.split("\n") if line.strip().startswith("kubectl")]
     logging.info(f"Refined Commands: {refined_commands}")
     return refined_commands
+
+class LocalGenerator:
+    """
+    The generation functions bound to an in-process model. RemoteModel offers the same methods
+    backed by model servers, so callers don't care where the model runs.
+    """
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+
+    def generate_cot(self, instruction: str) -> str:
+        return generate_cot(instruction, self.model, self.tokenizer)
+
+    def generate_cot_stream(self, instruction: str):
+        return generate_cot_stream(instruction, self.model, self.tokenizer)
+
+    def generate_plan_stream(self, instruction: str):
+        return generate_plan_stream(instruction, self.model, self.tokenizer)
+
+    def generate_commands(self, cot: str) -> list:
+        return generate_commands(cot, self.model, self.tokenizer)
+
+    def refine_commands(self, intent: str, previous_commands: list, error_message: str,
+                        succeeded_commands: list = None) -> list:
+        return refine_commands(intent, previous_commands, error_message, self.model, self.tokenizer,
+                               succeeded_commands=succeeded_commands)
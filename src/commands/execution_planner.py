@@ -0,0 +1,230 @@
+import logging
+import shlex
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from src.tracing.tracing import propagate
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_ALIASES = {
+    "po": "pods", "pod": "pods", "pods": "pods",
+    "svc": "services", "service": "services", "services": "services",
+    "deploy": "deployments", "deployment": "deployments", "deployments": "deployments",
+    "ns": "namespaces", "namespace": "namespaces", "namespaces": "namespaces",
+    "rs": "replicasets", "replicaset": "replicasets", "replicasets": "replicasets",
+    "sts": "statefulsets", "statefulset": "statefulsets", "statefulsets": "statefulsets",
+    "ds": "daemonsets", "daemonset": "daemonsets", "daemonsets": "daemonsets",
+    "job": "jobs", "jobs": "jobs",
+}
+# Kinds whose changes create, replace or remove pods
+POD_OWNER_KINDS = {"deployments", "replicasets", "statefulsets", "daemonsets", "jobs"}
+
+READ_VERBS = {"get", "describe", "logs", "top", "explain", "api-resources", "api-versions",
+              "version", "cluster-info", "events", "diff", "auth", "wait"}
+READ_ROLLOUT_VERBS = {"status", "history"}
+# Verbs whose first positional argument is a sub-command rather than the resource type
+SUBCOMMAND_VERBS = {"rollout", "set", "create", "config", "auth"}
+# Flags that take a separate value argument
+VALUE_FLAGS = {"-n", "--namespace", "-f", "--filename", "-l", "--selector", "-o", "--output",
+               "--replicas", "-c", "--container", "--timeout", "--for", "--image"}
+# Flags that never take one; any other flag followed by a non-flag token is read as taking it as its value
+BOOLEAN_FLAGS = {"-A", "--all-namespaces", "--all", "-w", "--watch", "--watch-only", "--force", "--overwrite",
+                 "--server-side", "-R", "--recursive", "--no-headers", "--show-labels", "-p", "--previous",
+                 "--follow", "--wait", "--ignore-not-found", "-i", "--stdin", "-t", "--tty", "-it"}
+
+
+class CommandInfo:
+    """
+    What a kubectl command touches: its verb, whether it mutates the cluster,
+    the (normalized) resource kind and name, and the namespace it runs in.
+    """
+
+    def __init__(self, command: str, verb: str = None, subverb: str = None, kind: str = None,
+                 name: str = None, namespace: str = None, mutating: bool = True, parsed: bool = True,
+                 all_namespaces: bool = False):
+        self.command = command
+        self.verb = verb
+        self.subverb = subverb
+        self.kind = kind
+        self.name = name
+        self.namespace = namespace
+        self.mutating = mutating
+        # -A / --all-namespaces: touches every namespace
+        self.all_namespaces = all_namespaces
+        # Unparsed commands are treated as barriers that order against everything
+        self.parsed = parsed
+
+    def __repr__(self):
+        return (f"CommandInfo(verb={self.verb!r}, subverb={self.subverb!r}, kind={self.kind!r}, "
+                f"name={self.name!r}, namespace={self.namespace!r}, mutating={self.mutating})")
+
+
+def classify_command(command: str) -> CommandInfo:
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        return CommandInfo(command, parsed=False)
+    if len(tokens) < 2 or tokens[0] != "kubectl":
+        return CommandInfo(command, parsed=False)
+
+    namespace = None
+    all_namespaces = False
+    positionals = []
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ("-A", "--all-namespaces"):
+            all_namespaces = True
+        elif token in ("-n", "--namespace") and i + 1 < len(tokens):
+            namespace = tokens[i + 1]
+            i += 2
+            continue
+        if token.startswith("--namespace="):
+            namespace = token.split("=", 1)[1]
+        elif token in VALUE_FLAGS:
+            i += 2
+            continue
+        elif token == "--":
+            # Everything after it is the command run in a container (kubectl exec pod -- ls -l)
+            break
+        elif token.startswith("-"):
+            # Unknown flag: skip its value too (-L app, --field-selector status.phase=Running)
+            if token not in BOOLEAN_FLAGS and "=" not in token and i + 1 < len(tokens) \
+                    and not tokens[i + 1].startswith("-"):
+                i += 2
+                continue
+        else:
+            positionals.append(token)
+        i += 1
+
+    if not positionals:
+        return CommandInfo(command, parsed=False)
+
+    verb = positionals.pop(0).lower()
+    subverb = positionals.pop(0).lower() if verb in SUBCOMMAND_VERBS and positionals else None
+
+    kind, name = None, None
+    if verb == "create" and subverb in RESOURCE_ALIASES:
+        # kubectl create namespace <name>, kubectl create deployment <name> ...
+        kind = RESOURCE_ALIASES[subverb]
+        name = positionals[0] if positionals else None
+    elif verb == "logs" and positionals:
+        kind, name = "pods", positionals[0].split("/")[-1]
+    elif positionals:
+        target = positionals.pop(0)
+        if "/" in target:
+            kind, name = target.split("/", 1)
+        else:
+            kind = target
+            name = positionals.pop(0) if positionals else None
+        kind = RESOURCE_ALIASES.get(kind.lower(), kind.lower())
+
+    if verb == "rollout":
+        mutating = subverb not in READ_ROLLOUT_VERBS
+    else:
+        mutating = verb not in READ_VERBS
+
+    return CommandInfo(command, verb, subverb, kind, name, namespace, mutating, all_namespaces=all_namespaces)
+
+
+def _same_namespace(a: CommandInfo, b: CommandInfo) -> bool:
+    return a.all_namespaces or b.all_namespaces or a.namespace == b.namespace
+
+
+def _touches_same_resource(a: CommandInfo, b: CommandInfo) -> bool:
+    if not _same_namespace(a, b):
+        return False
+    if a.kind is None or b.kind is None:
+        return True
+    if a.kind != b.kind:
+        return False
+    return a.name is None or b.name is None or a.name == b.name
+
+
+def _reads_pods_of(later: CommandInfo, earlier: CommandInfo) -> bool:
+    """
+    A read of pods after a change to what owns them (scale, rollout restart of a deployment ...), in the same
+    namespace or with the read's namespace unknown: it should see the pods the change produced.
+    """
+    if later.mutating or later.kind != "pods" or not earlier.mutating or earlier.kind not in POD_OWNER_KINDS:
+        return False
+    return later.namespace is None or _same_namespace(later, earlier)
+
+
+def _depends_on(later: CommandInfo, earlier: CommandInfo) -> bool:
+    if not later.parsed or not earlier.parsed:
+        return True
+    # Namespace must exist before anything runs in it
+    if earlier.kind == "namespaces" and earlier.mutating and later.namespace == earlier.name:
+        return True
+    # Mutations with an unknown target (apply -f, unrecognised verbs) order against everything
+    if (earlier.mutating and earlier.kind is None) or (later.mutating and later.kind is None):
+        return True
+    if not earlier.mutating and not later.mutating:
+        return False
+    return _touches_same_resource(later, earlier) or _reads_pods_of(later, earlier)
+
+
+def readiness_command(info: CommandInfo, timeout: int):
+    """
+    The wait that makes a mutation's effect observable to later commands, or None.
+    """
+    namespace = f" -n {info.namespace}" if info.namespace else ""
+    if info.kind == "namespaces" and info.verb == "create" and info.name:
+        return f"kubectl wait --for=jsonpath={{.status.phase}}=Active namespace/{info.name} --timeout={timeout}s"
+    if info.kind == "deployments" and info.name and info.verb in ("scale", "rollout", "set", "apply", "patch"):
+        return f"kubectl rollout status deployment/{info.name}{namespace} --timeout={timeout}s"
+    return None
+
+
+def build_plan(commands: list) -> list:
+    """
+    Returns (info, dependencies) per command, dependencies being indices of earlier commands.
+    """
+    infos = [classify_command(command) for command in commands]
+    plan = []
+    for i, info in enumerate(infos):
+        dependencies = {j for j in range(i) if _depends_on(info, infos[j])}
+        plan.append((info, dependencies))
+    return plan
+
+
+def execute_plan(commands: list, run, workers: int = 4, readiness_timeout: int = 120, skip=None) -> list:
+    """
+    Runs commands through `run(command, rewrite=True)` concurrently, respecting the dependency graph.
+    Mutations that later commands depend on are followed by a readiness wait instead of a fixed sleep.
+    With `skip`, a command depending on one that didn't succeed isn't run; `skip(command)` is its result.
+    Returns the results of `run` in the original command order.
+    """
+    plan = build_plan(commands)
+    has_dependents = {j for _, dependencies in plan for j in dependencies}
+    results = [None] * len(plan)
+
+    def run_node(index: int):
+        info, dependencies = plan[index]
+        if skip is not None and any(results[j].status != "succeeded" for j in dependencies):
+            logger.info(f"Skipping '{info.command}', a command it depends on failed")
+            return skip(info.command)
+        result = run(info.command)
+        if index in has_dependents and info.mutating and result.status == "succeeded":
+            wait_command = readiness_command(info, readiness_timeout)
+            if wait_command:
+                logger.info(f"Waiting for readiness: {wait_command}")
+                run(wait_command, rewrite=False)
+        return result
+
+    remaining = {i: set(dependencies) for i, (_, dependencies) in enumerate(plan)}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while remaining or running:
+            for index in [i for i, dependencies in remaining.items() if not dependencies]:
+                del remaining[index]
+                # Each node runs in a copy of the caller's context so its spans join the request's trace
+                running[pool.submit(propagate(run_node), index)] = index
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                results[index] = future.result()
+                for dependencies in remaining.values():
+                    dependencies.discard(index)
+    return results
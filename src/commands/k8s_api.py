@@ -0,0 +1,437 @@
+import logging
+import shlex
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import yaml
+    from kubernetes import client, config as k8s_config
+    from kubernetes.client.rest import ApiException
+    from kubernetes.dynamic import DynamicClient
+except ImportError:
+    client = None
+
+from src.commands.execution_planner import RESOURCE_ALIASES, SUBCOMMAND_VERBS
+
+logger = logging.getLogger(__name__)
+
+# Where a pod's service account namespace is mounted, kubectl's default namespace in-cluster
+SERVICE_ACCOUNT_NAMESPACE = "/var/run/secrets/kubernetes.io/serviceaccount/namespace"
+# kubectl's own field manager for `apply --server-side`, so fields stay owned as if kubectl applied them
+FIELD_MANAGER = "kubectl"
+# Flags the API backend understands; commands using any other flag fall back to kubectl
+FLAGS_WITH_VALUES = {
+    "-n": "namespace", "--namespace": "namespace",
+    "-l": "selector", "--selector": "selector",
+    "-o": "output", "--output": "output",
+    "-f": "filename", "--filename": "filename",
+    "--replicas": "replicas",
+    "--timeout": "timeout",
+}
+BOOLEAN_FLAGS = {"-A": "all_namespaces", "--all-namespaces": "all_namespaces", "--server-side": "server_side"}
+# Resource kinds get/describe map to API calls; other kinds fall back to kubectl
+GET_KINDS = {"pods", "services", "deployments", "namespaces"}
+# (verb, sub-command) -> KubernetesApiBackend method
+HANDLERS = {
+    ("get", None): "_get",
+    ("describe", None): "_describe",
+    ("scale", None): "_scale",
+    ("rollout", "restart"): "_rollout_restart",
+    ("rollout", "status"): "_rollout_status",
+    ("create", "namespaces"): "_create_namespace",
+    ("apply", None): "_apply",
+}
+
+
+class UnsupportedCommand(Exception):
+    pass
+
+
+def parse_command(command: str):
+    """
+    Splits a kubectl command into (positionals, flags). Raises UnsupportedCommand for
+    anything the API backend doesn't handle, so the caller can fall back to kubectl.
+    """
+    try:
+        tokens = shlex.split(command)
+    except ValueError as e:
+        raise UnsupportedCommand(str(e))
+    if not tokens or tokens[0] != "kubectl":
+        raise UnsupportedCommand("not a kubectl command")
+
+    positionals, flags = [], {}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token.startswith("-"):
+            name, has_value, value = token.partition("=")
+            if name in BOOLEAN_FLAGS and not has_value:
+                flags[BOOLEAN_FLAGS[name]] = True
+            elif name in FLAGS_WITH_VALUES:
+                if not has_value:
+                    if i + 1 >= len(tokens):
+                        raise UnsupportedCommand(f"missing value for {name}")
+                    i += 1
+                    value = tokens[i]
+                flags[FLAGS_WITH_VALUES[name]] = value
+            else:
+                raise UnsupportedCommand(f"unsupported flag {name}")
+        else:
+            positionals.append(token)
+        i += 1
+
+    if not positionals:
+        raise UnsupportedCommand("missing verb")
+    return positionals, flags
+
+
+def _target(positionals: list):
+    """
+    Resource kind and optional name from `<kind> <name>` or `<kind>/<name>`.
+    """
+    if not positionals:
+        raise UnsupportedCommand("missing resource type")
+    if len(positionals) > (1 if "/" in positionals[0] else 2):
+        raise UnsupportedCommand("multiple resources in one command")
+    if "/" in positionals[0]:
+        kind, name = positionals[0].split("/", 1)
+    else:
+        kind = positionals[0]
+        name = positionals[1] if len(positionals) > 1 else None
+    kind = RESOURCE_ALIASES.get(kind.lower())
+    if kind is None:
+        raise UnsupportedCommand(f"unsupported resource type {positionals[0]}")
+    return kind, name
+
+
+def _age(timestamp) -> str:
+    if timestamp is None:
+        return "<unknown>"
+    seconds = int((datetime.now(timezone.utc) - timestamp).total_seconds())
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def _pod_status(pod) -> str:
+    """
+    The STATUS column of `kubectl get pods`: the phase, overridden by init container progress, the reason a
+    container is waiting or terminated (CrashLoopBackOff, Completed, ...) and deletion (Terminating).
+    """
+    status = pod.status
+    reason = status.reason or status.phase
+    init_statuses = status.init_container_statuses or []
+    initializing = False
+    for i, container in enumerate(init_statuses):
+        state = container.state
+        terminated = state.terminated if state else None
+        waiting = state.waiting if state else None
+        if terminated is not None and terminated.exit_code == 0:
+            continue
+        initializing = True
+        if terminated is not None:
+            reason = "Init:" + (terminated.reason or (f"Signal:{terminated.signal}" if terminated.signal
+                                                      else f"ExitCode:{terminated.exit_code}"))
+        elif waiting is not None and waiting.reason and waiting.reason != "PodInitializing":
+            reason = "Init:" + waiting.reason
+        else:
+            reason = f"Init:{i}/{len(init_statuses)}"
+        break
+
+    if not initializing:
+        running = False
+        for container in reversed(status.container_statuses or []):
+            state = container.state
+            waiting = state.waiting if state else None
+            terminated = state.terminated if state else None
+            if waiting is not None and waiting.reason:
+                reason = waiting.reason
+            elif terminated is not None and terminated.reason:
+                reason = terminated.reason
+            elif terminated is not None:
+                reason = f"Signal:{terminated.signal}" if terminated.signal else f"ExitCode:{terminated.exit_code}"
+            elif container.ready and state is not None and state.running is not None:
+                running = True
+        if reason == "Completed" and running:
+            reason = "Running"
+
+    if pod.metadata.deletion_timestamp is not None:
+        reason = "Unknown" if status.reason == "NodeLost" else "Terminating"
+    return reason
+
+
+def _table(header: list, rows: list) -> str:
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    lines = ["   ".join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip()
+             for row in [header] + rows]
+    return "\n".join(lines)
+
+
+def _parse_timeout(value: str, default: int) -> int:
+    if not value:
+        return default
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def current_namespace() -> str:
+    """
+    The namespace kubectl uses when a command has no -n: the current kubeconfig context's,
+    else (in-cluster) the pod's service account's, else "default".
+    """
+    if client is not None:
+        try:
+            _, context = k8s_config.list_kube_config_contexts()
+            return context.get("context", {}).get("namespace") or "default"
+        except Exception:
+            pass
+    try:
+        with open(SERVICE_ACCOUNT_NAMESPACE) as f:
+            return f.read().strip() or "default"
+    except OSError:
+        return "default"
+
+
+class KubernetesApiBackend:
+    """
+    Executes the common kubectl verbs the model emits (get, describe, scale, rollout,
+    create namespace, apply --server-side -f) through one persistent, pooled Kubernetes API client,
+    avoiding a shell fork, kubectl start-up, kubeconfig parse and TLS handshake per command.
+    """
+
+    def __init__(self, pool_size: int = 4, readiness_timeout: int = 120):
+        configuration = client.Configuration()
+        try:
+            k8s_config.load_kube_config(client_configuration=configuration)
+        except Exception:
+            k8s_config.load_incluster_config(client_configuration=configuration)
+        self.default_namespace = current_namespace()
+        configuration.connection_pool_maxsize = pool_size
+
+        self.api_client = client.ApiClient(configuration)
+        self.core = client.CoreV1Api(self.api_client)
+        self.apps = client.AppsV1Api(self.api_client)
+        self.readiness_timeout = readiness_timeout
+        self._dynamic = None
+
+    @property
+    def dynamic(self):
+        if self._dynamic is None:
+            # Discovery is slow, only pay for it when apply is used
+            self._dynamic = DynamicClient(self.api_client)
+        return self._dynamic
+
+    def execute(self, command: str):
+        """
+        Returns (returncode, stdout, stderr, data), or None when the command can't be mapped
+        and should run through kubectl instead.
+        """
+        try:
+            positionals, flags = parse_command(command)
+            verb = positionals[0].lower()
+            if verb in SUBCOMMAND_VERBS and len(positionals) > 1:
+                subverb = RESOURCE_ALIASES.get(positionals[1].lower(), positionals[1].lower())
+                handler, args = HANDLERS.get((verb, subverb)), positionals[2:]
+            else:
+                handler, args = HANDLERS.get((verb, None)), positionals[1:]
+            if handler is None:
+                raise UnsupportedCommand(f"unsupported verb {' '.join(positionals[:2])}")
+            handler = getattr(self, handler)
+            namespace = flags.get("namespace", self.default_namespace)
+            stdout, data = handler(args, flags, namespace)
+            return 0, stdout, "", data
+        except UnsupportedCommand as e:
+            logger.info(f"Falling back to kubectl for '{command}': {e}")
+            return None
+        except ApiException as e:
+            return 1, "", self._error_message(e), None
+        except Exception as e:
+            return 1, "", f"error: {e}", None
+
+    @staticmethod
+    def _error_message(error) -> str:
+        message = error.reason
+        try:
+            message = yaml.safe_load(error.body).get("message", message)
+        except Exception:
+            pass
+        return f"Error from server ({error.reason}): {message}"
+
+    def _serialize(self, obj):
+        return self.api_client.sanitize_for_serialization(obj)
+
+    def _get(self, args, flags, namespace):
+        if flags.get("output"):
+            raise UnsupportedCommand("output formats are rendered by kubectl")
+        kind, name = _target(args)
+        if kind not in GET_KINDS:
+            raise UnsupportedCommand(f"unsupported resource type {kind}")
+        all_namespaces = flags.get("all_namespaces", False)
+        selector = flags.get("selector")
+
+        if kind == "namespaces":
+            items = [self.core.read_namespace(name)] if name else self.core.list_namespace(label_selector=selector).items
+        elif name:
+            read = {
+                "pods": self.core.read_namespaced_pod,
+                "services": self.core.read_namespaced_service,
+                "deployments": self.apps.read_namespaced_deployment,
+            }[kind]
+            items = [read(name, namespace)]
+        elif all_namespaces:
+            list_all = {
+                "pods": self.core.list_pod_for_all_namespaces,
+                "services": self.core.list_service_for_all_namespaces,
+                "deployments": self.apps.list_deployment_for_all_namespaces,
+            }[kind]
+            items = list_all(label_selector=selector).items
+        else:
+            list_namespaced = {
+                "pods": self.core.list_namespaced_pod,
+                "services": self.core.list_namespaced_service,
+                "deployments": self.apps.list_namespaced_deployment,
+            }[kind]
+            items = list_namespaced(namespace, label_selector=selector).items
+
+        if not items:
+            scope = "" if kind == "namespaces" else f" in {namespace} namespace"
+            return f"No resources found{scope}.", []
+
+        header, rows = self._rows(kind, items)
+        if all_namespaces and kind != "namespaces":
+            header = ["NAMESPACE"] + header
+            rows = [[item.metadata.namespace] + row for item, row in zip(items, rows)]
+        return _table(header, rows), [self._serialize(item) for item in items]
+
+    @staticmethod
+    def _rows(kind: str, items: list):
+        if kind == "pods":
+            rows = []
+            for pod in items:
+                statuses = pod.status.container_statuses or []
+                ready = sum(1 for status in statuses if status.ready)
+                restarts = sum(status.restart_count for status in statuses)
+                rows.append([pod.metadata.name, f"{ready}/{len(statuses)}", _pod_status(pod), restarts,
+                             _age(pod.metadata.creation_timestamp)])
+            return ["NAME", "READY", "STATUS", "RESTARTS", "AGE"], rows
+        if kind == "services":
+            rows = []
+            for svc in items:
+                ports = ",".join(f"{port.port}/{port.protocol}" for port in svc.spec.ports or []) or "<none>"
+                rows.append([svc.metadata.name, svc.spec.type, svc.spec.cluster_ip, ports,
+                             _age(svc.metadata.creation_timestamp)])
+            return ["NAME", "TYPE", "CLUSTER-IP", "PORT(S)", "AGE"], rows
+        if kind == "deployments":
+            rows = []
+            for deployment in items:
+                status = deployment.status
+                rows.append([deployment.metadata.name, f"{status.ready_replicas or 0}/{deployment.spec.replicas}",
+                             status.updated_replicas or 0, status.available_replicas or 0,
+                             _age(deployment.metadata.creation_timestamp)])
+            return ["NAME", "READY", "UP-TO-DATE", "AVAILABLE", "AGE"], rows
+        rows = [[ns.metadata.name, ns.status.phase, _age(ns.metadata.creation_timestamp)] for ns in items]
+        return ["NAME", "STATUS", "AGE"], rows
+
+    def _describe(self, args, flags, namespace):
+        kind, name = _target(args)
+        if not name:
+            raise UnsupportedCommand("describe without a name")
+        _, data = self._get(args, {"namespace": namespace}, namespace)
+        # Structured dump of the object rather than kubectl's describe layout
+        return yaml.safe_dump(data[0], sort_keys=False), data[0]
+
+    def _scale(self, args, flags, namespace):
+        kind, name = _target(args)
+        if kind != "deployments" or not name or "replicas" not in flags:
+            raise UnsupportedCommand("only `scale deployment <name> --replicas=N` is mapped")
+        scale = self.apps.patch_namespaced_deployment_scale(
+            name, namespace, {"spec": {"replicas": int(flags["replicas"])}}
+        )
+        return f"deployment.apps/{name} scaled", self._serialize(scale)
+
+    def _rollout_restart(self, args, flags, namespace):
+        kind, name = _target(args)
+        if kind != "deployments" or not name:
+            raise UnsupportedCommand("only deployments can be restarted through the API")
+        restarted_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        body = {"spec": {"template": {"metadata": {"annotations": {"kubectl.kubernetes.io/restartedAt": restarted_at}}}}}
+        deployment = self.apps.patch_namespaced_deployment(name, namespace, body)
+        return f"deployment.apps/{name} restarted", self._serialize(deployment)
+
+    def _rollout_status(self, args, flags, namespace):
+        kind, name = _target(args)
+        if kind != "deployments" or not name:
+            raise UnsupportedCommand("only deployment rollout status is mapped")
+        deadline = time.monotonic() + _parse_timeout(flags.get("timeout"), self.readiness_timeout)
+        while True:
+            deployment = self.apps.read_namespaced_deployment(name, namespace)
+            spec, status = deployment.spec, deployment.status
+            done = (
+                (status.observed_generation or 0) >= deployment.metadata.generation
+                and (status.updated_replicas or 0) == spec.replicas
+                and (status.available_replicas or 0) == spec.replicas
+            )
+            if done:
+                return f'deployment "{name}" successfully rolled out', self._serialize(status)
+            if time.monotonic() > deadline:
+                raise ApiException(status=408, reason="Timeout")
+            time.sleep(1)
+
+    def _create_namespace(self, args, flags, namespace):
+        if len(args) != 1:
+            raise UnsupportedCommand("expected `create namespace <name>`")
+        created = self.core.create_namespace({"metadata": {"name": args[0]}})
+        return f"namespace/{args[0]} created", self._serialize(created)
+
+    def _apply(self, args, flags, namespace):
+        filename = flags.get("filename")
+        if not flags.get("server_side"):
+            # Client-side apply (last-applied annotation, no field ownership) is kubectl's to do
+            raise UnsupportedCommand("only server-side apply is mapped")
+        if args or not filename or filename == "-" or "://" in filename:
+            raise UnsupportedCommand("only `apply --server-side -f <local file>` is mapped")
+        with open(filename) as f:
+            documents = [doc for doc in yaml.safe_load_all(f) if doc]
+
+        lines, applied = [], []
+        for doc in documents:
+            resource = self.dynamic.resources.get(api_version=doc["apiVersion"], kind=doc["kind"])
+            doc_namespace = doc["metadata"].get("namespace", namespace) if resource.namespaced else None
+            result = self.dynamic.server_side_apply(
+                resource, body=doc, name=doc["metadata"]["name"], namespace=doc_namespace,
+                field_manager=FIELD_MANAGER
+            )
+            lines.append(f"{doc['kind'].lower()}/{doc['metadata']['name']} serverside-applied")
+            applied.append(result.to_dict())
+        return "\n".join(lines), applied
+
+
+api_backend = None
+api_backend_lock = threading.Lock()
+api_backend_failed = False
+
+
+def get_api_backend(pool_size: int = 4, readiness_timeout: int = 120):
+    """
+    The shared API backend, created on first use. Returns None when the kubernetes
+    package or cluster credentials are unavailable, so callers use kubectl instead.
+    """
+    global api_backend, api_backend_failed
+    if api_backend is not None or api_backend_failed:
+        return api_backend
+    with api_backend_lock:
+        if api_backend is None and not api_backend_failed:
+            if client is None:
+                logger.warning("kubernetes package not installed, using kubectl for all commands")
+                api_backend_failed = True
+                return None
+            try:
+                api_backend = KubernetesApiBackend(pool_size, readiness_timeout)
+            except Exception as e:
+                logger.warning(f"Kubernetes API client unavailable, using kubectl for all commands: {e}")
+                api_backend_failed = True
+    return api_backend
@@ -0,0 +1,149 @@
+import logging
+import re
+from src.commands.execution_planner import RESOURCE_ALIASES, SUBCOMMAND_VERBS, VALUE_FLAGS, classify_command
+from src.commands.resource_index import ResourceIndex, DEFAULT_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+# Verbs whose resource names are being created, so there is nothing to correct
+SKIP_VERBS = {"create", "apply", "run", "expose"}
+# A runner-up this close to the best match makes the correction ambiguous
+AMBIGUITY_MARGIN = 0.05
+# Long flags that take no value; any other `--flag value` pair has its value skipped (e.g. --sort-by)
+BOOLEAN_FLAGS = {"--all-namespaces", "--all", "--watch", "--watch-only", "--show-labels", "--no-headers",
+                 "--follow", "--previous", "--timestamps", "--force", "--wait", "--overwrite", "--recursive",
+                 "--ignore-not-found", "--show-kind", "--record"}
+
+
+class NameToken:
+    """
+    A resource name inside a command: its kind and the character span it occupies.
+    For `kind/name` tokens the span covers only the name part.
+    """
+
+    def __init__(self, kind: str, name: str, start: int, end: int):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.end = end
+
+
+def find_name_tokens(command: str):
+    """
+    Locates the resource-name positions of a kubectl command.
+    Returns (namespace, [NameToken]); names are only reported for recognised resource types.
+    """
+    tokens = []
+    for match in re.finditer(r"\S+", command):
+        # Stop at pipes, redirects and command separators
+        if match.group()[0] in "|&;<>":
+            break
+        tokens.append((match.group(), match.start(), match.end()))
+    if not tokens or tokens[0][0] != "kubectl":
+        return None, []
+
+    namespace = None
+    positionals = []
+    i = 1
+    while i < len(tokens):
+        text = tokens[i][0]
+        if text in ("-n", "--namespace") and i + 1 < len(tokens):
+            namespace = tokens[i + 1][0]
+            i += 2
+            continue
+        if text.startswith("--namespace="):
+            namespace = text.split("=", 1)[1]
+        elif text in VALUE_FLAGS:
+            i += 2
+            continue
+        elif (text.startswith("--") and "=" not in text and text not in BOOLEAN_FLAGS
+              and i + 1 < len(tokens) and not tokens[i + 1][0].startswith("-")):
+            i += 2
+            continue
+        elif not text.startswith("-"):
+            positionals.append(tokens[i])
+        i += 1
+
+    if not positionals:
+        return namespace, []
+    verb = positionals.pop(0)[0].lower()
+    if verb in SKIP_VERBS:
+        return namespace, []
+    if verb in SUBCOMMAND_VERBS and positionals:
+        positionals.pop(0)
+
+    names = []
+    if verb == "logs":
+        if positionals:
+            text, start, end = positionals[0]
+            offset = text.rfind("/") + 1
+            names.append(NameToken("pods", text[offset:], start + offset, end))
+        return namespace, names
+
+    if not positionals:
+        return namespace, names
+    text, start, end = positionals[0]
+    if "/" in text:
+        kind_text, name = text.split("/", 1)
+        kind = RESOURCE_ALIASES.get(kind_text.lower())
+        if kind and name:
+            offset = len(kind_text) + 1
+            names.append(NameToken(kind, name, start + offset, end))
+        return namespace, names
+
+    kind = RESOURCE_ALIASES.get(text.lower())
+    if kind:
+        # kubectl get pods a b c: every following positional is a name of that kind
+        for name_text, name_start, name_end in positionals[1:]:
+            if "=" in name_text:
+                break
+            names.append(NameToken(kind, name_text, name_start, name_end))
+    return namespace, names
+
+
+def resolve_name(index: ResourceIndex, kind: str, name: str, namespace: str, threshold: float):
+    """
+    Best known name for a (possibly hallucinated) name, or None when no confident match exists.
+    """
+    if index.contains(kind, name, namespace):
+        return None
+
+    # "api" for a pod named "api-7d9f8-x2kq" (a generated suffix): unique prefix match
+    prefixed = index.prefix_search(kind, f"{name}-", namespace, limit=2)
+    if len(prefixed) == 1:
+        return prefixed[0]
+
+    matches = index.similar(kind, name, namespace, limit=2)
+    if not matches or matches[0][1] < threshold:
+        return None
+    if len(matches) > 1 and matches[0][1] - matches[1][1] < AMBIGUITY_MARGIN:
+        logger.info(f"Ambiguous correction for {kind} '{name}': {matches}")
+        return None
+    # api-v1 and api-v2 (or web-1 and web-2) are different resources, not a typo of each other
+    if re.sub(r"\d+", "0", matches[0][0]) == re.sub(r"\d+", "0", name):
+        return None
+    return matches[0][0]
+
+
+def resolve_command(command: str, index: ResourceIndex, threshold: float = 0.75) -> str:
+    """
+    Replaces unknown resource names in a kubectl command with their best known match.
+    Only the name tokens are rewritten, the rest of the command is left byte-for-byte intact.
+    Commands that change the cluster are never rewritten: scaling "web" must not scale "web-canary".
+    """
+    if classify_command(command).mutating:
+        return command
+    namespace, names = find_name_tokens(command)
+    namespace = namespace or DEFAULT_NAMESPACE
+
+    replacements = []
+    for token in names:
+        real_name = resolve_name(index, token.kind, token.name, namespace, threshold)
+        if real_name is not None:
+            replacements.append((token, real_name))
+
+    # Splice from the end so earlier spans stay valid
+    for token, real_name in reversed(replacements):
+        command = command[:token.start] + real_name + command[token.end:]
+        logger.info(f"Resolved {token.kind} '{token.name}' -> '{real_name}'")
+    return command
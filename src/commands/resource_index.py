@@ -0,0 +1,256 @@
+import bisect
+import logging
+import threading
+import time
+
+try:
+    from kubernetes import client, watch
+    from kubernetes.client.rest import ApiException
+except ImportError:
+    client = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACE = "default"
+# How many trigram-overlap candidates get a full edit-distance score
+SIMILARITY_CANDIDATES = 50
+# Trigrams shared by more names than this (e.g. a common "app-" prefix) are skipped when counting
+# overlap, as long as rarer trigrams are available; they say little about which name is meant
+COMMON_TRIGRAM_LIMIT = 1000
+
+
+def trigrams(name: str) -> set:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Optimal string alignment distance: Levenshtein plus adjacent transpositions ("wroker" -> "worker" is 1).
+    """
+    rows = [list(range(len(b) + 1))]
+    for i in range(1, len(a) + 1):
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(rows[i - 1][j] + 1, row[j - 1] + 1, rows[i - 1][j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], rows[i - 2][j - 2] + 1)
+        rows.append(row)
+    return rows[-1][-1]
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    1 - normalized edit distance, in [0, 1].
+    """
+    if not a and not b:
+        return 1.0
+    return 1 - edit_distance(a, b) / max(len(a), len(b))
+
+
+class ResourceIndex:
+    """
+    Namespace-aware index of known resource names per kind.
+    Membership checks are O(1) set/dict lookups; prefix search bisects a sorted name list;
+    similarity search narrows candidates through a trigram index before scoring edit distance.
+    Kinds are created on first use, so new kinds need no registration.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._names = {}      # kind -> namespace -> set(names)
+        self._by_name = {}    # kind -> name -> set(namespaces)
+        self._sorted = {}     # kind -> sorted unique names
+        self._trigrams = {}   # kind -> trigram -> set(names)
+
+    def add(self, kind: str, name: str, namespace: str = DEFAULT_NAMESPACE) -> None:
+        with self._lock:
+            self._names.setdefault(kind, {}).setdefault(namespace, set()).add(name)
+            namespaces = self._by_name.setdefault(kind, {}).setdefault(name, set())
+            if not namespaces:
+                bisect.insort(self._sorted.setdefault(kind, []), name)
+                postings = self._trigrams.setdefault(kind, {})
+                for trigram in trigrams(name):
+                    postings.setdefault(trigram, set()).add(name)
+            namespaces.add(namespace)
+
+    def remove(self, kind: str, name: str, namespace: str = DEFAULT_NAMESPACE) -> None:
+        with self._lock:
+            self._names.get(kind, {}).get(namespace, set()).discard(name)
+            namespaces = self._by_name.get(kind, {}).get(name)
+            if namespaces is None:
+                return
+            namespaces.discard(namespace)
+            if not namespaces:
+                del self._by_name[kind][name]
+                names = self._sorted[kind]
+                del names[bisect.bisect_left(names, name)]
+                postings = self._trigrams[kind]
+                for trigram in trigrams(name):
+                    postings[trigram].discard(name)
+                    if not postings[trigram]:
+                        del postings[trigram]
+
+    def replace(self, kind: str, items: list, namespace: str = None) -> None:
+        """
+        Replaces the known (namespace, name) pairs of a kind with a fresh listing,
+        either for one namespace or (namespace=None) for the whole cluster.
+        """
+        with self._lock:
+            namespaces = [namespace] if namespace is not None else list(self._names.get(kind, {}))
+            for ns in namespaces:
+                for name in list(self._names.get(kind, {}).get(ns, ())):
+                    self.remove(kind, name, ns)
+            for ns, name in items:
+                self.add(kind, name, ns)
+
+    def contains(self, kind: str, name: str, namespace: str = None) -> bool:
+        with self._lock:
+            if namespace is None:
+                return bool(self._by_name.get(kind, {}).get(name))
+            return name in self._names.get(kind, {}).get(namespace, ())
+
+    def names(self, kind: str, namespace: str = None) -> list:
+        with self._lock:
+            if namespace is None:
+                return list(self._sorted.get(kind, []))
+            return sorted(self._names.get(kind, {}).get(namespace, ()))
+
+    def namespaces_of(self, kind: str, name: str) -> set:
+        with self._lock:
+            return set(self._by_name.get(kind, {}).get(name, ()))
+
+    def prefix_search(self, kind: str, prefix: str, namespace: str = None, limit: int = 10) -> list:
+        with self._lock:
+            names = self._sorted.get(kind, [])
+            matches = []
+            for name in names[bisect.bisect_left(names, prefix):]:
+                if not name.startswith(prefix) or len(matches) >= limit:
+                    break
+                if namespace is None or namespace in self._by_name[kind][name]:
+                    matches.append(name)
+            return matches
+
+    def similar(self, kind: str, name: str, namespace: str = None, limit: int = 3) -> list:
+        """
+        Known names most similar to `name`, as (name, similarity) pairs sorted best first.
+        """
+        with self._lock:
+            postings = self._trigrams.get(kind, {})
+            overlap = {}
+            lists = sorted((postings[t] for t in trigrams(name) if t in postings), key=len)
+            for i, names in enumerate(lists):
+                if i > 0 and len(names) > COMMON_TRIGRAM_LIMIT:
+                    break
+                for candidate in names:
+                    overlap[candidate] = overlap.get(candidate, 0) + 1
+            if namespace is not None:
+                overlap = {c: count for c, count in overlap.items() if namespace in self._by_name[kind][c]}
+            candidates = sorted(overlap, key=overlap.get, reverse=True)[:SIMILARITY_CANDIDATES]
+        scored = sorted(((c, similarity(name, c)) for c in candidates), key=lambda pair: (-pair[1], pair[0]))
+        return scored[:limit]
+
+    def fuzzy_search(self, kind: str, name: str, namespace: str = None, limit: int = 3, cutoff: float = 0.6) -> list:
+        return [candidate for candidate, score in self.similar(kind, name, namespace, limit) if score >= cutoff]
+
+    def summary(self, namespace: str = None, limit: int = 20) -> str:
+        """
+        Short "kind: name, name" listing for prompts and messages.
+        """
+        with self._lock:
+            kinds = sorted(self._names)
+        lines = []
+        for kind in kinds:
+            names = self.names(kind, namespace)
+            if names:
+                more = f" (+{len(names) - limit} more)" if len(names) > limit else ""
+                lines.append(f"{kind}: {', '.join(names[:limit])}{more}")
+        return "\n".join(lines)
+
+
+class ResourceWatcher:
+    """
+    Keeps a ResourceIndex warm with list+watch per kind across all namespaces.
+    Watches resume from the last seen resourceVersion and relist when it has expired (410 Gone).
+    """
+
+    def __init__(self, index: ResourceIndex, api_client, timeout_seconds: int = 300):
+        self.index = index
+        self.timeout_seconds = timeout_seconds
+        core = client.CoreV1Api(api_client)
+        apps = client.AppsV1Api(api_client)
+        self.list_functions = {
+            "pods": core.list_pod_for_all_namespaces,
+            "services": core.list_service_for_all_namespaces,
+            "deployments": apps.list_deployment_for_all_namespaces,
+        }
+        self._threads = []
+        self._stopped = threading.Event()
+
+    def watch_kind(self, kind: str, list_function) -> None:
+        """
+        Adds another kind, given its list-for-all-namespaces API function.
+        """
+        self.list_functions[kind] = list_function
+
+    def start(self) -> None:
+        for kind, list_function in self.list_functions.items():
+            thread = threading.Thread(
+                target=self._run, args=(kind, list_function), name=f"watch-{kind}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _relist(self, kind: str, list_function) -> str:
+        listing = list_function()
+        items = [(item.metadata.namespace or DEFAULT_NAMESPACE, item.metadata.name) for item in listing.items]
+        self.index.replace(kind, items)
+        logger.info(f"Indexed {len(items)} {kind} at resourceVersion {listing.metadata.resource_version}")
+        return listing.metadata.resource_version
+
+    def _run(self, kind: str, list_function) -> None:
+        resource_version = None
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                if resource_version is None:
+                    resource_version = self._relist(kind, list_function)
+                stream = watch.Watch().stream(
+                    list_function,
+                    resource_version=resource_version,
+                    timeout_seconds=self.timeout_seconds,
+                    allow_watch_bookmarks=True
+                )
+                for event in stream:
+                    if event["type"] == "ERROR":
+                        # Expired resourceVersion reported in-stream, start over from a fresh list
+                        resource_version = None
+                        break
+                    obj = event["object"]
+                    resource_version = obj.metadata.resource_version
+                    if event["type"] == "BOOKMARK":
+                        continue
+                    namespace = obj.metadata.namespace or DEFAULT_NAMESPACE
+                    if event["type"] == "DELETED":
+                        self.index.remove(kind, obj.metadata.name, namespace)
+                    else:
+                        self.index.add(kind, obj.metadata.name, namespace)
+                    if self._stopped.is_set():
+                        return
+                backoff = 1
+            except ApiException as e:
+                if e.status == 410:
+                    logger.info(f"resourceVersion {resource_version} for {kind} expired, relisting")
+                    resource_version = None
+                    continue
+                logger.warning(f"Watch for {kind} failed: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            except Exception as e:
+                logger.warning(f"Watch for {kind} failed: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
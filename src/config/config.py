@@ -11,3 +11,141 @@ load_dotenv(dotenv_path=env_path)
 
 SIGNING_SECRET = os.environ.get("signToken")
 SLACK_BOT_TOKEN = os.environ.get("slackToken")
+# Several frontends (one per core) can run side by side on different ports behind a load balancer
+SLACK_PORT = int(os.environ.get("slackPort", "5000"))
+
+# Slack event intake: events are acknowledged immediately and processed by a worker pool
+SLACK_WORKERS = int(os.environ.get("slackWorkers", "4"))
+SLACK_QUEUE_SIZE = int(os.environ.get("slackQueueSize", "32"))
+# "reject" drops events when the queue is full, "defer" waits up to SLACK_QUEUE_DEFER_TIMEOUT for room
+SLACK_QUEUE_OVERFLOW = os.environ.get("slackQueueOverflow", "reject")
+SLACK_QUEUE_DEFER_TIMEOUT = float(os.environ.get("slackQueueDeferTimeout", "1.5"))
+# Outbound Slack calls: per-channel queues drained by SLACK_DELIVERY_WORKERS threads, each channel paced by a
+# token bucket (Slack allows about one message per second per channel, with short bursts)
+SLACK_DELIVERY_WORKERS = int(os.environ.get("slackDeliveryWorkers", "4"))
+SLACK_CHANNEL_RATE = float(os.environ.get("slackChannelRate", "1.0"))
+SLACK_CHANNEL_BURST = int(os.environ.get("slackChannelBurst", "3"))
+# Retries of rate-limited (after Retry-After), 5xx and connection-failed calls; backoff doubles per retry
+SLACK_MAX_RETRIES = int(os.environ.get("slackMaxRetries", "3"))
+SLACK_RETRY_BACKOFF = float(os.environ.get("slackRetryBackoff", "1.0"))
+
+# Slack event_id dedup: "memory" (bounded, per process), "sqlite" (survives restarts, shared by replicas on
+# one volume) or "redis" (shared by replicas anywhere, needs the redis package)
+DEDUP_BACKEND = os.environ.get("dedupBackend", "sqlite")
+# Seconds an event_id is remembered; Slack retries a delivery for a few minutes at most
+DEDUP_TTL = float(os.environ.get("dedupTtl", "3600"))
+# Event_ids kept by the memory and sqlite backends (redis keys only expire by dedupTtl)
+DEDUP_MAX_SIZE = int(os.environ.get("dedupMaxSize", "10000"))
+DEDUP_PATH = os.environ.get("dedupPath", "state/slack_events.db")
+DEDUP_REDIS_URL = os.environ.get("dedupRedisUrl", "redis://localhost:6379/0")
+
+# Micro-batching of concurrent model.generate calls
+INFERENCE_BATCHING = os.environ.get("inferenceBatching", "true").lower() == "true"
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("inferenceMaxBatchSize", "8"))
+INFERENCE_MAX_WAIT = float(os.environ.get("inferenceMaxWait", "0.05"))
+
+# Stream CoT tokens into Slack, editing one message at most every SLACK_UPDATE_INTERVAL seconds
+STREAM_GENERATION = os.environ.get("streamGeneration", "true").lower() == "true"
+SLACK_UPDATE_INTERVAL = float(os.environ.get("slackUpdateInterval", "1.0"))
+# Generate steps and commands in one pass as a JSON object instead of two sequential generations
+STRUCTURED_GENERATION = os.environ.get("structuredGeneration", "false").lower() == "true"
+
+# Intent -> (CoT, approved commands) cache in front of the model
+RESPONSE_CACHE_ENABLED = os.environ.get("responseCacheEnabled", "true").lower() == "true"
+RESPONSE_CACHE_SIZE = int(os.environ.get("responseCacheSize", "256"))
+RESPONSE_CACHE_TTL = float(os.environ.get("responseCacheTtl", "3600"))
+# Empty keeps the cache in memory only
+RESPONSE_CACHE_PATH = os.environ.get("responseCachePath", "")
+# Similarity (0-1) for matching intents that differ only in filler words, 0 (the default) disables the fuzzy tier
+RESPONSE_CACHE_FUZZY_THRESHOLD = float(os.environ.get("responseCacheFuzzyThreshold", "0"))
+# Template fast path: routine requests (get/describe/logs/scale/restart/rollout status) matched with at least
+# this confidence are turned into kubectl commands without the model
+INTENT_ROUTER_ENABLED = os.environ.get("intentRouterEnabled", "true").lower() == "true"
+INTENT_ROUTER_THRESHOLD = float(os.environ.get("intentRouterThreshold", "0.75"))
+
+# Policy checks: "local" evaluates policy.rego in-process, "remote" queries the OPA server,
+# "verify" queries both, logs any disagreement and trusts the OPA server
+POLICY_MODE = os.environ.get("policyMode", "local")
+POLICY_PATH = os.environ.get("policyPath", "policy.rego")
+
+# Remote OPA client: pooled session, timeouts/retries and a decision cache per policy revision
+OPA_TIMEOUT = float(os.environ.get("opaTimeout", "2.0"))
+OPA_RETRIES = int(os.environ.get("opaRetries", "2"))
+OPA_POOL_SIZE = int(os.environ.get("opaPoolSize", "10"))
+OPA_CACHE_SIZE = int(os.environ.get("opaCacheSize", "1024"))
+OPA_REVISION_CHECK_INTERVAL = float(os.environ.get("opaRevisionCheckInterval", "30"))
+
+# kubectl execution: "dag" runs independent commands concurrently, "sequential" keeps the fixed delays
+EXECUTION_MODE = os.environ.get("executionMode", "dag")
+EXECUTION_WORKERS = int(os.environ.get("executionWorkers", "4"))
+# Seconds a readiness wait (rollout status / kubectl wait) may take before giving up
+READINESS_TIMEOUT = int(os.environ.get("readinessTimeout", "120"))
+# "api" runs common verbs through a pooled Kubernetes API client (falling back to kubectl), "subprocess" always shells out
+EXECUTION_BACKEND = os.environ.get("executionBackend", "api")
+# Keep the resource name index warm with list+watch (needs the "api" execution backend)
+RESOURCE_WATCH = os.environ.get("resourceWatch", "true").lower() == "true"
+# Minimum name similarity (0-1) for rewrite_command to replace an unknown resource name
+NAME_RESOLUTION_THRESHOLD = float(os.environ.get("nameResolutionThreshold", "0.75"))
+# Names per resource kind from the resource index added to the generation prompts, so the model uses
+# names that exist; 0 leaves the cluster out of the prompts
+PROMPT_RESOURCE_LIMIT = int(os.environ.get("promptResourceLimit", "20"))
+# Characters of output kept per command stream; the rest is read (and scanned for resource names and errors)
+# but not kept, so huge listings don't balloon memory
+KUBECTL_OUTPUT_LIMIT = int(os.environ.get("kubectlOutputLimit", "1000000"))
+# Characters of each command's output shown in the Slack message; longer outputs are delivered in full
+# as a file (Slack's external upload flow, files.upload is retired) or as thread replies ("pages")
+SLACK_OUTPUT_LIMIT = int(os.environ.get("slackOutputLimit", "3000"))
+SLACK_OUTPUT_DELIVERY = os.environ.get("slackOutputDelivery", "file")
+# Slack truncates message text beyond 40,000 characters
+SLACK_MESSAGE_LIMIT = int(os.environ.get("slackMessageLimit", "39000"))
+# Rounds of refining the commands that failed (each round regenerates only those and what depends on them)
+REFINEMENT_ROUNDS = int(os.environ.get("refinementRounds", "2"))
+
+# Model backend: "cuda-fp16", "cpu-fp32", "cpu-int8" (dynamic quantization) or "cpu-int4" (needs optimum-quanto)
+MODEL_BACKEND = os.environ.get("modelBackend", "cuda-fp16")
+# Fold the LoRA adapter into the base weights at load so decoding skips the PEFT layers
+MERGE_ADAPTER = os.environ.get("mergeAdapter", "true").lower() == "true"
+# Directory of a merged (base + adapter) checkpoint written by export_merged_model; used instead of
+# BASE_MODEL_NAME + ADAPTER_PATH when it exists
+MERGED_MODEL_PATH = os.environ.get("mergedModelPath", "model_cache/merged")
+# Write the merged checkpoint to MERGED_MODEL_PATH after the first PEFT merge so restarts skip it
+CACHE_MERGED_MODEL = os.environ.get("cacheMergedModel", "true").lower() == "true"
+# Seconds a request waits for a model that is still loading before being told to retry (0 = don't wait)
+MODEL_READY_TIMEOUT = float(os.environ.get("modelReadyTimeout", "0"))
+# Frontend/model-server split: comma-separated model server URLs (see src/model/model_server.py). When set,
+# this process doesn't load the model and sends generation requests to the healthiest, least busy server
+MODEL_SERVER_URLS = [url.strip().rstrip("/") for url in os.environ.get("modelServerUrls", "").split(",") if url.strip()]
+# Seconds to wait for a generation (or, when streaming, for the next chunk) before trying another server
+MODEL_SERVER_TIMEOUT = float(os.environ.get("modelServerTimeout", "120"))
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.environ.get("modelServerConnectTimeout", "2"))
+MODEL_SERVER_HEALTH_INTERVAL = float(os.environ.get("modelServerHealthInterval", "5"))
+MODEL_SERVER_PORT = int(os.environ.get("modelServerPort", "8600"))
+# Reuse the precomputed key/values of the fixed system prompts so only the request suffix is prefilled
+PREFIX_CACHE = os.environ.get("prefixCache", "true").lower() == "true"
+# Speculative decoding for command generation: "off", "prompt-lookup" (n-gram drafts copied from the prompt/CoT)
+# or "draft" (a small draft model sharing the tokenizer)
+SPECULATIVE_DECODING = os.environ.get("speculativeDecoding", "off")
+DRAFT_MODEL_NAME = os.environ.get("draftModelName", "Qwen/Qwen2.5-Coder-0.5B-Instruct")
+# Tokens proposed per prompt-lookup draft
+PROMPT_LOOKUP_TOKENS = int(os.environ.get("promptLookupTokens", "10"))
+
+# Finished traces (one JSON object per Slack event) are appended here; empty disables the file export
+TRACE_EXPORT_PATH = os.environ.get("traceExportPath", "logs/traces.jsonl")
+# Recent traces kept in memory for GET /traces
+TRACE_BUFFER_SIZE = int(os.environ.get("traceBufferSize", "100"))
+# Serve GET /traces (Slack and model server); off by default, traces carry message text and commands
+# and the endpoint has no authentication
+TRACES_ENDPOINT_ENABLED = os.environ.get("tracesEndpoint", "false").lower() == "true"
+
+# Logging: records are queued and written by a background thread; files rotate and old ones are gzip-compressed
+LOG_DIR = os.environ.get("logDir", "logs")
+LOG_LEVEL = os.environ.get("logLevel", "INFO").upper()
+# "size" rotates at logMaxBytes, otherwise a TimedRotatingFileHandler interval such as "midnight" or "h"
+LOG_ROTATION = os.environ.get("logRotation", "size")
+LOG_MAX_BYTES = int(os.environ.get("logMaxBytes", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("logBackupCount", "10"))
+# Records waiting for the writer thread; beyond this they are dropped rather than blocking the bot
+LOG_QUEUE_SIZE = int(os.environ.get("logQueueSize", "10000"))
+# Command outputs longer than this are truncated in the log and saved whole under <logDir>/outputs
+LOG_OUTPUT_LIMIT = int(os.environ.get("logOutputLimit", "4096"))
+LOG_OFFLOAD_KEEP = int(os.environ.get("logOffloadKeep", "200"))
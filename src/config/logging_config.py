@@ -1,16 +1,244 @@
+import atexit
+import gzip
+import hashlib
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from src.config.config import (
+    LOG_DIR,
+    LOG_LEVEL,
+    LOG_ROTATION,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE,
+    LOG_OUTPUT_LIMIT,
+    LOG_OFFLOAD_KEEP,
+    TRACE_EXPORT_PATH
+)
+from src.tracing.tracing import current_trace_id
 
-LOG_FILE_PATH = r"/mnt/c/Users/8bit OXY/Desktop/KubecomWorkflow/logs/bot.log"
+LOG_FILE_PATH = os.path.join(LOG_DIR, "bot.log")
+OFFLOAD_DIR = os.path.join(LOG_DIR, "outputs")
+
+# Attributes every LogRecord has; anything else on a record came in through `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps records with the Slack event_id of the current trace. Runs in the logging thread,
+    before the record is handed to the writer thread where the trace context is gone.
+    """
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = current_trace_id()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Never blocks the caller: when the writer falls behind and the queue is full, records are dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message, request_id and any `extra=` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class OutputOffloadFilter(logging.Filter):
+    """
+    Keeps log lines small: an `output` field longer than LOG_OUTPUT_LIMIT characters is cut down to its start
+    and end, and the full text is written to OFFLOAD_DIR (only the newest LOG_OFFLOAD_KEEP files are kept).
+    Runs in the writer thread, so the command that produced the output never waits on it.
+    """
+
+    def __init__(self, directory: str, limit: int, keep: int):
+        super().__init__()
+        self.directory = directory
+        self.limit = limit
+        self.keep = keep
+
+    def filter(self, record):
+        output = getattr(record, "output", None)
+        if not isinstance(output, str) or len(output) <= self.limit:
+            return True
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha1(output.encode("utf-8", "replace")).hexdigest()[:12]
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{record.request_id or 'none'}-{digest}.log")
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(output)
+            self._prune()
+        except OSError as e:
+            path = f"not saved ({e})"
+        half = self.limit // 2
+        record.output = f"{output[:half]}\n... [{len(output) - self.limit} characters truncated] ...\n{output[-half:]}"
+        record.output_file = path
+        record.output_length = len(output)
+        return True
+
+    def _prune(self) -> None:
+        files = sorted(os.listdir(self.directory))
+        for name in files[:max(0, len(files) - self.keep)]:
+            os.remove(os.path.join(self.directory, name))
+
+
+def _gzip_rotator(source: str, destination: str) -> None:
+    with open(source, "rb") as src, gzip.open(destination, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _file_handler(path: str, formatter: logging.Formatter) -> logging.Handler:
+    """
+    Rotating file handler: by size ("size") or on a TimedRotatingFileHandler schedule ("midnight", "h", ...),
+    keeping LOG_BACKUP_COUNT gzip-compressed archives.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if LOG_ROTATION == "size":
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+    else:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATION, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True, utc=True
+        )
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(formatter)
+    return handler
+
+
+_lock = threading.Lock()
+_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_queue_handler = DroppingQueueHandler(_queue)
+_queue_handler.addFilter(RequestIdFilter())
+_listener = None
+_routes = {}  # logger name -> handler in the listener
+
+
+class _Router(logging.Handler):
+    """
+    Writer-thread side of the pipeline: sends each record to the handler of its logger's file,
+    falling back to the main log.
+    """
+
+    def handle(self, record):
+        handlers = _routes.get(record.name)
+        if handlers is None:
+            handlers = _routes[None]
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def emit(self, record):
+        pass
+
+
+def setup_logging() -> None:
+    """
+    Routes all logging through one bounded queue to a background writer thread (QueueListener),
+    so log calls on the request path only enqueue a record.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s"))
+        _routes[None] = [_file_handler(LOG_FILE_PATH, JsonFormatter()), console]
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(_queue, _Router(), respect_handler_level=False)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+    if TRACE_EXPORT_PATH:
+        # Finished traces are already JSON, they are written as-is
+        add_file_logger("Traces", TRACE_EXPORT_PATH, formatter=logging.Formatter("%(message)s"))
+
+
+def add_file_logger(name: str, path: str, formatter: logging.Formatter = None, propagate: bool = False,
+                    offload_outputs: bool = False) -> logging.Logger:
+    """
+    A logger whose records go (through the queue) to their own rotating JSON-lines file.
+    With `propagate` they also reach the main log and the console.
+    """
+    setup_logging()
+    handler = _file_handler(path, formatter or JsonFormatter())
+    if offload_outputs:
+        handler.addFilter(OutputOffloadFilter(OFFLOAD_DIR, LOG_OUTPUT_LIMIT, LOG_OFFLOAD_KEEP))
+    with _lock:
+        _routes[name] = [handler] + (_routes[None] if propagate else [])
+    named_logger = logging.getLogger(name)
+    named_logger.setLevel(logging.INFO)
+    # Records reach the queue through the root logger's handler, the router picks the file
+    named_logger.propagate = True
+    return named_logger
+
+
+def shutdown_logging() -> None:
+    """
+    Drains the queue and closes the files.
+    """
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        if _queue_handler.dropped:
+            # The listener is stopped, so this can't go through logging
+            sys.stderr.write(f"Logging queue overflowed, {_queue_handler.dropped} records dropped\n")
+        for handlers in _routes.values():
+            for handler in handlers:
+                handler.close()
+
+
+def logging_stats() -> dict:
+    return {"queued": _queue.qsize(), "dropped": _queue_handler.dropped}
 
-# Configure logging: set level, format, and handlers
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE_PATH),
-        logging.StreamHandler()
-    ]
-)
 
+setup_logging()
 logger = logging.getLogger(__name__)
@@ -0,0 +1,176 @@
+import logging
+import re
+import threading
+from src.commands.execution_planner import RESOURCE_ALIASES
+from src.commands.name_resolver import resolve_name
+from src.commands.resource_index import ResourceIndex
+from src.intent_processing.response_cache import normalize_intent
+from src.tracing.tracing import metrics
+
+logger = logging.getLogger(__name__)
+
+# Confidence when the resource index knows nothing about the kind in that namespace (e.g. no watch and no
+# listing yet), so the name can't be checked; the command fails and is refined if the name is wrong
+UNVERIFIED_CONFIDENCE = 0.8
+# Confidence of a name the index corrected (a unique prefix or a close match)
+RESOLVED_CONFIDENCE = 0.9
+# Confidence of a name the index doesn't know while knowing others in that namespace
+UNKNOWN_CONFIDENCE = 0.5
+# Intents that change the cluster: routed only when the index knows the exact name, never corrected or unverified
+MUTATING_INTENTS = {"scale", "restart"}
+
+_KIND = r"(?P<kind>po|pods?|svc|services?|deploy|deployments?|ns|namespaces?)"
+_NAME = r"(?P<name>[a-z0-9](?:[a-z0-9.-]*[a-z0-9])?)"
+_NAMESPACE = (r"(?: (?:(?:in|from|on) (?:the )?(?:namespace )?|-n |--namespace[ =])"
+              r"(?P<namespace>[a-z0-9](?:[a-z0-9-]*[a-z0-9])?)(?: namespace)?)?")
+_DEPLOYMENT = rf"(?:(?:deployment|deploy) {_NAME}|{_NAME}(?: deployment)?)"
+# Words a name slot must not swallow ("restart the deployment in staging" names no deployment)
+_NOT_NAMES = set(RESOURCE_ALIASES) | {"the", "a", "all", "my", "it", "them", "in", "from", "on", "of", "for", "to"}
+# Words a namespace slot must not take ("in all namespaces" means -A, not a namespace called "all")
+_NOT_NAMESPACES = {"all", "every", "any", "each"}
+
+# intent -> (patterns over the normalized text, command template, kind of the name slot)
+TEMPLATES = {
+    "list": ([rf"(?:get|list|show)(?: me)?(?: all)?(?: the)? {_KIND}{_NAMESPACE}"],
+             "kubectl get {kind}{namespace_flag}", None),
+    "get": ([rf"(?:get|show)(?: me)?(?: the)? {_KIND} {_NAME}{_NAMESPACE}",
+             rf"(?:get|show)(?: me)?(?: the)? {_NAME} {_KIND}{_NAMESPACE}"],
+            "kubectl get {kind} {name}{namespace_flag}", "{kind}"),
+    "describe": ([rf"describe(?: the)? {_KIND} {_NAME}{_NAMESPACE}",
+                  rf"describe(?: the)? {_NAME} {_KIND}{_NAMESPACE}"],
+                 "kubectl describe {kind} {name}{namespace_flag}", "{kind}"),
+    "logs": ([rf"(?:(?:show|get|print|fetch)(?: me)?(?: the)? )?logs? (?:of|for|from)(?: the)? (?:pod {_NAME}|{_NAME}(?: pod)?){_NAMESPACE}"],
+             "kubectl logs {name}{namespace_flag}", "pods"),
+    "scale": ([rf"scale(?: the)? {_DEPLOYMENT} to (?P<replicas>\d{{1,3}})(?: replicas?)?{_NAMESPACE}"],
+              "kubectl scale deployment {name} --replicas={replicas}{namespace_flag}", "deployments"),
+    "restart": ([rf"(?:rollout |rolling )?restart(?: the)? {_DEPLOYMENT}{_NAMESPACE}"],
+                "kubectl rollout restart deployment/{name}{namespace_flag}", "deployments"),
+    "rollout_status": ([rf"(?:(?:what is|what s|show|check|get) )?(?:the )?rollout status (?:of|for)(?: the)? {_DEPLOYMENT}{_NAMESPACE}"],
+                       "kubectl rollout status deployment/{name}{namespace_flag}", "deployments"),
+}
+_POLITE = r"(?:(?:please|can you|could you|kindly) )?"
+
+
+def _compile(pattern: str):
+    # _DEPLOYMENT offers the name slot in two places; number the duplicates so the pattern compiles
+    count = iter(range(1000))
+    pattern = re.sub(r"\(\?P<name>", lambda _: f"(?P<name{next(count) or ''}>", pattern)
+    return re.compile(rf"{_POLITE}{pattern}(?: please)?")
+
+
+_COMPILED = {intent: [_compile(pattern) for pattern in patterns] for intent, (patterns, _, _) in TEMPLATES.items()}
+
+
+class RoutedIntent:
+    """
+    A message matched to a command template: its intent, slots, filled-in commands and how sure the router is.
+    """
+
+    def __init__(self, intent: str, slots: dict, commands: list, confidence: float):
+        self.intent = intent
+        self.slots = slots
+        self.commands = commands
+        self.confidence = confidence
+
+    @property
+    def cot(self) -> str:
+        """
+        Steps shown in place of the model's chain-of-thought.
+        """
+        steps = [f"Step 1: Recognised a '{self.intent}' request ({self.confidence:.0%} confident)"]
+        steps += [f"Step {i}: Run {command}" for i, command in enumerate(self.commands, 2)]
+        return "\n".join(steps)
+
+    def to_dict(self) -> dict:
+        return {"intent": self.intent, "slots": self.slots, "commands": self.commands, "confidence": self.confidence}
+
+
+class IntentRouter:
+    """
+    Fast path in front of the model for routine requests ("get pods in staging", "scale api to 3").
+    Messages are matched against TEMPLATES after normalize_intent; the resource name slot is checked against
+    (and for reads corrected by) the resource index in the request's namespace, which sets the confidence.
+    Mutations (MUTATING_INTENTS) need a namespace and the exact name in the index there. route() only returns matches at or above `threshold`, everything else
+    goes to the model.
+    """
+
+    def __init__(self, index: ResourceIndex, threshold: float = 0.75, name_threshold: float = 0.75):
+        self.index = index
+        self.threshold = threshold
+        self.name_threshold = name_threshold
+        self._lock = threading.Lock()
+        self.metrics = {"routed": 0, "low_confidence": 0, "unmatched": 0}
+
+    def match(self, text: str):
+        """
+        The first template matching `text`, whatever its confidence, or None.
+        """
+        normalized = normalize_intent(text)
+        for intent, patterns in _COMPILED.items():
+            for pattern in patterns:
+                found = pattern.fullmatch(normalized)
+                if found is None:
+                    continue
+                routed = self._fill(intent, found)
+                if routed is not None:
+                    return routed
+        return None
+
+    def route(self, text: str):
+        """
+        A RoutedIntent for a confident match, or None when the model should handle the message.
+        """
+        routed = self.match(text)
+        if routed is None:
+            outcome = "unmatched"
+        elif routed.confidence < self.threshold:
+            outcome = "low_confidence"
+            logger.info(f"Intent '{routed.intent}' matched with low confidence ({routed.confidence:.2f}): {text}")
+        else:
+            outcome = "routed"
+        with self._lock:
+            self.metrics[outcome] += 1
+        metrics.inc("kubecom_intent_routes_total", help="Messages seen by the intent router", outcome=outcome)
+        return routed if outcome == "routed" else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.metrics)
+
+    def _fill(self, intent: str, found):
+        _, template, name_kind = TEMPLATES[intent]
+        groups = {key: value for key, value in found.groupdict().items() if value is not None}
+        name = next((value for key, value in groups.items() if re.fullmatch(r"name\d*", key)), None)
+        if name in _NOT_NAMES or groups.get("namespace") in _NOT_NAMESPACES:
+            return None
+        slots = {
+            "kind": RESOURCE_ALIASES.get(groups.get("kind"), groups.get("kind")),
+            "name": name,
+            "namespace": groups.get("namespace"),
+            "replicas": groups.get("replicas"),
+        }
+
+        confidence = 1.0
+        if name is not None:
+            slots["name"], confidence = self._resolve(name_kind.format(**slots), name, slots["namespace"],
+                                                      exact=intent in MUTATING_INTENTS)
+        namespace_flag = f" -n {slots['namespace']}" if slots["namespace"] else ""
+        command = template.format(namespace_flag=namespace_flag, **slots)
+        return RoutedIntent(intent, {key: value for key, value in slots.items() if value is not None},
+                            [command], confidence)
+
+    def _resolve(self, kind: str, name: str, namespace: str, exact: bool = False) -> (str, float):
+        if namespace is None:
+            # Where the command runs is settled later (the policy check may add a namespace), so the name
+            # can't be checked or corrected against one; mutations are left to the model
+            return name, UNKNOWN_CONFIDENCE if exact else UNVERIFIED_CONFIDENCE
+        if self.index.contains(kind, name, namespace):
+            return name, 1.0
+        if exact:
+            return name, UNKNOWN_CONFIDENCE
+        if not self.index.names(kind, namespace):
+            return name, UNVERIFIED_CONFIDENCE
+        resolved = resolve_name(self.index, kind, name, namespace, self.name_threshold)
+        if resolved is not None:
+            return resolved, RESOLVED_CONFIDENCE
+        return name, UNKNOWN_CONFIDENCE
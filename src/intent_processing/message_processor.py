@@ -1,20 +1,88 @@
 import logging
 import re
-from src.model.model_loader import load_model
-from src.commands.command_executor import execute_kubectl_commands
-from src.commands.command_generation import (
-    generate_cot, 
-    generate_commands, 
-    refine_commands
+from src.model.model_loader import start_model_loading, get_model, ModelNotReadyError
+from src.model.batching import wrap_model
+from src.config.config import (
+    STREAM_GENERATION,
+    STRUCTURED_GENERATION,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_FUZZY_THRESHOLD,
+    INTENT_ROUTER_ENABLED,
+    INTENT_ROUTER_THRESHOLD,
+    NAME_RESOLUTION_THRESHOLD,
+    PROMPT_RESOURCE_LIMIT,
+    MODEL_READY_TIMEOUT,
+    SLACK_OUTPUT_LIMIT,
+    REFINEMENT_ROUNDS
 )
-from src.opa.opa_integration import opa_check_command
+from src.intent_processing.response_cache import ResponseCache
+from src.intent_processing.intent_router import IntentRouter
+from src.commands.command_executor import execute_kubectl_commands, resource_index
+from src.commands.command_generation import LocalGenerator
+from src.opa.opa_integration import opa_check_commands
+from src.tracing.tracing import span, annotate
 
-model, tokenizer = load_model()
+def start_model():
+    """
+    Starts loading the model in the background (or connecting to the model servers);
+    requests that need it before it is ready are told to retry.
+    """
+    start_model_loading(wrap=wrap_model)
+
+def _get_generator():
+    model, tokenizer = get_model(timeout=MODEL_READY_TIMEOUT)
+    # Without a tokenizer the model is already a generator, e.g. a RemoteModel when model servers are configured
+    return model if tokenizer is None else LocalGenerator(model, tokenizer)
+
+response_cache = ResponseCache(
+    max_size=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    path=RESPONSE_CACHE_PATH or None,
+    fuzzy_threshold=RESPONSE_CACHE_FUZZY_THRESHOLD
+) if RESPONSE_CACHE_ENABLED else None
+
+intent_router = IntentRouter(
+    resource_index,
+    threshold=INTENT_ROUTER_THRESHOLD,
+    name_threshold=NAME_RESOLUTION_THRESHOLD
+) if INTENT_ROUTER_ENABLED else None
+
+def with_known_resources(text: str) -> str:
+    """
+    `text` followed by the resource names the index knows, for the generation prompts. It goes in the
+    request rather than the system prompt, so the cached system prompt prefix still applies.
+    """
+    known = resource_index.summary(limit=PROMPT_RESOURCE_LIMIT) if PROMPT_RESOURCE_LIMIT > 0 else ""
+    return f"{text}\n\nKnown resources in the cluster:\n{known}" if known else text
 
-def extract_error_from_output(execution_output: str) -> str:
-    lines = execution_output.split("\n")
-    error_lines = [line for line in lines if "error:" in line.lower()]
-    return "\n".join(error_lines) if error_lines else "Unknown error"
+def describe_failures(results: list) -> str:
+    """
+    The error of each command that failed or wasn't run, for the refinement prompt.
+    """
+    return "\n".join(f"{result.command}: {result.error}" for result in results if result.status != "succeeded")
+
+def _output_filename(command: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", command.replace("kubectl ", "", 1)).strip("_")[:80] + ".txt"
+
+def format_results(results: list) -> (str, list):
+    """
+    The command outputs as shown in Slack, each cut to SLACK_OUTPUT_LIMIT characters. The full text
+    of the cut ones is returned as files ({"filename", "title", "content"}) to deliver alongside.
+    """
+    sections = []
+    files = []
+    for result in results:
+        output = result.output
+        if len(output) > SLACK_OUTPUT_LIMIT:
+            shown = output[:SLACK_OUTPUT_LIMIT].rsplit("\n", 1)[0]
+            hidden_lines = output.count("\n") - shown.count("\n")
+            output = f"{shown}\n... [{hidden_lines} more lines in the full output below]"
+            files.append({"filename": _output_filename(result.command), "title": result.command, "content": result.output})
+        sections.append(f"Command: {result.command}\nOutput: {output}")
+    return "\n\n".join(sections), files
 
 def extract_steps_from_cot(cot: str) -> str:
     """
@@ -38,88 +106,250 @@ def extract_steps_from_cot(cot: str) -> str:
     # Fallback: return entire chain-of-thought if no bullet lines found
     return cot
 
+def _generate_structured(text, generator):
+    """
+    Stages 1-2 in a single generation; the CoT stage is yielded as soon as the steps are complete.
+    Returns (cot, commands), or None when the output wasn't a valid plan.
+    """
+    cot = None
+    commands = []
+    try:
+        for kind, value in generator.generate_plan_stream(with_known_resources(text)):
+            if kind == "steps":
+                cot = "\n".join(f"Step {i}: {step}" for i, step in enumerate(value, 1))
+                yield {"stage": "cot", "message": f"💡 *Chain-of-Thought:*\n```{cot}```"}
+            else:
+                commands = value
+    except ValueError as e:
+        logging.warning(f"Structured generation failed, falling back to two passes: {e}")
+        return None
+    logging.info(f"Structured plan: {cot} -> {commands}")
+    return cot, commands
+
+def _route_plan(text):
+    """
+    Stages 1-3 from the intent router's templates instead of the model. Returns (cot, commands, allowed_commands),
+    None after a 'final' stage, or False when the message isn't a confident template match.
+    """
+    with span("route_intent") as routing:
+        routed = intent_router.route(text)
+        routing.set(intent=routed.intent if routed else None)
+    annotate(routed_intent=routed.intent if routed else None)
+    if routed is None:
+        return False
+    logging.info(f"Routed to '{routed.intent}' ({routed.confidence:.2f}): {routed.commands}")
+    yield {"stage": "cot", "message": f"💡 *Chain-of-Thought:*\n```{routed.cot}```"}
+    # Templated commands face the same policy as generated ones
+    return (yield from _validate_commands(routed.cot, routed.commands))
+
+def _generate_plan(text):
+    """
+    Runs stages 1-3 (CoT, command generation, OPA validation), yielding their Slack updates.
+    Returns (cot, commands, allowed_commands), or None once a 'final' stage has been yielded.
+    """
+    generator = _get_generator()
+
+    plan = (yield from _generate_structured(text, generator)) if STRUCTURED_GENERATION else None
+    if plan is not None:
+        cot, commands = plan
+    else:
+        cot, commands = yield from _generate_two_pass(text, generator)
+    if not commands:
+        yield {"stage": "final", "message": "⚠️ No valid Kubernetes commands found."}
+        return None
+
+    return (yield from _validate_commands(cot, commands))
+
+def _generate_two_pass(text, generator):
+    """
+    Stage 1 (CoT) and stage 2 (commands from the CoT) as two generations. Returns (cot, commands).
+    """
+    # Stage 1: Generate Chain-of-Thought (CoT)
+    prompt = with_known_resources(text)
+    if STREAM_GENERATION:
+        cot = ""
+        for cot in generator.generate_cot_stream(prompt):
+            yield {
+                "stage": "cot",
+                "partial": True,
+                "message": f"💡 *Chain-of-Thought:*\n```{extract_steps_from_cot(cot)}```"
+            }
+    else:
+        cot = generator.generate_cot(prompt)
+    logging.info(f"Chain-of-Thought generated: {cot}")
+    
+    # Extract only the "steps" portion from the CoT
+    steps_only = extract_steps_from_cot(cot)
+
+    # Yield the steps instead of the entire CoT
+    yield {"stage": "cot", "message": f"💡 *Chain-of-Thought:*\n```{steps_only}```"}
+
+    # Stage 2: Generate commands based on the CoT
+    commands = generator.generate_commands(with_known_resources(cot))
+    logging.info(f"Initial Commands extracted: {commands}")
+    return cot, commands
+
+def _check_policy(commands: list) -> (list, list):
+    """
+    OPA validation, re-checking the commands missing a namespace in staging.
+    Returns (allowed_commands, [(command, reason) rejected]).
+    """
+    decisions = opa_check_commands(commands)
+    corrected = {
+        i: f"{cmd} --namespace=staging"
+        for i, (cmd, (allowed, reason)) in enumerate(zip(commands, decisions))
+        if not allowed and "no namespace provided" in reason.lower()
+    }
+    corrected_decisions = dict(zip(corrected, opa_check_commands(list(corrected.values())))) if corrected else {}
+
+    allowed_commands = []
+    rejected_commands = []
+    for i, cmd in enumerate(commands):
+        allowed, reason = decisions[i]
+        if allowed:
+            allowed_commands.append(cmd)
+        elif i in corrected and corrected_decisions[i][0]:
+            logging.info(f"Auto-correcting command: {cmd} -> {corrected[i]}")
+            allowed_commands.append(corrected[i])
+        else:
+            rejected_commands.append((cmd, reason))
+    return allowed_commands, rejected_commands
+
+def _policy_violations(rejected_commands: list) -> str:
+    msg = "❌ Generated commands violate policy constraints:\n"
+    for cmd, reason in rejected_commands:
+        msg += f"- {cmd}: {reason}\n"
+    return msg
+
+def _validate_commands(cot, commands):
+    """
+    Stage 3: OPA validation. Returns (cot, commands, allowed_commands), or None after a 'final' stage.
+    """
+    allowed_commands, rejected_commands = _check_policy(commands)
+    if not allowed_commands:
+        yield {"stage": "final", "message": _policy_violations(rejected_commands)}
+        return None
+
+    return cot, commands, allowed_commands
+
+def _refine(text: str, results: list):
+    """
+    Stage 5: up to REFINEMENT_ROUNDS rounds that regenerate only the commands that failed or weren't run
+    because of a failure (the failed suffix), with their exact errors, and run the policy-checked replacements.
+    Commands that succeeded are never re-run. Yields the Slack updates, the last one 'final'.
+    """
+    succeeded = [result.command for result in results if result.status == "succeeded"]
+    pending = [result for result in results if result.status != "succeeded"]
+    for round_number in range(1, REFINEMENT_ROUNDS + 1):
+        suffix = "" if round_number == 1 else f"_{round_number}"
+        with span("refinement", round=round_number, pending=len(pending)):
+            refined_commands = _get_generator().refine_commands(
+                with_known_resources(text), [result.command for result in pending], describe_failures(pending),
+                succeeded_commands=succeeded
+            )
+        refined_commands = [cmd for cmd in refined_commands if cmd not in succeeded]
+        logging.info(f"Refined Commands (round {round_number}): {refined_commands}")
+        if not refined_commands:
+            yield {"stage": "final", "message": "⚠️ Unable to refine commands after error."}
+            return
+        # Commands skipped because of a failure still have to run, even if the model left them out
+        refined_commands += [result.command for result in pending
+                             if result.was_skipped and result.command not in refined_commands]
+
+        # Refined commands face the same policy as the original ones
+        allowed_commands, rejected_commands = _check_policy(refined_commands)
+        if not allowed_commands:
+            yield {"stage": "final", "message": _policy_violations(rejected_commands)}
+            return
+        yield {"stage": f"refined_commands{suffix}",
+               "message": f"🔧 *Refined Kubernetes Commands{f' (round {round_number})' if suffix else ''}:*\n```{chr(10).join(allowed_commands)}```"}
+
+        with span("execute", commands=len(allowed_commands), refined=True):
+            refined_results = execute_kubectl_commands(allowed_commands, delay=10)
+        refined_execution_output, files = format_results(refined_results)
+        logging.info(f"Refined execution output: {refined_execution_output}")
+
+        pending = [result for result in refined_results if result.status != "succeeded"]
+        if not pending:
+            yield {"stage": "final", "message": f"✅ *Refined Execution Results:*\n```{refined_execution_output}```", "files": files}
+            return
+        if round_number == REFINEMENT_ROUNDS:
+            yield {"stage": "final", "files": files,
+                   "message": f"❌ *Refined Execution Results (still failing after {round_number} rounds):*\n```{refined_execution_output}```"}
+            return
+        succeeded += [result.command for result in refined_results if result.status == "succeeded"]
+        yield {"stage": f"refined_error{suffix}", "files": files,
+               "message": f"❌ *Refined Execution Results (with error):*\n```{refined_execution_output}```"}
+
 def process_slack_message(text):
     """
     Generator function that processes the Slack message in stages,
     yielding live feedback:
       - Stage 'cot': The Chain-of-Thought reasoning (only the 'steps').
+        With streaming enabled it is first yielded repeatedly with 'partial': True
+        as the text is generated.
       - Stage 'commands': The validated (and auto-corrected) Kubernetes commands.
       - Stage 'final': The final execution result.
-    If refinement occurs, it yields an additional 'refined' stage.
+        Execution stages carry 'files': full outputs too long for the message, to be delivered separately.
+    If commands fail, the failed ones are refined (for up to REFINEMENT_ROUNDS rounds) and it yields
+    additional 'refined_commands' stages.
+    Routine requests matched by the intent router skip the model, as do intents found in the response
+    cache, which reuse the cached CoT and commands.
     """
     try:
         logging.info(f"Processing Message: {text}")
 
-        # Stage 1: Generate Chain-of-Thought (CoT)
-        cot = generate_cot(text, model, tokenizer)
-        logging.info(f"Chain-of-Thought generated: {cot}")
-        
-        # Extract only the "steps" portion from the CoT
-        steps_only = extract_steps_from_cot(cot)
-
-        # Yield the steps instead of the entire CoT
-        yield {"stage": "cot", "message": f"💡 *Chain-of-Thought:*\n```{steps_only}```"}
-
-        # Stage 2: Generate commands based on the CoT
-        commands = generate_commands(cot, model, tokenizer)
-        logging.info(f"Initial Commands extracted: {commands}")
-        if not commands:
-            yield {"stage": "final", "message": "⚠️ No valid Kubernetes commands found."}
-            return
-
-        # Stage 3: Validate each command with OPA
-        allowed_commands = []
-        rejected_commands = []
-        for cmd in commands:
-            allowed, reason = opa_check_command(cmd)
-            if allowed:
-                allowed_commands.append(cmd)
-            else:
-                if "no namespace provided" in reason.lower():
-                    corrected_cmd = f"{cmd} --namespace=staging"
-                    logging.info(f"Auto-correcting command: {cmd} -> {corrected_cmd}")
-                    allowed_corrected, corr_reason = opa_check_command(corrected_cmd)
-                    if allowed_corrected:
-                        allowed_commands.append(corrected_cmd)
-                    else:
-                        rejected_commands.append((cmd, reason))
-                else:
-                    rejected_commands.append((cmd, reason))
-        
-        if not allowed_commands:
-            msg = "❌ Generated commands violate policy constraints:\n"
-            for cmd, reason in rejected_commands:
-                msg += f"- {cmd}: {reason}\n"
-            yield {"stage": "final", "message": msg}
+        routed = (yield from _route_plan(text)) if intent_router else False
+        if routed is None:
             return
+        cached = response_cache.get(text) if response_cache and not routed else None
+        annotate(response_cache_hit=bool(cached))
+        if routed:
+            cot, commands, allowed_commands = routed
+        elif cached:
+            logging.info(f"Response cache hit for: {text}")
+            yield {"stage": "cot", "message": f"💡 *Chain-of-Thought:*\n```{extract_steps_from_cot(cached['cot'])}```"}
+            # The policy may have changed since the plan was cached (or persisted)
+            plan = yield from _validate_commands(cached["cot"], cached["commands"])
+            if plan is None:
+                response_cache.invalidate(text)
+                return
+            cot, commands, allowed_commands = plan
+        else:
+            plan = yield from _generate_plan(text)
+            if plan is None:
+                return
+            cot, commands, allowed_commands = plan
+            if response_cache:
+                response_cache.put(text, cot, allowed_commands)
 
         yield {"stage": "commands", "message": f"🔧 *Generated Kubernetes Commands:*\n```{chr(10).join(allowed_commands)}```"}
 
         # Stage 4: Execute the allowed commands
-        execution_output = execute_kubectl_commands(allowed_commands, delay=5)
+        with span("execute", commands=len(allowed_commands)):
+            results = execute_kubectl_commands(allowed_commands, delay=5)
+        execution_output, files = format_results(results)
         logging.info(f"Initial execution output: {execution_output}")
 
-        if "error:" not in execution_output.lower():
-            yield {"stage": "final", "message": f"✅ *Execution Results:*\n```{execution_output}```"}
+        if all(result.status == "succeeded" for result in results):
+            yield {"stage": "final", "message": f"✅ *Execution Results:*\n```{execution_output}```", "files": files}
             return
 
-        # Stage 5: Handle errors and refine commands
-        error_message = extract_error_from_output(execution_output)
-        logging.info(f"Detected error: {error_message}")
-        yield {"stage": "initial_error", "message": f"❌ *Initial Execution Results (with error):*\n```{execution_output}```"}
-        
-        refined_commands = refine_commands(text, commands, error_message, model, tokenizer)
-        logging.info(f"Refined Commands: {refined_commands}")
-        if not refined_commands:
-            yield {"stage": "final", "message": "⚠️ Unable to refine commands after error."}
-            return
-        
-        yield {"stage": "refined_commands", "message": f"🔧 *Refined Kubernetes Commands:*\n```{chr(10).join(refined_commands)}```"}
-        
-        refined_execution_output = execute_kubectl_commands(refined_commands, delay=10)
-        logging.info(f"Refined execution output: {refined_execution_output}")
-        yield {"stage": "final", "message": f"✅ *Refined Execution Results:*\n```{refined_execution_output}```"}
+        # Stage 5: Handle errors and refine the failed commands
+        if response_cache:
+            # Don't keep serving a plan that fails against the cluster
+            response_cache.invalidate(text)
+        logging.info(f"Detected errors: {describe_failures(results)}")
+        yield {"stage": "initial_error", "message": f"❌ *Initial Execution Results (with error):*\n```{execution_output}```",
+               "files": files}
+        if REFINEMENT_ROUNDS > 0:
+            yield from _refine(text, results)
+        else:
+            yield {"stage": "final", "message": "⚠️ Commands failed and refinement is disabled."}
     
+    except ModelNotReadyError as e:
+        logging.warning(f"Model not ready for message: {text}")
+        yield {"stage": "final", "message": f"⏳ {e}"}
     except Exception as e:
         logging.error(f"Error processing message: {e}")
         yield {"stage": "final", "message": f"❌ Error processing request: {e}"}
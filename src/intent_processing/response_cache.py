@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_intent(text: str) -> str:
+    """
+    Lowercases, strips Slack formatting/punctuation and collapses whitespace,
+    so trivially different phrasings of the same request share a cache key.
+    """
+    text = text.lower()
+    text = re.sub(r"<[^>]*>", " ", text)
+    text = re.sub(r"[^\w\s\-./=]", " ", text)
+    return " ".join(text.split())
+
+
+# Filler words a fuzzy match may differ in; every other token can be a resource name, namespace or count
+STOPWORDS = {
+    "a", "an", "the", "please", "can", "could", "you", "me", "my", "our", "in", "on", "of", "for", "from",
+    "to", "with", "and", "all", "some", "is", "are", "what", "s", "show", "get", "list", "display", "now",
+}
+
+
+def _signature(normalized: str) -> frozenset:
+    """
+    Every token that isn't a filler word. Fuzzy matches must agree on all of them, so "scale api to 3"
+    never serves "scale api to 4" and "restart web in staging" never serves "restart api in staging".
+    """
+    return frozenset(token for token in normalized.split() if token not in STOPWORDS)
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache mapping a normalized intent to its CoT and OPA-approved commands.
+    Lookups try the exact normalized key first, then (if fuzzy_threshold is set) the most
+    similar cached intent with the same parameter tokens. Optionally persisted as JSON.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 3600, path: str = None, fuzzy_threshold: float = 0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "fuzzy_hits": 0, "misses": 0, "evictions": 0}
+        if path:
+            self._load()
+
+    def get(self, text: str):
+        key = normalize_intent(text)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.metrics["hits"] += 1
+                return entry
+
+            match = self._fuzzy_match(key)
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.metrics["fuzzy_hits"] += 1
+                logger.info(f"Fuzzy cache hit: '{key}' -> '{match}'")
+                return self._entries[match]
+
+            self.metrics["misses"] += 1
+            return None
+
+    def put(self, text: str, cot: str, commands: list) -> None:
+        key = normalize_intent(text)
+        with self._lock:
+            self._entries[key] = {"cot": cot, "commands": list(commands), "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+            self._save()
+
+    def invalidate(self, text: str) -> None:
+        key = normalize_intent(text)
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["fuzzy_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["fuzzy_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [key for key, entry in self._entries.items() if entry["stored_at"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+
+    def _fuzzy_match(self, key: str):
+        if not self.fuzzy_threshold:
+            return None
+        signature = _signature(key)
+        best, best_score = None, self.fuzzy_threshold
+        for candidate in self._entries:
+            if _signature(candidate) != signature:
+                continue
+            score = SequenceMatcher(None, key, candidate).ratio()
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            cutoff = time.time() - self.ttl
+            for key, entry in entries.items():
+                if entry.get("stored_at", 0) >= cutoff:
+                    self._entries[key] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            logger.info(f"Loaded {len(self._entries)} cached responses from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading response cache from {self.path}: {e}")
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving response cache to {self.path}: {e}")
@@ -1,17 +1,14 @@
 import logging
-import slack
-from src.config.config import SLACK_BOT_TOKEN
+from src.slack.slack_delivery import slack_delivery, SlackMessage
 
 logger = logging.getLogger(__name__)
 
-web_client = slack.WebClient(token=SLACK_BOT_TOKEN)
-
 def send_readiness_message():
     try:
         channel = "#kubecomworkflow" 
         message = "✅ K8s Slack Bot is online!"
-        web_client.chat_postMessage(channel=channel, text=message)
-        logger.info("Readiness message sent.")
+        slack_delivery.post(channel, message)
+        logger.info("Readiness message queued.")
     except Exception as e:
         logger.error(f"Error sending readiness message: {e}")
 
@@ -19,15 +16,21 @@ def send_shutdown_message():
     try:
         channel = "#kubecomworkflow" 
         message = ":x: K8s Slack Bot is shutting down."
-        web_client.chat_postMessage(channel=channel, text=message)
+        slack_delivery.post(channel, message)
+        # Last message before exit: send it (and anything still queued) now
+        slack_delivery.flush(timeout=10)
         logger.info("Shutdown message sent.")
     except Exception as e:
         logger.error(f"Error sending shutdown message: {e}")
 
-def send_processing_message(channel: str, original_message: str) -> None:
-    try:
-        message = f":hourglass_flowing_sand: Processing your message: '{original_message}'"
-        web_client.chat_postMessage(channel=channel, text=message)
-        logger.info(f"Processing message sent to {channel}: {message}")
-    except Exception as e:
-        logger.error(f"Error sending processing message: {e}")
+def processing_message_text(original_message: str) -> str:
+    return f":hourglass_flowing_sand: Processing your message: '{original_message}'"
+
+def send_processing_message(channel: str, original_message: str) -> SlackMessage:
+    """
+    Queues the processing acknowledgement and returns its SlackMessage without waiting for Slack,
+    so later pipeline stages can be edited into the same message.
+    """
+    message = processing_message_text(original_message)
+    logger.info(f"Processing message queued for {channel}: {message}")
+    return slack_delivery.post(channel, message)
@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+import torch
+from src.config.config import INFERENCE_BATCHING, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    def __init__(self, input_ids, kwargs: dict, past_key_values=None):
+        self.input_ids = input_ids
+        self.kwargs = kwargs
+        self.past_key_values = past_key_values
+        self.key = _kwargs_key(kwargs)
+        self.done = threading.Event()
+        self.output = None
+        self.error = None
+
+
+def _kwargs_key(kwargs: dict):
+    """
+    Requests can only share a batch when they use identical generation settings.
+    Returns None for settings that cannot be batched (e.g. callables or tensors).
+    """
+    try:
+        key = tuple(sorted(kwargs.items()))
+        hash(key)
+        return key
+    except TypeError:
+        return None
+
+
+class BatchedGenerator:
+    """
+    Micro-batching wrapper around a causal LM.
+    Concurrent `generate` calls arriving within `max_wait` seconds are left-padded
+    into one batched `model.generate` call, and each caller gets back its own row.
+    Exposes the same `generate(inputs, **kwargs)` / `device` surface as the model,
+    so it can be passed anywhere the model is expected.
+    """
+
+    def __init__(self, model, max_batch_size: int = 8, max_wait: float = 0.05):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.metrics = {"requests": 0, "batches": 0, "max_batch_size": 0}
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def generate(self, inputs, **kwargs):
+        # Streaming, multi-row and speculative (single-row only) calls go straight to the model
+        if ("streamer" in kwargs or inputs.shape[0] != 1 or "pad_token_id" not in kwargs
+                or "assistant_model" in kwargs or "prompt_lookup_num_tokens" in kwargs):
+            return self.model.generate(inputs, **kwargs)
+
+        # A cached prompt prefix is only used when the request ends up alone in its batch
+        past_key_values = kwargs.pop("past_key_values", None)
+        request = _PendingRequest(inputs[0], kwargs, past_key_values)
+        if request.key is None:
+            return self.model.generate(inputs, past_key_values=past_key_values, **kwargs)
+
+        self._ensure_started()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output
+
+    def stats(self) -> dict:
+        stats = dict(self.metrics)
+        stats["avg_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list:
+        requests = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(requests) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                requests.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return requests
+
+    def _run(self) -> None:
+        while True:
+            requests = self._collect()
+
+            groups = {}
+            for request in requests:
+                groups.setdefault(request.key, []).append(request)
+
+            for group in groups.values():
+                try:
+                    self._generate_batch(group)
+                except Exception as e:
+                    logger.error(f"Batched generation failed for {len(group)} requests: {e}")
+                    for request in group:
+                        request.error = e
+                finally:
+                    for request in group:
+                        request.done.set()
+
+    def _generate_batch(self, group: list) -> None:
+        kwargs = group[0].kwargs
+        if len(group) == 1 and group[0].past_key_values is not None:
+            # No padding needed, so the prefilled prompt prefix can be reused as-is
+            request = group[0]
+            request.output = self.model.generate(
+                request.input_ids.unsqueeze(0).to(self.model.device),
+                past_key_values=request.past_key_values,
+                **kwargs
+            )
+            self.metrics["requests"] += 1
+            self.metrics["batches"] += 1
+            self.metrics["max_batch_size"] = max(self.metrics["max_batch_size"], 1)
+            return
+        pad_token_id = kwargs["pad_token_id"]
+        lengths = [request.input_ids.shape[0] for request in group]
+        max_len = max(lengths)
+
+        # Left-pad so every prompt ends at the same position and generation continues from there
+        input_ids = torch.full((len(group), max_len), pad_token_id, dtype=group[0].input_ids.dtype)
+        attention_mask = torch.zeros((len(group), max_len), dtype=torch.long)
+        for row, request in enumerate(group):
+            input_ids[row, max_len - lengths[row]:] = request.input_ids
+            attention_mask[row, max_len - lengths[row]:] = 1
+
+        started = time.monotonic()
+        outputs = self.model.generate(
+            input_ids.to(self.model.device),
+            attention_mask=attention_mask.to(self.model.device),
+            **kwargs
+        )
+        logger.info(f"Generated batch of {len(group)} in {time.monotonic() - started:.2f}s")
+
+        self.metrics["requests"] += len(group)
+        self.metrics["batches"] += 1
+        self.metrics["max_batch_size"] = max(self.metrics["max_batch_size"], len(group))
+
+        for row, request in enumerate(group):
+            # Drop the left padding so callers see the same layout as an unbatched call
+            request.output = outputs[row:row + 1, max_len - lengths[row]:]
+
+
+def wrap_model(model):
+    """
+    The model as loaded for serving: with batching enabled, concurrent requests share one batched
+    generate call instead of queueing on the GPU.
+    """
+    if INFERENCE_BATCHING:
+        return BatchedGenerator(model, max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait=INFERENCE_MAX_WAIT)
+    return model
@@ -1,9 +1,21 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 from transformers import AutoModelForCausalLM, AutoTokenizer
 import torch
 from peft import PeftModel
-from src.config.config import BASE_MODEL_NAME, ADAPTER_PATH
+from src.config.config import (
+    BASE_MODEL_NAME, ADAPTER_PATH, MODEL_BACKEND, MERGE_ADAPTER, MERGED_MODEL_PATH, CACHE_MERGED_MODEL,
+    SPECULATIVE_DECODING, DRAFT_MODEL_NAME, MODEL_SERVER_URLS
+)
 from peft.config import PeftConfig
 
+logger = logging.getLogger(__name__)
+
 # List of keys to remove from kwargs
 UNEXPECTED_KEYS = ["eva_config", "exclude_modules", "lora_bias"]
 
@@ -19,15 +31,274 @@ def patched_from_peft_type(**kwargs):
 # Apply the monkey patch
 PeftConfig.from_peft_type = patched_from_peft_type
 
-def load_model():
-    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME, use_fast=False)
-    base_model = AutoModelForCausalLM.from_pretrained(
-        BASE_MODEL_NAME,
-        torch_dtype=torch.float16
-    ).to("cuda")
+def _quantize_int8(model):
+    # Dynamic int8 quantization of the Linear layers, runs on any x86/ARM CPU
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _quantize_int4(model):
+    try:
+        from optimum.quanto import quantize, freeze, qint4
+    except ImportError:
+        raise ImportError("The cpu-int4 backend requires the optimum-quanto package")
+    quantize(model, weights=qint4)
+    freeze(model)
+    return model
+
+# Backend name -> how the model is placed and (optionally) quantized
+BACKENDS = {
+    "cuda-fp16": {"device": "cuda", "dtype": torch.float16, "quantize": None},
+    "cpu-fp32": {"device": "cpu", "dtype": torch.float32, "quantize": None},
+    "cpu-int8": {"device": "cpu", "dtype": torch.float32, "quantize": _quantize_int8},
+    "cpu-int4": {"device": "cpu", "dtype": torch.float32, "quantize": _quantize_int4},
+}
+
+def _has_checkpoint(path: str) -> bool:
+    return bool(path) and os.path.exists(os.path.join(path, "config.json"))
+
+# Written next to an automatically cached merged checkpoint, so a changed base model or adapter rebuilds it
+SOURCE_FILE = "kubecom_source.json"
+
+def _merge_source(base_model_name: str, adapter_path: str) -> dict:
+    source = {"base_model": base_model_name, "adapter": adapter_path}
+    for name in ("adapter_model.safetensors", "adapter_model.bin"):
+        weights = os.path.join(adapter_path, name)
+        if os.path.exists(weights):
+            stat = os.stat(weights)
+            source["adapter_weights"] = [name, stat.st_size, int(stat.st_mtime)]
+            break
+    return source
+
+def _checkpoint_matches(path: str, source: dict) -> bool:
+    """
+    A checkpoint without a source file was exported by hand and is trusted as-is.
+    """
+    if not _has_checkpoint(path):
+        return False
+    source_path = os.path.join(path, SOURCE_FILE)
+    if not os.path.exists(source_path):
+        return True
+    try:
+        with open(source_path) as f:
+            return json.load(f) == source
+    except (OSError, ValueError):
+        return False
 
-    # Load adapter
-    model = PeftModel.from_pretrained(base_model, ADAPTER_PATH)
-    model.to("cuda")
+def _save_checkpoint(model, tokenizer, path: str, source: dict) -> None:
+    # Written to a temporary directory and renamed, so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    model.save_pretrained(tmp_path, safe_serialization=True)
+    tokenizer.save_pretrained(tmp_path)
+    with open(os.path.join(tmp_path, SOURCE_FILE), "w") as f:
+        json.dump(source, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    os.replace(tmp_path, path)
 
+@contextmanager
+def _phase(phases: dict, name: str):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        phases[name] = round(time.monotonic() - started, 3)
+        logger.info(f"Startup phase {name} took {phases[name]:.2f}s")
+
+def load_model(backend: str = MODEL_BACKEND, base_model_name: str = BASE_MODEL_NAME,
+               adapter_path: str = ADAPTER_PATH, merged_path: str = MERGED_MODEL_PATH,
+               cache_merged: bool = CACHE_MERGED_MODEL, phases: dict = None):
+    """
+    Loads the tokenizer and model for the configured backend.
+    A merged checkpoint at `merged_path` is preferred over base model + adapter;
+    otherwise the LoRA adapter is merged into the base weights (always for quantized backends,
+    which need plain Linear layers) and, with `cache_merged`, saved there for the next start.
+    `adapter_path=None` loads the base model alone. Per-phase seconds are recorded into `phases`.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {sorted(BACKENDS)}")
+    spec = BACKENDS[backend]
+    phases = {} if phases is None else phases
+    logger.info(f"Loading model with backend {backend}")
+
+    source = _merge_source(base_model_name, adapter_path) if adapter_path else None
+    if source and _checkpoint_matches(merged_path, source):
+        # safetensors shards are memory-mapped, so this skips both PEFT and most of the copy
+        logger.info(f"Loading merged checkpoint from {merged_path}")
+        with _phase(phases, "tokenizer"):
+            tokenizer = AutoTokenizer.from_pretrained(merged_path, use_fast=False)
+        with _phase(phases, "weights"):
+            model = AutoModelForCausalLM.from_pretrained(merged_path, torch_dtype=spec["dtype"]).to(spec["device"])
+    else:
+        with _phase(phases, "tokenizer"):
+            tokenizer = AutoTokenizer.from_pretrained(base_model_name, use_fast=False)
+        with _phase(phases, "weights"):
+            base_model = AutoModelForCausalLM.from_pretrained(
+                base_model_name,
+                torch_dtype=spec["dtype"]
+            ).to(spec["device"])
+        model = base_model
+
+        if adapter_path:
+            # Load adapter
+            with _phase(phases, "adapter"):
+                model = PeftModel.from_pretrained(base_model, adapter_path)
+                model.to(spec["device"])
+            if MERGE_ADAPTER or spec["quantize"] is not None:
+                with _phase(phases, "merge"):
+                    model = model.merge_and_unload()
+                if cache_merged and merged_path:
+                    try:
+                        with _phase(phases, "cache_write"):
+                            _save_checkpoint(model, tokenizer, merged_path, source)
+                        logger.info(f"Merged checkpoint cached at {merged_path}")
+                    except OSError as e:
+                        logger.warning(f"Could not cache merged checkpoint at {merged_path}: {e}")
+
+    if spec["quantize"] is not None:
+        with _phase(phases, "quantize"):
+            model = spec["quantize"](model)
+
+    model.eval()
     return model, tokenizer
+
+def export_merged_model(path: str, base_model_name: str = BASE_MODEL_NAME, adapter_path: str = ADAPTER_PATH) -> None:
+    """
+    Writes base model + merged LoRA adapter (and the tokenizer) as a safetensors checkpoint,
+    loadable through MERGED_MODEL_PATH without PEFT.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(base_model_name, use_fast=False)
+    base_model = AutoModelForCausalLM.from_pretrained(base_model_name, torch_dtype=torch.float16)
+    model = PeftModel.from_pretrained(base_model, adapter_path).merge_and_unload()
+    _save_checkpoint(model, tokenizer, path, _merge_source(base_model_name, adapter_path))
+    logger.info(f"Merged model written to {path}")
+
+
+_draft_model = None
+_draft_lock = threading.Lock()
+
+def get_draft_model(name: str = DRAFT_MODEL_NAME, backend: str = MODEL_BACKEND):
+    """
+    Lazily loaded draft model for speculative decoding (must share the main model's tokenizer).
+    Returns None if it can't be loaded, so generation falls back to plain decoding.
+    """
+    global _draft_model
+    with _draft_lock:
+        if _draft_model is None:
+            spec = BACKENDS[backend]
+            try:
+                model = AutoModelForCausalLM.from_pretrained(name, torch_dtype=spec["dtype"]).to(spec["device"])
+                if spec["quantize"] is not None:
+                    model = spec["quantize"](model)
+                _draft_model = model.eval()
+                logger.info(f"Draft model {name} loaded")
+            except Exception as e:
+                logger.error(f"Could not load draft model {name}: {e}")
+                _draft_model = False
+        return _draft_model or None
+
+
+class ModelNotReadyError(RuntimeError):
+    pass
+
+
+# Background loading state: the HTTP server comes up immediately and reports readiness
+# while the weights load on a separate thread
+_loaded = None
+_load_error = None
+_ready = threading.Event()
+_load_lock = threading.Lock()
+_load_thread = None
+_remote = None  # RemoteModel when model servers are configured
+startup_phases = {}
+
+def _background_load(wrap) -> None:
+    global _loaded, _load_error
+    started = time.monotonic()
+    try:
+        model, tokenizer = load_model(phases=startup_phases)
+        if SPECULATIVE_DECODING == "draft":
+            with _phase(startup_phases, "draft_model"):
+                get_draft_model()
+        if wrap is not None:
+            model = wrap(model)
+        _loaded = (model, tokenizer)
+        startup_phases["total"] = round(time.monotonic() - started, 3)
+        logger.info(f"Model ready after {startup_phases['total']:.2f}s: {startup_phases}")
+    except Exception as e:
+        _load_error = e
+        logger.exception(f"Model failed to load: {e}")
+    finally:
+        _ready.set()
+
+def _connect_model_servers(urls: list) -> None:
+    global _loaded, _load_error, _remote
+    from src.model.remote_model import RemoteModel
+    started = time.monotonic()
+    try:
+        _remote = RemoteModel(urls)
+        _remote.start()
+        with _phase(startup_phases, "model_servers"):
+            _remote.wait_healthy()
+        _loaded = (_remote, None)
+        startup_phases["total"] = round(time.monotonic() - started, 3)
+        logger.info(f"Model server ready after {startup_phases['total']:.2f}s: {_remote.stats()}")
+    except Exception as e:
+        _load_error = e
+        logger.exception(f"Could not use the model servers {urls}: {e}")
+    finally:
+        _ready.set()
+
+def start_model_loading(wrap=None, server_urls: list = MODEL_SERVER_URLS) -> None:
+    """
+    Starts loading the model on a background thread (once); `wrap(model)` post-processes it,
+    e.g. with a BatchedGenerator. With `server_urls` nothing is loaded: get_model returns a RemoteModel
+    (and no tokenizer) once one of the model servers is ready.
+    """
+    global _load_thread
+    with _load_lock:
+        if _load_thread is not None:
+            return
+        if server_urls:
+            _load_thread = threading.Thread(target=_connect_model_servers, args=(server_urls,),
+                                            name="model-servers", daemon=True)
+        else:
+            _load_thread = threading.Thread(target=_background_load, args=(wrap,), name="model-loader", daemon=True)
+        _load_thread.start()
+
+def use_model(model, tokenizer=None) -> None:
+    """
+    Serves an already loaded model instead of loading one (benchmarks). Without a tokenizer `model`
+    is taken to be a generator with the LocalGenerator methods, like a RemoteModel.
+    """
+    global _loaded
+    _loaded = (model, tokenizer)
+    _ready.set()
+
+def wait_for_model(timeout: float = None) -> bool:
+    """
+    Blocks until loading has finished; True when the model loaded successfully.
+    """
+    return _ready.wait(timeout) and _loaded is not None
+
+def get_model(timeout: float = 0):
+    """
+    Returns (model, tokenizer) - (RemoteModel, None) with model servers - raising ModelNotReadyError while still loading (after `timeout` seconds)
+    or when loading failed.
+    """
+    if not _ready.wait(timeout):
+        raise ModelNotReadyError("The model is still loading, please try again in a minute.")
+    if _loaded is None:
+        raise ModelNotReadyError(f"The model failed to load: {_load_error}")
+    return _loaded
+
+def model_status() -> dict:
+    if not _ready.is_set():
+        state = "loading" if _load_thread is not None else "not_started"
+    else:
+        state = "ready" if _loaded is not None else "failed"
+    status = {"state": state, "phases": dict(startup_phases)}
+    if _remote is not None:
+        status["model_servers"] = _remote.stats()
+    if _load_error is not None:
+        status["error"] = str(_load_error)
+    return status
@@ -0,0 +1,214 @@
+"""
+Model server: loads the model and serves the generation steps over HTTP, so Slack frontends
+(modelServerUrls) can run without a model and inference can scale across processes and nodes.
+
+    python -m src.model.model_server --port 8600
+    python -m src.model.model_server --port 8601 --stub   # canned answers, no weights (local testing)
+
+POST /generate/<op> takes the arguments of the matching LocalGenerator method as JSON and returns
+{"value": ...}; the *_stream ops return one JSON line per item. GET /health is 200 once the model is ready.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from flask import Flask, Response, request, jsonify
+from src.config.config import MODEL_SERVER_PORT, MODEL_READY_TIMEOUT, TRACES_ENDPOINT_ENABLED
+from src.config.logging_config import logger
+from src.model.model_loader import start_model_loading, get_model, model_status, ModelNotReadyError
+from src.model.batching import wrap_model
+from src.commands.command_generation import LocalGenerator
+from src.tracing.tracing import start_trace, metrics, render_metrics, recent_traces
+
+app = Flask(__name__)
+logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+# op -> (LocalGenerator method, streamed)
+OPERATIONS = {
+    "cot": ("generate_cot", False),
+    "cot_stream": ("generate_cot_stream", True),
+    "plan_stream": ("generate_plan_stream", True),
+    "commands": ("generate_commands", False),
+    "refine": ("refine_commands", False),
+}
+
+# op -> {argument: (type, required)}
+PARAMETERS = {
+    "cot": {"instruction": (str, True)},
+    "cot_stream": {"instruction": (str, True)},
+    "plan_stream": {"instruction": (str, True)},
+    "commands": {"cot": (str, True)},
+    "refine": {"intent": (str, True), "previous_commands": (list, True), "error_message": (str, True),
+               "succeeded_commands": (list, False)},
+}
+
+_inflight = 0
+_inflight_lock = threading.Lock()
+stub_generator = None  # set by --stub
+
+
+class StubGenerator:
+    """
+    Canned answers after a fixed delay, for running the frontend/server split without model weights.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    def generate_cot(self, instruction: str) -> str:
+        time.sleep(self.delay)
+        return f"Step 1: Work out what '{instruction}' refers to\nStep 2: List the pods in the default namespace"
+
+    def generate_cot_stream(self, instruction: str):
+        cot = ""
+        for line in self.generate_cot(instruction).splitlines(keepends=True):
+            cot += line
+            yield cot
+
+    def generate_plan_stream(self, instruction: str):
+        yield "steps", self.generate_cot(instruction).splitlines()
+        yield "commands", ["kubectl get pods --namespace=default"]
+
+    def generate_commands(self, cot: str) -> list:
+        time.sleep(self.delay)
+        return ["kubectl get pods --namespace=default"]
+
+    def refine_commands(self, intent: str, previous_commands: list, error_message: str,
+                        succeeded_commands: list = None) -> list:
+        time.sleep(self.delay)
+        return ["kubectl get pods --namespace=default"]
+
+
+def _generator():
+    if stub_generator is not None:
+        return stub_generator
+    return LocalGenerator(*get_model(timeout=MODEL_READY_TIMEOUT))
+
+
+def _track(delta: int) -> None:
+    global _inflight
+    with _inflight_lock:
+        _inflight += delta
+
+
+def _error(e: Exception) -> dict:
+    return {"error": str(e), "type": type(e).__name__}
+
+
+def _validate(op: str, payload) -> str:
+    """
+    Returns what's wrong with the request body for `op`, or None if it matches the method's arguments.
+    """
+    if not isinstance(payload, dict):
+        return "Request body must be a JSON object"
+    parameters = PARAMETERS[op]
+    unknown = sorted(set(payload) - set(parameters))
+    if unknown:
+        return f"Unknown argument(s) for '{op}': {', '.join(unknown)}"
+    for name, (kind, required) in parameters.items():
+        if name not in payload:
+            if required:
+                return f"Missing argument '{name}' for '{op}'"
+        elif kind is list and not (isinstance(payload[name], list) and all(isinstance(v, str) for v in payload[name])):
+            return f"Argument '{name}' must be a list of strings"
+        elif kind is str and not isinstance(payload[name], str):
+            return f"Argument '{name}' must be a string"
+    return None
+
+
+def _stream_lines(method, payload: dict, request_id: str, op: str):
+    """
+    Runs a streamed op inside its own trace (the frontend's event_id), one JSON line per item;
+    an error after the first item is sent as a final {"error": ...} line.
+    """
+    try:
+        with start_trace(request_id or None, op=op):
+            for item in method(**payload):
+                yield json.dumps({"value": item}) + "\n"
+    except Exception as e:
+        logger.exception(f"Streamed {op} failed: {e}")
+        yield json.dumps(_error(e)) + "\n"
+
+
+@app.route("/generate/<op>", methods=["POST"])
+def generate_endpoint(op):
+    if op not in OPERATIONS:
+        return jsonify({"error": f"Unknown operation '{op}'"}), 404
+    name, streamed = OPERATIONS[op]
+    try:
+        generator = _generator()
+    except ModelNotReadyError as e:
+        return jsonify(_error(e)), 503
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+    invalid = _validate(op, payload)
+    if invalid:
+        return jsonify({"error": invalid, "type": "ValidationError"}), 400
+    request_id = request.headers.get("X-Request-Id", "")
+    metrics.inc("kubecom_model_server_requests_total", help="Generation requests served", op=op)
+
+    _track(1)
+    if streamed:
+        response = Response(_stream_lines(getattr(generator, name), payload, request_id, op),
+                            mimetype="application/x-ndjson")
+        # Runs once the response is closed, even if the client went away before the stream started
+        response.call_on_close(lambda: _track(-1))
+        return response
+    try:
+        with start_trace(request_id or None, op=op):
+            value = getattr(generator, name)(**payload)
+        return jsonify({"value": value})
+    except Exception as e:
+        logger.exception(f"{op} failed: {e}")
+        return jsonify(_error(e)), 500
+    finally:
+        _track(-1)
+
+
+@app.route("/health", methods=["GET"])
+def health_endpoint():
+    status = {"state": "ready", "stub": True} if stub_generator is not None else model_status()
+    status["inflight"] = _inflight
+    return jsonify(status), 200 if status["state"] == "ready" else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/traces", methods=["GET"])
+def traces_endpoint():
+    if not TRACES_ENDPOINT_ENABLED:
+        return jsonify({"error": "Traces endpoint is disabled (tracesEndpoint=false)"}), 404
+    return jsonify(recent_traces(request.args.get("limit", 20, type=int)))
+
+
+metrics.gauge("kubecom_model_server_inflight", lambda: _inflight, help="Generation requests being served")
+
+
+def start_model_server(port: int = MODEL_SERVER_PORT, host: str = "0.0.0.0", stub_delay: float = None) -> None:
+    global stub_generator
+    if stub_delay is not None:
+        stub_generator = StubGenerator(stub_delay)
+    else:
+        # Always load locally: modelServerUrls is the frontend's setting
+        start_model_loading(wrap=wrap_model, server_urls=[])
+    logger.info(f"🚀 Starting model server on port {port}{' (stub model)' if stub_generator else ''}...")
+    app.run(host=host, port=port, threaded=True, use_reloader=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=MODEL_SERVER_PORT)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--stub", action="store_true", help="Serve canned answers instead of loading the model")
+    parser.add_argument("--stub-delay", type=float, default=0.0, help="Seconds each stub generation takes")
+    args = parser.parse_args()
+    start_model_server(args.port, args.host, stub_delay=args.stub_delay if args.stub else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import itertools
+import json
+import logging
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from src.config.config import (
+    MODEL_SERVER_TIMEOUT,
+    MODEL_SERVER_CONNECT_TIMEOUT,
+    MODEL_SERVER_HEALTH_INTERVAL
+)
+from src.model.model_loader import ModelNotReadyError
+from src.tracing.tracing import span, metrics, current_trace_id
+
+logger = logging.getLogger(__name__)
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelServer:
+    """
+    Client-side view of one model server: health as of the last check and requests in flight from this process.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = False
+        self.inflight = 0
+        self.state = "unknown"
+        self.last_error = None
+        self.requests = 0
+        self.failures = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "state": self.state,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class RemoteModel:
+    """
+    The generation methods of LocalGenerator, served by one or more model servers (src/model/model_server.py).
+    Each call goes to the healthy server with the fewest requests in flight from this process (round robin
+    between equals); servers that refuse the connection or aren't ready are skipped and the next one is tried.
+    A background thread re-checks /health so servers leave and rejoin the rotation.
+    """
+
+    def __init__(self, urls: list, timeout: float = MODEL_SERVER_TIMEOUT,
+                 connect_timeout: float = MODEL_SERVER_CONNECT_TIMEOUT,
+                 health_interval: float = MODEL_SERVER_HEALTH_INTERVAL):
+        if not urls:
+            raise ValueError("RemoteModel needs at least one model server URL")
+        self.servers = [ModelServer(url) for url in urls]
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.health_interval = health_interval
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=len(urls), pool_maxsize=32))
+        self.session.mount("https://", HTTPAdapter(pool_connections=len(urls), pool_maxsize=32))
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._stop = threading.Event()
+        self._health_thread = None
+
+    # Health checks
+
+    def check_health(self) -> None:
+        for server in self.servers:
+            try:
+                response = self.session.get(f"{server.url}/health", timeout=(self.connect_timeout, self.connect_timeout))
+                body = response.json()
+                server.state = body.get("state", "unknown")
+                server.healthy = response.status_code == 200 and server.state == "ready"
+                server.last_error = None if server.healthy else body.get("error")
+            except (requests.RequestException, ValueError) as e:
+                if server.healthy:
+                    logger.warning(f"Model server {server.url} failed its health check: {e}")
+                server.healthy = False
+                server.state = "unreachable"
+                server.last_error = str(e)
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def start(self) -> None:
+        """
+        Checks the servers once, then keeps checking them on a background thread.
+        """
+        self.check_health()
+        if self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, name="model-server-health", daemon=True)
+            self._health_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait_healthy(self, timeout: float = None) -> bool:
+        """
+        Blocks until at least one server is ready (checking every health interval).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not any(server.healthy for server in self.servers):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(min(self.health_interval, 1.0))
+            self.check_health()
+        return True
+
+    def stats(self) -> list:
+        return [server.to_dict() for server in self.servers]
+
+    # Requests
+
+    def _candidates(self) -> list:
+        """
+        Healthy servers in the order to try them: fewest in flight first, rotating the start between equals.
+        """
+        with self._lock:
+            turn = next(self._turn)
+            healthy = [server for server in self.servers if server.healthy]
+            rotated = healthy[turn % len(healthy):] + healthy[:turn % len(healthy)] if healthy else []
+            return sorted(rotated, key=lambda server: server.inflight)
+
+    def _send(self, op: str, payload: dict, stream: bool = False):
+        """
+        POSTs to the first server that accepts the request. Returns (server, response); the caller
+        must release the server (decrement `inflight`) once done with the response.
+        """
+        headers = {"X-Request-Id": current_trace_id() or ""}
+        for server in self._candidates():
+            with self._lock:
+                server.inflight += 1
+                server.requests += 1
+            try:
+                response = self.session.post(f"{server.url}/generate/{op}", json=payload, headers=headers,
+                                             timeout=(self.connect_timeout, self.timeout), stream=stream)
+            except requests.ConnectionError as e:
+                # Never reached the server, safe to retry elsewhere
+                self._release(server, failed=True)
+                server.healthy = False
+                server.last_error = str(e)
+                logger.warning(f"Model server {server.url} unreachable, trying the next one: {e}")
+                continue
+            except requests.Timeout as e:
+                self._release(server, failed=True)
+                raise ModelServerError(f"Model server {server.url} timed out on {op}: {e}")
+            if response.status_code == 503:
+                # Still loading or shutting down
+                self._release(server, failed=True)
+                server.healthy = False
+                continue
+            if response.status_code != 200:
+                self._release(server, failed=True)
+                self._raise_error(server, response.json() if "json" in response.headers.get("Content-Type", "") else {
+                    "error": response.text[:200]})
+            return server, response
+        metrics.inc("kubecom_model_server_unavailable_total", help="Generation requests no model server could take")
+        raise ModelNotReadyError("No model server is available right now, please try again in a minute.")
+
+    def _release(self, server: ModelServer, failed: bool = False) -> None:
+        with self._lock:
+            server.inflight -= 1
+            if failed:
+                server.failures += 1
+
+    @staticmethod
+    def _raise_error(server: ModelServer, body: dict) -> None:
+        message = body.get("error", "unknown error")
+        # Structured generation signals unusable output with ValueError; keep that contract across the wire
+        if body.get("type") == "ValueError":
+            raise ValueError(message)
+        raise ModelServerError(f"Model server {server.url}: {message}")
+
+    def _call(self, op: str, **payload):
+        with span("model_rpc", op=op) as rpc:
+            server, response = self._send(op, payload)
+            rpc.set(server=server.url)
+            try:
+                return response.json()["value"]
+            finally:
+                self._release(server)
+
+    def _stream(self, op: str, **payload):
+        with span("model_rpc", op=op, stream=True) as rpc:
+            server, response = self._send(op, payload, stream=True)
+            rpc.set(server=server.url)
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if "error" in item:
+                        self._raise_error(server, item)
+                    yield item["value"]
+            except requests.RequestException as e:
+                raise ModelServerError(f"Model server {server.url} stream for {op} broke off: {e}")
+            finally:
+                response.close()
+                self._release(server)
+
+    # The LocalGenerator interface
+
+    def generate_cot(self, instruction: str) -> str:
+        return self._call("cot", instruction=instruction)
+
+    def generate_cot_stream(self, instruction: str):
+        return self._stream("cot_stream", instruction=instruction)
+
+    def generate_plan_stream(self, instruction: str):
+        for kind, value in self._stream("plan_stream", instruction=instruction):
+            yield kind, value
+
+    def generate_commands(self, cot: str) -> list:
+        return self._call("commands", cot=cot)
+
+    def refine_commands(self, intent: str, previous_commands: list, error_message: str,
+                        succeeded_commands: list = None) -> list:
+        return self._call("refine", intent=intent, previous_commands=previous_commands, error_message=error_message,
+                          succeeded_commands=succeeded_commands)
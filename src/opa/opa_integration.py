@@ -1,43 +1,141 @@
-import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.config.config import (
+    POLICY_MODE,
+    POLICY_PATH,
+    OPA_TIMEOUT,
+    OPA_RETRIES,
+    OPA_POOL_SIZE,
+    OPA_CACHE_SIZE,
+    OPA_REVISION_CHECK_INTERVAL,
+    LOG_DIR
+)
+from src.config.logging_config import add_file_logger
+from src.opa.policy_engine import PolicyEngine
+from src.tracing.tracing import span
 
-LOG_DIR = "logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
+opa_logger = add_file_logger("OPAIntegration", os.path.join(LOG_DIR, "opa.log"), propagate=True)
 
-opa_logger = logging.getLogger("OPAIntegration")
-opa_logger.setLevel(logging.INFO)
+OPA_URL = os.environ.get("opaServerHost", "http://localhost:8181") + "/v1/data/k8s/allow"
+# OPA_URL = "http://localhost:8181/v1/data/k8s/allow" 
+# Evaluates a whole list of commands in one query, see the `decisions` rule in policy.rego
+OPA_BATCH_URL = OPA_URL + "/decisions?provenance=true"
 
-opa_log_file = os.path.join(LOG_DIR, "opa.log")
-file_handler = logging.FileHandler(opa_log_file)
-file_handler.setLevel(logging.INFO)
+policy_engine = PolicyEngine.from_file(POLICY_PATH) if POLICY_MODE in ("local", "verify") else None
 
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-file_handler.setFormatter(formatter)
+# Pooled keep-alive connections to OPA, retrying connection errors and 5xx responses
+opa_session = requests.Session()
+opa_session.mount("http://", HTTPAdapter(
+    pool_connections=OPA_POOL_SIZE,
+    pool_maxsize=OPA_POOL_SIZE,
+    max_retries=Retry(
+        total=OPA_RETRIES,
+        backoff_factor=0.1,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["POST"]
+    )
+))
+opa_session.mount("https://", opa_session.get_adapter("http://"))
 
-if not opa_logger.hasHandlers():
-    opa_logger.addHandler(file_handler)
-else:
-    opa_logger.handlers.clear()
-    opa_logger.addHandler(file_handler)
+# command -> (allowed, reason), valid for the policy revision it was decided under. Only used while
+# OPA reports a bundle revision: policies pushed through the policy API or loaded from files have
+# none, so nothing would ever invalidate their decisions.
+decision_cache = OrderedDict()
+decision_cache_lock = threading.Lock()
+policy_revision = None
+revision_checked_at = 0.0
 
-OPA_URL = os.environ.get("opaServerHost", "http://localhost:8181") + "/v1/data/k8s/allow"
-# OPA_URL = "http://localhost:8181/v1/data/k8s/allow" 
+def _response_revision(body: dict):
+    """
+    The bundle revisions the decision was made under, or None when no bundle reports one.
+    """
+    bundles = body.get("provenance", {}).get("bundles", {})
+    revision = tuple(sorted((name, bundle.get("revision")) for name, bundle in bundles.items()))
+    return revision if any(rev for _, rev in revision) else None
 
-def opa_check_command(command: str) -> (bool, str):
-    payload = {"input": {"command": command}}
+def _query_decisions(commands: list) -> (dict, tuple):
+    global policy_revision, revision_checked_at
+    response = opa_session.post(OPA_BATCH_URL, json={"input": {"commands": commands}}, timeout=OPA_TIMEOUT)
+    response.raise_for_status()
+    body = response.json()
+
+    revision = _response_revision(body)
+    with decision_cache_lock:
+        if revision != policy_revision:
+            if decision_cache:
+                opa_logger.info(f"Policy revision changed {policy_revision} -> {revision}, clearing decision cache")
+            decision_cache.clear()
+            policy_revision = revision
+        revision_checked_at = time.monotonic()
+    return body.get("result", {}), revision
+
+def remote_check_commands(commands: list) -> list:
+    """
+    Decides all commands with a single batched OPA query. Decisions are memoized per
+    command string until the policy bundle revision reported by OPA changes, and not at all
+    while OPA reports no revision.
+    """
     try:
-        response = requests.post(OPA_URL, json=payload)
-        response.raise_for_status()
-        result = response.json().get("result", {})
-
-        # Non-empty deny list = Rejection.
-        deny_list = result.get("deny", [])
-        allowed = result.get("allow", True) and not deny_list
-        reason = "; ".join(deny_list) if deny_list else ""
-        opa_logger.info(f"OPA decision '{command}': {result} | Reason: {reason}")
-        return allowed, reason
+        if time.monotonic() - revision_checked_at > OPA_REVISION_CHECK_INTERVAL:
+            # Cheap query that only refreshes the revision (and so invalidates stale decisions)
+            _query_decisions([])
+
+        with decision_cache_lock:
+            cached = decision_cache if policy_revision is not None else {}
+            decisions = {cmd: cached[cmd] for cmd in commands if cmd in cached}
+        missing = list(dict.fromkeys(cmd for cmd in commands if cmd not in decisions))
+
+        if missing:
+            result, revision = _query_decisions(missing)
+            decided = [cmd for cmd in missing if cmd in result] if revision is not None else []
+            for cmd in missing:
+                if cmd not in result:
+                    # Denied this time only: a transient gap in OPA's answer must not stick in the cache
+                    decisions[cmd] = (False, "OPA returned no decision for command")
+                    continue
+                # Non-empty deny list = Rejection.
+                deny_list = result[cmd]
+                decisions[cmd] = (not deny_list, "; ".join(deny_list))
+                opa_logger.info(f"OPA decision '{cmd}': {deny_list} | Reason: {decisions[cmd][1]}")
+
+            with decision_cache_lock:
+                for cmd in decided:
+                    decision_cache[cmd] = decisions[cmd]
+                    decision_cache.move_to_end(cmd)
+                while len(decision_cache) > OPA_CACHE_SIZE:
+                    decision_cache.popitem(last=False)
+
+        return [decisions[cmd] for cmd in commands]
     except Exception as e:
-        opa_logger.error(f"Error querying OPA for command '{command}': {e}")
-        return False, f"OPA query error: {e}"
+        opa_logger.error(f"Error querying OPA for commands {commands}: {e}")
+        return [(False, f"OPA query error: {e}") for _ in commands]
+
+def opa_check_command(command: str) -> (bool, str):
+    return opa_check_commands([command])[0]
+
+def opa_check_commands(commands: list) -> list:
+    """
+    Returns an (allowed, reason) decision for every command, in order.
+    """
+    with span("opa_check", mode=POLICY_MODE, commands=len(commands)) as check:
+        decisions = _check_commands(commands)
+        check.set(denied=sum(not allowed for allowed, _ in decisions))
+    return decisions
+
+def _check_commands(commands: list) -> list:
+    if POLICY_MODE == "local":
+        decisions = policy_engine.evaluate_all(commands)
+        opa_logger.info(f"Local policy decisions: {list(zip(commands, decisions))}")
+        return decisions
+
+    decisions = remote_check_commands(commands)
+    if POLICY_MODE == "verify":
+        for command, remote, local in zip(commands, decisions, policy_engine.evaluate_all(commands)):
+            if remote != local:
+                opa_logger.warning(f"Policy mismatch for '{command}': OPA={remote} local={local}")
+    return decisions
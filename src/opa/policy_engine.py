@@ -0,0 +1,85 @@
+import json
+import re
+
+# deny rule block: deny contains msg if { ... }
+RULE_PATTERN = re.compile(r"^deny\s+contains\s+msg\s+if\s*\{(.*?)^\}", re.MULTILINE | re.DOTALL)
+DEFAULT_ALLOW_PATTERN = re.compile(r"^default\s+allow\s*:?=\s*(true|false)\s*$", re.MULTILINE)
+CONDITION_PATTERN = re.compile(r'^(not\s+)?regex\.match\(\s*"((?:[^"\\]|\\.)*)"\s*,\s*input\.command\s*\)$')
+MESSAGE_PATTERN = re.compile(r'^msg\s*:=\s*"((?:[^"\\]|\\.)*)"$')
+
+
+def _rego_string(raw: str) -> str:
+    # Rego string literals use JSON escaping
+    return json.loads(f'"{raw}"')
+
+
+class DenyRule:
+    def __init__(self, message: str, conditions: list):
+        self.message = message
+        # list of (negated, compiled pattern)
+        self.conditions = conditions
+
+    def matches(self, command: str) -> bool:
+        for negated, pattern in self.conditions:
+            # OPA's regex.match is an unanchored search
+            if bool(pattern.search(command)) == negated:
+                return False
+        return True
+
+
+class PolicyEngine:
+    """
+    In-process evaluator for the `deny contains msg if { regex.match(...) }` rules of policy.rego.
+    The regexes are compiled once at load, so a decision costs a few regex searches
+    instead of an HTTP round trip to the OPA server.
+    """
+
+    def __init__(self, rules: list, default_allow: bool = True):
+        self.rules = rules
+        self.default_allow = default_allow
+
+    @classmethod
+    def from_file(cls, path: str) -> "PolicyEngine":
+        with open(path) as f:
+            return cls.from_source(f.read())
+
+    @classmethod
+    def from_source(cls, source: str) -> "PolicyEngine":
+        source = source.replace("\r\n", "\n")
+        default = DEFAULT_ALLOW_PATTERN.search(source)
+        default_allow = default is None or default.group(1) == "true"
+
+        rules = []
+        for body in RULE_PATTERN.findall(source):
+            conditions = []
+            message = None
+            for line in body.splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                condition = CONDITION_PATTERN.match(line)
+                if condition:
+                    negated = condition.group(1) is not None
+                    conditions.append((negated, re.compile(_rego_string(condition.group(2)))))
+                    continue
+                msg = MESSAGE_PATTERN.match(line)
+                if msg:
+                    message = _rego_string(msg.group(1))
+                    continue
+                raise ValueError(f"Unsupported statement in deny rule: {line}")
+            if message is None:
+                raise ValueError("Deny rule without a msg assignment")
+            rules.append(DenyRule(message, conditions))
+        return cls(rules, default_allow)
+
+    def deny(self, command: str) -> list:
+        # OPA serializes the deny set as a sorted array
+        return sorted({rule.message for rule in self.rules if rule.matches(command)})
+
+    def evaluate(self, command: str) -> (bool, str):
+        deny_list = self.deny(command)
+        allowed = self.default_allow and not deny_list
+        return allowed, "; ".join(deny_list)
+
+    def evaluate_all(self, commands: list) -> list:
+        return [self.evaluate(command) for command in commands]
@@ -0,0 +1,185 @@
+import abc
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class DedupStore(abc.ABC):
+    """
+    Remembers Slack event_ids for `ttl` seconds so retried deliveries aren't processed twice.
+    `claim` is atomic: of several callers (threads, or replicas on a shared backend)
+    presenting the same event_id, exactly one gets True.
+    """
+
+    @abc.abstractmethod
+    def claim(self, event_id: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def release(self, event_id: str) -> None:
+        """
+        Forgets a claimed event_id that wasn't processed, so a retried delivery of it is.
+        """
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryDedupStore(DedupStore):
+    """
+    In-process store: an insertion-ordered dict trimmed by age and by size, so memory stays bounded.
+    """
+
+    def __init__(self, ttl: float = 3600, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen = OrderedDict()  # event_id -> first seen (monotonic), oldest first
+        self._lock = threading.Lock()
+        self.metrics = {"claimed": 0, "duplicates": 0, "expired": 0, "evicted": 0}
+
+    def _trim(self, now: float) -> None:
+        while self._seen:
+            event_id, seen_at = next(iter(self._seen.items()))
+            if now - seen_at > self.ttl:
+                self.metrics["expired"] += 1
+            elif len(self._seen) > self.max_size:
+                self.metrics["evicted"] += 1
+            else:
+                break
+            self._seen.popitem(last=False)
+
+    def claim(self, event_id: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if event_id in self._seen:
+                self.metrics["duplicates"] += 1
+                return False
+            self._seen[event_id] = now
+            self.metrics["claimed"] += 1
+            if len(self._seen) > self.max_size:
+                self._trim(now)
+            return True
+
+    def release(self, event_id: str) -> None:
+        with self._lock:
+            self._seen.pop(event_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, backend="memory", size=len(self._seen))
+
+
+class SQLiteDedupStore(DedupStore):
+    """
+    On-disk store that survives restarts, so Slack retries of events seen before a restart are skipped.
+    Replicas sharing the database file (same host or shared volume) also dedup against each other.
+    The table is trimmed to the newest `max_size` rows when it is pruned, so it can exceed that by up to
+    PRUNE_EVERY rows in between.
+    """
+
+    # Expired rows (and the oldest rows beyond max_size) are deleted every this many claims
+    PRUNE_EVERY = 500
+
+    def __init__(self, path: str, ttl: float = 3600, max_size: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS slack_events (event_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS slack_events_seen_at ON slack_events (seen_at)")
+        self._claims = 0
+        self.metrics = {"claimed": 0, "duplicates": 0, "expired": 0, "evicted": 0}
+        self._prune(time.time())
+
+    def _prune(self, now: float) -> None:
+        cursor = self._connection.execute("DELETE FROM slack_events WHERE seen_at < ?", (now - self.ttl,))
+        self.metrics["expired"] += cursor.rowcount
+        cursor = self._connection.execute(
+            "DELETE FROM slack_events WHERE event_id IN "
+            "(SELECT event_id FROM slack_events ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+        self.metrics["evicted"] += cursor.rowcount
+
+    def claim(self, event_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            # An expired row from an earlier delivery doesn't count as a duplicate
+            cursor = self._connection.execute(
+                "INSERT INTO slack_events (event_id, seen_at) VALUES (?, ?) "
+                "ON CONFLICT (event_id) DO UPDATE SET seen_at = excluded.seen_at WHERE seen_at < ?",
+                (event_id, now, now - self.ttl)
+            )
+            claimed = cursor.rowcount == 1
+            self._claims += 1
+            if self._claims % self.PRUNE_EVERY == 0:
+                self._prune(now)
+            if claimed:
+                self.metrics["claimed"] += 1
+                return True
+            self.metrics["duplicates"] += 1
+            return False
+
+    def release(self, event_id: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM slack_events WHERE event_id = ?", (event_id,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection.execute("SELECT COUNT(*) FROM slack_events").fetchone()[0]
+            return dict(self.metrics, backend="sqlite", size=size)
+
+
+class RedisDedupStore(DedupStore):
+    """
+    Shared store for replicas behind one Slack endpoint: SET NX with an expiry, so the first replica
+    to claim an event_id processes it and the key disappears after `ttl`.
+    """
+
+    def __init__(self, url: str, ttl: float = 3600, prefix: str = "kubecom:slack-event:"):
+        if redis is None:
+            raise ImportError("The redis dedup backend requires the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.metrics = {"claimed": 0, "duplicates": 0}
+
+    def claim(self, event_id: str) -> bool:
+        if self.client.set(self.prefix + event_id, 1, nx=True, ex=max(1, int(self.ttl))):
+            self.metrics["claimed"] += 1
+            return True
+        self.metrics["duplicates"] += 1
+        return False
+
+    def release(self, event_id: str) -> None:
+        self.client.delete(self.prefix + event_id)
+
+    def stats(self) -> dict:
+        return dict(self.metrics, backend="redis")
+
+
+def create_dedup_store(backend: str, ttl: float, max_size: int, path: str, redis_url: str) -> DedupStore:
+    if backend == "memory":
+        return MemoryDedupStore(ttl=ttl, max_size=max_size)
+    if backend == "sqlite":
+        return SQLiteDedupStore(path, ttl=ttl, max_size=max_size)
+    if backend == "redis":
+        return RedisDedupStore(redis_url, ttl=ttl)
+    raise ValueError(f"Unknown dedup backend '{backend}', expected memory, sqlite or redis")
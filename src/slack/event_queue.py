@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class EventQueue:
+    """
+    Bounded job queue drained by a pool of worker threads.
+    Jobs that share a key (the Slack channel) run one at a time in submission order,
+    jobs for different keys run concurrently.
+    """
+
+    def __init__(self, workers: int = 4, max_size: int = 32, overflow: str = "reject", defer_timeout: float = 1.5):
+        if overflow not in ("reject", "defer"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.workers = workers
+        self.max_size = max_size
+        self.overflow = overflow
+        self.defer_timeout = defer_timeout
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._has_ready = threading.Condition(self._lock)
+        self._pending = {}        # key -> deque of (job, enqueued_at)
+        self._ready = deque()     # keys with pending jobs and no job running
+        self._running = set()     # keys with a job currently running
+        self._size = 0
+        self._threads = []
+        self._stopped = False
+
+        self.metrics = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stopped = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"slack-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Event queue started with {self.workers} workers (max size {self.max_size}, overflow={self.overflow})")
+
+    def stop(self, timeout: float = None) -> None:
+        with self._lock:
+            self._stopped = True
+            self._has_ready.notify_all()
+            self._not_full.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, key: str, job) -> bool:
+        """
+        Enqueues a callable for the given key. Returns False when the queue is full
+        (immediately for the 'reject' policy, after defer_timeout for 'defer').
+        """
+        with self._lock:
+            if self._size >= self.max_size and self.overflow == "defer":
+                deadline = time.monotonic() + self.defer_timeout
+                while self._size >= self.max_size and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._not_full.wait(remaining)
+
+            if self._size >= self.max_size or self._stopped:
+                self.metrics["rejected"] += 1
+                logger.warning(f"Event queue full ({self._size}/{self.max_size}), rejecting job for {key}")
+                return False
+
+            self._pending.setdefault(key, deque()).append((job, time.monotonic()))
+            self._size += 1
+            self.metrics["submitted"] += 1
+            self.metrics["max_depth"] = max(self.metrics["max_depth"], self._size)
+
+            # Only schedule the key if no job for it is queued or running already
+            if key not in self._running and len(self._pending[key]) == 1:
+                self._ready.append(key)
+                self._has_ready.notify()
+            return True
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._size
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["depth"] = self._size
+            stats["active_keys"] = len(self._running)
+            stats["workers"] = len(self._threads)
+        finished = stats["completed"] + stats["failed"]
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / finished if finished else 0.0
+        return stats
+
+    def _next_job(self):
+        with self._lock:
+            while not self._ready and not self._stopped:
+                self._has_ready.wait()
+            if self._stopped:
+                return None
+            key = self._ready.popleft()
+            job, enqueued_at = self._pending[key].popleft()
+            self._running.add(key)
+            self._size -= 1
+            self._not_full.notify()
+
+            wait = time.monotonic() - enqueued_at
+            self.metrics["total_wait_seconds"] += wait
+            self.metrics["max_wait_seconds"] = max(self.metrics["max_wait_seconds"], wait)
+            return key, job, wait
+
+    def _finish(self, key: str, success: bool) -> None:
+        with self._lock:
+            self._running.discard(key)
+            self.metrics["completed" if success else "failed"] += 1
+            if self._pending.get(key):
+                self._ready.append(key)
+                self._has_ready.notify()
+            else:
+                self._pending.pop(key, None)
+
+    def _worker(self) -> None:
+        while True:
+            item = self._next_job()
+            if item is None:
+                return
+            key, job, wait = item
+            logger.info(f"Starting job for {key} after {wait:.3f}s in queue ({self.depth()} still queued)")
+            success = True
+            try:
+                job()
+            except Exception as e:
+                success = False
+                logger.error(f"Job for {key} failed: {e}")
+            finally:
+                self._finish(key, success)
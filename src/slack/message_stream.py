@@ -0,0 +1,82 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SlackMessageStream:
+    """
+    Renders the pipeline stages of one request into a single Slack message.
+    The first flush posts the message (unless an already posted SlackMessage is given),
+    later flushes edit it in place. Flushes only queue the text with SlackDelivery, which
+    merges edits still waiting for the channel into one; partial updates are additionally
+    throttled to one edit per `min_interval` seconds, complete stages are always sent.
+    Text beyond `message_limit` characters is cut; files attached to a stage (outputs too long for the
+    message) are uploaded into the message's thread, or posted there as pages when `delivery` is "pages"
+    or the upload fails.
+    """
+
+    def __init__(self, slack_delivery, channel: str, header: str = "", message=None, min_interval: float = 1.0,
+                 started_at: float = None, message_limit: int = 39000, delivery: str = "file"):
+        self.slack_delivery = slack_delivery
+        self.channel = channel
+        self.header = header
+        self.message = message
+        self.min_interval = min_interval
+        self.message_limit = message_limit
+        self.delivery = delivery
+        self._files = []
+
+        self._stages = {}
+        self._dirty = False
+        self._last_flush = 0.0
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.time_to_first_text = None
+        self.updates = 0
+
+    def update(self, stage: str, message: str, partial: bool = False, files: list = None) -> None:
+        self._stages[stage] = message
+        self._files.extend(files or [])
+        self._dirty = True
+        if partial and time.monotonic() - self._last_flush < self.min_interval:
+            return
+        self.flush()
+
+    def close(self) -> None:
+        if self._dirty:
+            self.flush()
+        self.deliver_files()
+        if self.time_to_first_text is not None:
+            logger.info(f"Time to first text in {self.channel}: {self.time_to_first_text:.3f}s ({self.updates} updates queued)")
+
+    def render(self) -> str:
+        parts = [self.header] if self.header else []
+        parts.extend(self._stages.values())
+        text = "\n\n".join(parts)
+        if len(text) <= self.message_limit:
+            return text
+        text = text[:self.message_limit - 60].rsplit("\n", 1)[0]
+        # Don't leave a code block open
+        return text + ("\n```" if text.count("```") % 2 else "") + "\n_... message truncated_"
+
+    def deliver_files(self) -> None:
+        """
+        Queues the files attached so far for the message's thread.
+        """
+        files, self._files = self._files, []
+        for file in files:
+            self.slack_delivery.upload(self.channel, file, thread=self.message, mode=self.delivery,
+                                       page_size=self.message_limit)
+
+    def flush(self) -> None:
+        text = self.render()
+        if self.message is None:
+            self.message = self.slack_delivery.post(self.channel, text)
+        else:
+            self.slack_delivery.update(self.message, text)
+
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self.updates += 1
+        if self._stages and self.time_to_first_text is None:
+            self.time_to_first_text = self._last_flush - self.started_at
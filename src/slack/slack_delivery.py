@@ -0,0 +1,396 @@
+import logging
+import threading
+import time
+from collections import deque
+import requests
+import slack
+from slack.errors import SlackApiError
+from src.config.config import (
+    SLACK_BOT_TOKEN,
+    SLACK_DELIVERY_WORKERS,
+    SLACK_CHANNEL_RATE,
+    SLACK_CHANNEL_BURST,
+    SLACK_MAX_RETRIES,
+    SLACK_RETRY_BACKOFF
+)
+from src.tracing.tracing import span, metrics, propagate
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    `rate` calls per second with bursts of up to `burst`; pause() empties it for a Retry-After.
+    Not thread-safe on its own, SlackDelivery holds its lock around it.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """
+        Seconds until a call may be made (0 = now).
+        """
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self.delay(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class SlackMessage:
+    """
+    A message sent through SlackDelivery. `text` is what the message should say; posting it and editing it
+    happen later on a delivery thread. `wait()` blocks until it has been posted and returns its ts.
+    """
+
+    def __init__(self, channel: str, text: str, thread_ts: str = None):
+        self.channel = channel
+        self.text = text
+        self.thread_ts = thread_ts
+        self.ts = None
+        self.sent_text = None
+        self.failed = False
+        self.queued = False
+        self.posted = threading.Event()
+
+    def wait(self, timeout: float = None) -> str:
+        self.posted.wait(timeout)
+        return self.ts
+
+
+class SlackDelivery:
+    """
+    The one Slack WebClient of the process, behind a per-channel outbound queue so callers never wait on Slack.
+    Calls for a channel go out one at a time in order (Slack allows about one message per second per channel),
+    paced by a token bucket per channel; a 429 pauses the channel for its Retry-After, and rate limits,
+    server errors and connection failures are retried with backoff. Edits of a message that are still queued
+    are coalesced: only its latest text is sent, and a message not posted yet is posted with it directly.
+    """
+
+    def __init__(self, client, workers: int = SLACK_DELIVERY_WORKERS, rate: float = SLACK_CHANNEL_RATE,
+                 burst: int = SLACK_CHANNEL_BURST, max_retries: int = SLACK_MAX_RETRIES,
+                 backoff: float = SLACK_RETRY_BACKOFF):
+        self.client = client
+        # Sends the file bytes to the URL files.getUploadURLExternal hands out (outside the Web API client)
+        self.http = requests
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending = {}        # channel -> deque of (kind, message, payload, call, enqueued_at)
+        self._buckets = {}        # channel -> TokenBucket
+        self._sending = set()     # channels with a call in flight
+        self._threads = []
+        self._stopped = False
+
+        self.metrics = {
+            "queued": 0,
+            "sent": 0,
+            "failed": 0,
+            "coalesced": 0,
+            "retried": 0,
+            "rate_limited": 0,
+        }
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stopped = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"slack-delivery-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Sends what is queued (up to `timeout` seconds), then stops the delivery threads.
+        """
+        self.flush(timeout)
+        with self._lock:
+            self._stopped = True
+            self._changed.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Blocks until every queued call has been made; False if `timeout` ran out first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending or self._sending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def depth(self) -> int:
+        with self._lock:
+            return sum(len(items) for items in self._pending.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.metrics, depth=sum(len(items) for items in self._pending.values()),
+                        channels=len(self._pending))
+
+    # Enqueueing (never blocks on Slack)
+
+    def post(self, channel: str, text: str, thread_ts: str = None) -> SlackMessage:
+        """
+        Queues a new message; edit it later with update().
+        """
+        message = SlackMessage(channel, text, thread_ts)
+        with self._lock:
+            message.queued = True
+            self._enqueue(channel, ("message", message, None))
+        self.start()
+        return message
+
+    def update(self, message: SlackMessage, text: str) -> None:
+        """
+        Changes the text of a message. If an earlier post or edit of it is still queued, that one sends this text.
+        """
+        with self._lock:
+            message.text = text
+            if message.queued:
+                self.metrics["coalesced"] += 1
+                metrics.inc("kubecom_slack_coalesced_total", help="Slack edits merged into a queued call")
+                return
+            message.queued = True
+            self._enqueue(message.channel, ("message", message, None))
+        self.start()
+
+    def upload(self, channel: str, file: dict, thread: SlackMessage = None, mode: str = "file",
+               page_size: int = 39000) -> None:
+        """
+        Queues a file ({"filename", "title", "content"}) for the thread of `thread`, uploaded through Slack's
+        external upload flow or, with mode "pages" or when the upload fails, posted as consecutive thread replies.
+        """
+        with self._lock:
+            self._enqueue(channel, ("file", thread, dict(file, mode=mode, page_size=page_size)))
+        self.start()
+
+    def _enqueue(self, channel: str, item: tuple) -> None:
+        kind, message, payload = item
+        # Spans recorded while sending land in the caller's trace
+        self._pending.setdefault(channel, deque()).append((kind, message, payload, propagate(self._send),
+                                                           time.monotonic()))
+        if channel not in self._buckets:
+            self._buckets[channel] = TokenBucket(self.rate, self.burst)
+        self.metrics["queued"] += 1
+        self._changed.notify_all()
+
+    # Delivery threads
+
+    def _next(self):
+        """
+        Waits for a channel with queued calls, nothing in flight and a token to spend; returns its next call.
+        """
+        with self._lock:
+            while not self._stopped:
+                now = time.monotonic()
+                wait = None
+                for channel, items in self._pending.items():
+                    if channel in self._sending:
+                        continue
+                    delay = self._buckets[channel].delay(now)
+                    if delay > 0:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    self._buckets[channel].take(now)
+                    self._sending.add(channel)
+                    kind, message, payload, call, enqueued_at = items.popleft()
+                    if not items:
+                        del self._pending[channel]
+                    if kind == "message":
+                        # Edits from here on queue a new call
+                        message.queued = False
+                        payload = message.text
+                    return channel, kind, message, payload, call, enqueued_at
+                self._changed.wait(wait)
+            return None
+
+    def _worker(self) -> None:
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            channel, kind, message, payload, call, enqueued_at = item
+            outcome = "sent"
+            try:
+                call(channel, kind, message, payload)
+            except Exception as e:
+                outcome = "failed"
+                metrics.inc("kubecom_slack_failures_total", help="Slack calls that failed after retries", kind=kind)
+                logger.error(f"Slack delivery to {channel} failed: {e}")
+            finally:
+                metrics.observe("kubecom_slack_delivery_seconds", time.monotonic() - enqueued_at,
+                                help="Time from queueing a Slack call to it completing", kind=kind)
+                with self._lock:
+                    self.metrics[outcome] += 1
+                    self._sending.discard(channel)
+                    self._changed.notify_all()
+
+    def _send(self, channel: str, kind: str, message: SlackMessage, payload) -> None:
+        if kind == "file":
+            self._send_file(channel, message, payload)
+        elif message.ts is None:
+            try:
+                response = self._call("chat_postMessage", stage="post", channel=channel, text=payload,
+                                      thread_ts=message.thread_ts)
+                message.ts = response["ts"]
+                message.sent_text = payload
+            except Exception:
+                message.failed = True
+                raise
+            finally:
+                message.posted.set()
+        elif payload != message.sent_text:
+            self._call("chat_update", stage="update", channel=channel, ts=message.ts, text=payload)
+            message.sent_text = payload
+
+    def _send_file(self, channel: str, thread: SlackMessage, file: dict) -> None:
+        thread_ts = thread.ts if thread is not None else None
+        if file["mode"] == "file":
+            try:
+                self._upload_external(channel, thread_ts, file)
+                return
+            except Exception as e:
+                logger.warning(f"Uploading {file['filename']} to {channel} failed, posting it as pages: {e}")
+
+        pages = _pages(file["content"], file["page_size"] - len(file["title"]) - 40)
+        for number, text in enumerate(pages, 1):
+            if number > 1:
+                self._wait_for_token(channel)
+            self._call("chat_postMessage", stage="page", channel=channel, thread_ts=thread_ts,
+                       text=f"`{file['title']}` ({number}/{len(pages)})\n```{text}```")
+
+    def _upload_external(self, channel: str, thread_ts: str, file: dict) -> None:
+        """
+        files.upload is retired: ask for an upload URL, send the bytes there, then share the file in the channel.
+        """
+        content = file["content"].encode("utf-8")
+        ticket = self._call("api_call", stage="file", bucket=channel, api_method="files.getUploadURLExternal",
+                            http_verb="GET", params={"filename": file["filename"], "length": len(content)})
+        with span("slack_post", method="upload_url", stage="file"):
+            self.http.post(ticket["upload_url"], data=content, timeout=60).raise_for_status()
+        shared = {"files": [{"id": ticket["file_id"], "title": file["title"]}], "channel_id": channel}
+        if thread_ts is not None:
+            shared["thread_ts"] = thread_ts
+        self._call("api_call", stage="file", bucket=channel, api_method="files.completeUploadExternal", json=shared)
+
+    def _wait_for_token(self, channel: str) -> None:
+        """
+        Paces the extra calls of a multi-call item (pages) by the channel's bucket.
+        """
+        while True:
+            with self._lock:
+                bucket = self._buckets[channel]
+                delay = bucket.delay(time.monotonic())
+                if delay <= 0:
+                    bucket.take(time.monotonic())
+                    return
+            time.sleep(delay)
+
+    def _call(self, method: str, stage: str = None, bucket: str = None, **kwargs):
+        """
+        One Web API call, retried on rate limits (after Retry-After, pausing the channel, `bucket` when the
+        call's arguments don't name it), server errors and connection failures.
+        """
+        channel = bucket or kwargs.get("channel") or kwargs.get("channels")
+        attempt = 0
+        while True:
+            try:
+                with span("slack_post", method=method, stage=stage, attempt=attempt):
+                    response = getattr(self.client, method)(**kwargs)
+                metrics.inc("kubecom_slack_calls_total", help="Slack Web API calls", method=method)
+                return response
+            except Exception as e:
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    metrics.inc("kubecom_slack_rate_limited_total", help="Slack calls answered with 429", method=method)
+                    with self._lock:
+                        self.metrics["rate_limited"] += 1
+                        self._buckets[channel].pause(retry_after)
+                elif not _is_transient(e):
+                    raise
+                if attempt >= self.max_retries:
+                    raise
+                delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+                attempt += 1
+                with self._lock:
+                    self.metrics["retried"] += 1
+                metrics.inc("kubecom_slack_retries_total", help="Slack calls retried", method=method)
+                logger.warning(f"Slack {method} to {channel} failed ({e}), retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+
+def _status(error: Exception):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retry_after(error: Exception):
+    """
+    Seconds Slack asked us to wait, for a 429; None for anything else.
+    """
+    if _status(error) != 429:
+        return None
+    headers = getattr(error.response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, SlackApiError):
+        status = _status(error)
+        return status is not None and status >= 500
+    # Connection resets, timeouts and the like never got a Slack answer
+    return isinstance(error, (OSError, TimeoutError)) or type(error).__module__.startswith(("aiohttp", "urllib"))
+
+
+def _pages(content: str, size: int) -> list:
+    """
+    Splits `content` at line breaks into non-empty pages of at most `size` characters that join back into
+    `content`; lines longer than a page are cut.
+    """
+    pages = []
+    page = ""
+    for line in content.splitlines(keepends=True):
+        if len(page) + len(line) > size and page:
+            pages.append(page)
+            page = ""
+        while len(line) > size:
+            pages.append(line[:size])
+            line = line[size:]
+        page += line
+    if page:
+        pages.append(page)
+    return pages
+
+
+# Shared by everything that talks to Slack (acknowledgements, streamed stages, lifecycle messages)
+slack_delivery = SlackDelivery(slack.WebClient(token=SLACK_BOT_TOKEN))
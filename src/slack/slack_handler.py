@@ -1,12 +1,36 @@
 import logging
 import os
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, request, jsonify
 from slackeventsapi import SlackEventAdapter
-import slack
-from src.config.config import SIGNING_SECRET, SLACK_BOT_TOKEN
-from src.intent_processing.message_processor import process_slack_message
-from src.config.logging_config import logger  
-from src.lifecycle.lifecycle import send_processing_message  
+from src.config.config import (
+    SIGNING_SECRET,
+    SLACK_BOT_TOKEN,
+    SLACK_PORT,
+    SLACK_WORKERS,
+    SLACK_QUEUE_SIZE,
+    SLACK_QUEUE_OVERFLOW,
+    SLACK_QUEUE_DEFER_TIMEOUT,
+    SLACK_UPDATE_INTERVAL,
+    SLACK_MESSAGE_LIMIT,
+    SLACK_OUTPUT_DELIVERY,
+    DEDUP_BACKEND,
+    DEDUP_TTL,
+    DEDUP_MAX_SIZE,
+    DEDUP_PATH,
+    DEDUP_REDIS_URL,
+    TRACES_ENDPOINT_ENABLED
+)
+from src.intent_processing.message_processor import process_slack_message, start_model
+from src.model.model_loader import model_status
+from src.config.logging_config import logger, logging_stats
+from src.lifecycle.lifecycle import send_processing_message, processing_message_text
+from src.slack.event_queue import EventQueue
+from src.slack.dedup_store import create_dedup_store
+from src.slack.message_stream import SlackMessageStream
+from src.slack.slack_delivery import slack_delivery
+from src.commands.command_executor import start_resource_watch
+from src.tracing.tracing import start_trace, record_span, metrics, render_metrics, recent_traces
 
 app = Flask(__name__)
 
@@ -15,9 +39,16 @@ if not SIGNING_SECRET or not SLACK_BOT_TOKEN:
     logger.error("Missing Slack environment variables. Check your .env file!")
     exit(1)
 
-# Initialize Slack Event Adapter and Slack WebClient
+# Initialize Slack Event Adapter; all outbound calls go through slack_delivery
 slack_events_adapter = SlackEventAdapter(SIGNING_SECRET, "/slack/events", app)
-web_client = slack.WebClient(token=SLACK_BOT_TOKEN)
+
+# Slack events are acknowledged right away; the pipeline runs on these workers
+event_queue = EventQueue(
+    workers=SLACK_WORKERS,
+    max_size=SLACK_QUEUE_SIZE,
+    overflow=SLACK_QUEUE_OVERFLOW,
+    defer_timeout=SLACK_QUEUE_DEFER_TIMEOUT
+)
 
 @app.route("/test", methods=["POST"])
 def test_endpoint():
@@ -25,17 +56,72 @@ def test_endpoint():
     logger.info(f"Test endpoint received: {data}")
     return jsonify({"status": "received", "data": data})
 
-# Global set to track processed event_ids for deduplication
-processed_events = set()
+@app.route("/queue", methods=["GET"])
+def queue_endpoint():
+    return jsonify(dict(event_queue.stats(), dedup=dedup_store.stats(), slack_delivery=slack_delivery.stats()))
+
+metrics.gauge("kubecom_queue_depth", event_queue.depth, help="Slack events waiting for a worker")
+metrics.gauge("kubecom_slack_outbound_depth", slack_delivery.depth, help="Slack calls waiting to be sent")
+metrics.gauge("kubecom_log_records_dropped", lambda: logging_stats()["dropped"],
+              help="Log records dropped because the logging queue was full")
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/traces", methods=["GET"])
+def traces_endpoint():
+    if not TRACES_ENDPOINT_ENABLED:
+        return jsonify({"error": "Traces endpoint is disabled (tracesEndpoint=false)"}), 404
+    return jsonify(recent_traces(request.args.get("limit", 20, type=int)))
+
+@app.route("/health", methods=["GET"])
+def health_endpoint():
+    # Liveness: the process is up and serving, whether or not the model has loaded
+    return jsonify({"status": "ok"})
+
+@app.route("/ready", methods=["GET"])
+def ready_endpoint():
+    # Readiness: 200 once the model can serve requests, 503 while loading or after a failed load
+    status = model_status()
+    return jsonify(status), 200 if status["state"] == "ready" else 503
+
+# Event_ids seen recently, so Slack's retried deliveries don't run the commands twice
+dedup_store = create_dedup_store(
+    DEDUP_BACKEND,
+    ttl=DEDUP_TTL,
+    max_size=DEDUP_MAX_SIZE,
+    path=DEDUP_PATH,
+    redis_url=DEDUP_REDIS_URL
+)
+
+def claim_event(event_id: str) -> bool:
+    if not event_id:
+        return True
+    try:
+        return dedup_store.claim(event_id)
+    except Exception as e:
+        # Losing a user's message is worse than the rare duplicate while the store is unavailable
+        logger.error(f"Dedup store unavailable, processing {event_id} anyway: {e}")
+        return True
+
+def release_event(event_id: str) -> None:
+    """
+    Undoes claim_event for an event that won't be processed, so Slack's retry of it isn't dropped as a duplicate.
+    """
+    if not event_id:
+        return
+    try:
+        dedup_store.release(event_id)
+    except Exception as e:
+        logger.error(f"Dedup store unavailable, couldn't release {event_id}: {e}")
 
 @slack_events_adapter.on("message")
 def handle_message_event(payload):
-    global processed_events
     event_id = payload.get("event_id")
-    if event_id in processed_events:
+    if not claim_event(event_id):
         logger.info(f"🔁 Skipping duplicate event: {event_id}")
         return
-    processed_events.add(event_id)
     
     try:
         logger.info(f"🔍 Raw Slack Event: {payload}")
@@ -55,16 +141,56 @@ def handle_message_event(payload):
             logger.info("🤖 Ignoring bot message.")
             return
 
-        logger.info("Sending processing acknowledgment to user")
-        send_processing_message(channel_id, text)
-
-        for update in process_slack_message(text):
-            # Each update is a dict with keys 'stage' and 'message'
-            web_client.chat_postMessage(channel=channel_id, text=update["message"])
+        logger.info(f"Queueing message for channel {channel_id} ({event_queue.depth()} already queued)")
+        received_at = time.monotonic()
+        job = lambda: process_message_job(channel_id, text, event_id, received_at)
+        if not event_queue.submit(channel_id, job):
+            release_event(event_id)
+            slack_delivery.post(channel_id, ":warning: The bot is busy right now, please try again in a moment.")
 
     except Exception as e:
+        release_event(event_id)
         logger.error(f"⚠️ Error processing Slack event: {e}")
 
+def process_message_job(channel_id: str, text: str, event_id: str = None, received_at: float = None) -> None:
+    """
+    Runs the message pipeline for one Slack event on an event queue worker, traced under its event_id.
+    """
+    with start_trace(event_id, channel=channel_id, text=text):
+        if received_at is not None:
+            record_span("queue_wait", time.monotonic() - received_at)
+        run_message_pipeline(channel_id, text)
+
+def run_message_pipeline(channel_id: str, text: str) -> None:
+    started_at = time.monotonic()
+    logger.info("Sending processing acknowledgment to user")
+    acknowledgement = send_processing_message(channel_id, text)
+
+    # All stages are edited into the acknowledgement message instead of one post per stage; Slack calls
+    # are queued, so this worker moves on while they are sent
+    stream = SlackMessageStream(
+        slack_delivery,
+        channel_id,
+        header=processing_message_text(text),
+        message=acknowledgement,
+        min_interval=SLACK_UPDATE_INTERVAL,
+        started_at=started_at,
+        message_limit=SLACK_MESSAGE_LIMIT,
+        delivery=SLACK_OUTPUT_DELIVERY
+    )
+    try:
+        for update in process_slack_message(text):
+            # Each update is a dict with keys 'stage' and 'message', 'partial' while streaming
+            # and 'files' for outputs too long for the message
+            stream.update(update["stage"], update["message"], partial=update.get("partial", False),
+                          files=update.get("files"))
+    finally:
+        stream.close()
+
 def start_slack_bot():
-    logger.info("🚀 Starting Slack bot on port 5000...")
-    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
+    start_model()
+    event_queue.start()
+    slack_delivery.start()
+    start_resource_watch()
+    logger.info(f"🚀 Starting Slack bot on port {SLACK_PORT}...")
+    app.run(host="0.0.0.0", port=SLACK_PORT, debug=True, use_reloader=False)
@@ -0,0 +1,280 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from src.config.config import TRACE_EXPORT_PATH, TRACE_BUFFER_SIZE
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+
+
+class Span:
+    """
+    One timed step of a trace. Attributes are free-form; a `tokens` attribute also yields tokens/sec.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self._started = time.monotonic()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, duration: float = None) -> None:
+        self.duration = duration if duration is not None else time.monotonic() - self._started
+        tokens = self.attributes.get("tokens")
+        if tokens and self.duration > 0:
+            self.attributes["tokens_per_sec"] = round(tokens / self.duration, 2)
+
+    def to_dict(self) -> dict:
+        span = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "attributes": self.attributes,
+        }
+        if self.error:
+            span["error"] = self.error
+        return span
+
+
+class Trace:
+    """
+    All spans recorded for one Slack event, across the threads that worked on it.
+    """
+
+    def __init__(self, trace_id: str, attributes: dict):
+        self.trace_id = trace_id
+        self.attributes = dict(attributes)
+        self.start = time.time()
+        self._started = time.monotonic()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [span.to_dict() for span in sorted(self.spans, key=lambda span: span.start)]
+        return {
+            "trace_id": self.trace_id,
+            "start": self.start,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "spans": spans,
+        }
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Counters, histograms and callback gauges, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}    # name -> labels -> value
+        self._histograms = {}  # name -> labels -> [bucket counts, sum, count]
+        self._buckets = {}     # histogram name -> bucket bounds
+        self._gauges = {}      # name -> callable
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = DURATION_BUCKETS, help: str = "", **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            bounds = self._buckets.setdefault(name, buckets)
+            state = self._histograms.setdefault(name, {}).setdefault(key, [[0] * len(bounds), 0.0, 0])
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def gauge(self, name: str, function, help: str = "") -> None:
+        """
+        Registers a gauge whose value is read from `function()` at scrape time.
+        """
+        with self._lock:
+            self._help[name] = help
+            self._gauges[name] = function
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_label_text(labels)} {value}" for labels, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} histogram"]
+                for labels, (counts, total, count) in sorted(series.items()):
+                    for bound, bucket_count in zip(self._buckets[name], counts):
+                        lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {bucket_count}")
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {total}")
+                    lines.append(f"{name}_count{_label_text(labels)} {count}")
+            gauges = sorted(self._gauges.items())
+        for name, function in gauges:
+            try:
+                value = function()
+            except Exception as e:
+                logger.warning(f"Gauge {name} failed: {e}")
+                continue
+            lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_recent_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+# Written to TRACE_EXPORT_PATH by the logging writer thread (see logging_config), off the request path
+trace_logger = logging.getLogger("Traces")
+
+
+def _export(trace: Trace) -> None:
+    record = trace.to_dict()
+    _recent_traces.append(record)
+    if TRACE_EXPORT_PATH:
+        trace_logger.info(json.dumps(record, default=str))
+
+
+def _record(span: Span, trace: Trace) -> None:
+    metrics.observe("kubecom_span_duration_seconds", span.duration,
+                    help="Duration of pipeline steps", span=span.name)
+    if span.error:
+        metrics.inc("kubecom_span_errors_total", help="Pipeline steps that raised", span=span.name)
+    tokens = span.attributes.get("tokens")
+    if tokens:
+        metrics.inc("kubecom_generated_tokens_total", tokens, help="Tokens generated by the model", span=span.name)
+        if "tokens_per_sec" in span.attributes:
+            metrics.observe("kubecom_generation_tokens_per_second", span.attributes["tokens_per_sec"],
+                            buckets=TOKENS_PER_SECOND_BUCKETS, help="Generation throughput", span=span.name)
+    if trace is not None:
+        trace.add(span)
+
+
+@contextmanager
+def start_trace(trace_id: str = None, **attributes):
+    """
+    Opens the trace for one Slack event; spans started in this context (and in contexts propagated
+    from it) are collected into it. The finished trace is exported as one JSON line.
+    """
+    trace = Trace(trace_id or uuid.uuid4().hex, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        trace.duration = time.monotonic() - trace._started
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        metrics.observe("kubecom_trace_duration_seconds", trace.duration, help="End-to-end duration per Slack event")
+        _export(trace)
+        logger.info(f"Trace {trace.trace_id} finished in {trace.duration:.3f}s with {len(trace.spans)} spans")
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times a step of the current trace (metrics are recorded even outside a trace).
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(name, trace.trace_id if trace else None, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # A generator closed from another context than the one it started in
+            pass
+        current.finish()
+        _record(current, trace)
+
+
+def record_span(name: str, duration: float, **attributes) -> None:
+    """
+    Records a step that was timed elsewhere, e.g. the time an event spent queued.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    recorded = Span(name, trace.trace_id if trace else None, parent.span_id if parent else None, attributes)
+    recorded.start -= duration
+    recorded.finish(duration)
+    _record(recorded, trace)
+
+
+def current_trace_id() -> str:
+    """
+    The trace (Slack event_id) the caller is working on, or None outside a trace.
+    """
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def annotate(**attributes) -> None:
+    """
+    Adds attributes to the current trace (e.g. whether the response cache was hit).
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def propagate(function):
+    """
+    Binds `function` to a copy of the current context, so spans it records on another thread
+    (a thread pool, a streaming thread) land in the caller's trace. Wrap once per submission.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+def recent_traces(limit: int = 20) -> list:
+    return list(_recent_traces)[-limit:]
+
+
+def render_metrics() -> str:
+    return metrics.render()
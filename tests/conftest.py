@@ -0,0 +1,134 @@
+import os
+import sys
+import tempfile
+import time
+import pytest
+
+# The bot reads its settings from the environment at import
+os.environ.update({
+    "signToken": "test",
+    "slackToken": "xoxb-test",
+    "executionBackend": "subprocess",
+    "executionMode": "dag",
+    "resourceWatch": "false",
+    "modelServerUrls": "",
+    "policyMode": "local",
+    "policyPath": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "policy.rego"),
+    "responseCacheEnabled": "false",
+    "dedupBackend": "memory",
+    "readinessTimeout": "5",
+    "logDir": tempfile.mkdtemp(prefix="kubecom-test-logs-"),
+    "logLevel": "WARNING",
+    "traceExportPath": "",
+    "prefixCache": "false",
+})
+
+FAKE_KUBECTL = """#!{python}
+import os, sys, time
+args = sys.argv[1:]
+with open(os.environ["FAKE_KUBECTL_LOG"], "a") as log:
+    log.write("start %f %s\\n" % (time.time(), " ".join(args)))
+time.sleep(float(os.environ.get("FAKE_KUBECTL_DELAY", "0.2")))
+if any(arg.startswith("missing") for arg in args):
+    sys.stderr.write("error: not found\\n")
+    code = 1
+else:
+    if args and args[0] == "get":
+        print("NAME       READY   STATUS    RESTARTS   AGE")
+        print("web-0      1/1     Running   0          1d")
+    else:
+        print("%s done" % " ".join(args[:3]))
+    code = 0
+with open(os.environ["FAKE_KUBECTL_LOG"], "a") as log:
+    log.write("end %f %s\\n" % (time.time(), " ".join(args)))
+sys.exit(code)
+"""
+
+
+class KubectlLog:
+    """
+    The invocations of the fake kubectl: (start, end) times per argument string.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def calls(self) -> dict:
+        calls = {}
+        if not os.path.exists(self.path):
+            return calls
+        with open(self.path) as f:
+            for line in f:
+                event, timestamp, args = line.rstrip("\n").split(" ", 2)
+                calls.setdefault(args, {})[event] = float(timestamp)
+        return calls
+
+
+@pytest.fixture
+def fake_kubectl(tmp_path, monkeypatch):
+    """
+    A fake `kubectl` first on PATH that records when each invocation starts and ends.
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "kubectl"
+    script.write_text(FAKE_KUBECTL.replace("{python}", sys.executable))
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_KUBECTL_LOG", str(tmp_path / "kubectl.log"))
+    return KubectlLog(str(tmp_path / "kubectl.log"))
+
+
+class FakeWebClient:
+    """
+    Stands in for slack.WebClient (and for requests, to the file upload URL): records every call with
+    the time it was made. Calls take `delay` seconds and succeed, except for errors queued with fail().
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.failures = {}
+
+    def fail(self, method: str, *errors) -> None:
+        """
+        The next calls of `method` raise `errors`, one per call.
+        """
+        self.failures.setdefault(method, []).extend(errors)
+
+    def _call(self, method: str, kwargs: dict) -> dict:
+        time.sleep(self.delay)
+        self.calls.append((method, kwargs, time.monotonic()))
+        if self.failures.get(method):
+            raise self.failures[method].pop(0)
+        return {"ok": True, "ts": str(len(self.calls)), "upload_url": "https://files.slack.invalid/upload",
+                "file_id": "F1"}
+
+    def chat_postMessage(self, **kwargs) -> dict:
+        return self._call("chat_postMessage", kwargs)
+
+    def chat_update(self, **kwargs) -> dict:
+        return self._call("chat_update", kwargs)
+
+    def api_call(self, api_method: str, **kwargs) -> dict:
+        return self._call(api_method, kwargs)
+
+    def post(self, url: str, data: bytes, **kwargs):
+        self._call("upload_url", {"url": url, "data": data})
+        return self
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_slack():
+    """
+    A SlackDelivery (no rate limit, no retry backoff) sending to a FakeWebClient, as (delivery, client).
+    """
+    from src.slack.slack_delivery import SlackDelivery
+    client = FakeWebClient()
+    delivery = SlackDelivery(client, workers=2, rate=100, burst=100, backoff=0)
+    delivery.http = client
+    yield delivery, client
+    delivery.stop(timeout=5)
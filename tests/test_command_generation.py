@@ -0,0 +1,93 @@
+import time
+import torch
+from src.commands.command_generation import generate_cot, generate_cot_stream, generate_commands, refine_commands
+from src.slack.message_stream import SlackMessageStream
+
+COT = ["Step", "1:", "List", "the", "pods", "in", "staging\n", "Step", "2:", "Check", "their", "status"]
+
+
+class StubTokenizer:
+    """
+    Token i of the generated text is id 100 + i of `words`; the chat template is always the prompt ids 1, 2, 3,
+    which decode to `prompt`.
+    """
+
+    eos_token_id = 0
+
+    def __init__(self, words: list = COT, prompt: str = "<prompt>\n"):
+        self.words = words
+        self.prompt = prompt
+
+    def apply_chat_template(self, messages, **kwargs):
+        return torch.tensor([[1, 2, 3]])
+
+    def decode(self, ids, skip_special_tokens=False, **kwargs):
+        ids = ids.tolist() if hasattr(ids, "tolist") else list(ids)
+        words = [self.words[i - 100] for i in ids if i >= 100]
+        return (self.prompt if 1 in ids else "") + "".join(word + ("" if word.endswith("\n") else " ")
+                                                           for word in words)
+
+
+class StubModel:
+    """
+    Generates `length` tokens one every `delay` seconds, through the streamer when one is passed.
+    """
+
+    device = "cpu"
+
+    def __init__(self, delay: float, length: int = len(COT)):
+        self.delay = delay
+        self.length = length
+
+    def generate(self, inputs, streamer=None, **kwargs):
+        if streamer is not None:
+            streamer.put(inputs)
+        for i in range(self.length):
+            time.sleep(self.delay)
+            if streamer is not None:
+                streamer.put(torch.tensor([100 + i]))
+        if streamer is not None:
+            streamer.end()
+        return torch.cat([inputs, torch.arange(100, 100 + self.length).unsqueeze(0)], dim=1)
+
+
+def test_generate_cot_returns_only_the_generated_text():
+    cot = generate_cot("list the pods in staging", StubModel(0), StubTokenizer())
+    assert cot == "Step 1: List the pods in staging\nStep 2: Check their status"
+
+
+def test_commands_come_only_from_the_generated_text():
+    tokenizer = StubTokenizer(["kubectl", "get", "pods", "-n", "staging\n"],
+                              prompt="Chain-of-Thought:\nkubectl delete namespace production\n")
+    commands = generate_commands("Step 1: kubectl delete namespace production", StubModel(0, 5), tokenizer,
+                                 speculative="off")
+    assert commands == ["kubectl get pods -n staging"]
+
+
+def test_refined_commands_come_only_from_the_generated_text():
+    tokenizer = StubTokenizer(["kubectl", "scale", "deployment", "api", "--replicas=2", "-n", "staging\n"],
+                              prompt="Previously tried commands:\nkubectl scale deployment app --replicas=2\n")
+    refined = refine_commands("scale the api to 2 in staging", ["kubectl scale deployment app --replicas=2"],
+                              "error: deployments.apps \"app\" not found", StubModel(0, 7), tokenizer, speculative="off")
+    assert refined == ["kubectl scale deployment api --replicas=2 -n staging"]
+
+
+def test_streamed_cot_reaches_slack_before_generation_ends(fake_slack):
+    slack_delivery, client = fake_slack
+    model = StubModel(delay=0.05)
+    stream = SlackMessageStream(slack_delivery, "C1", header="Working on it", min_interval=0)
+
+    started = time.monotonic()
+    for text in generate_cot_stream("list the pods in staging", model, StubTokenizer()):
+        stream.update("cot", text, partial=True)
+    generated = time.monotonic() - started
+    stream.close()
+    assert slack_delivery.flush(timeout=5)
+
+    # Time to first useful text: the first partial CoT is queued after a token or two, not the whole generation
+    assert stream.time_to_first_text < generated / 2
+    assert client.calls[0][0] == "chat_postMessage" and client.calls[0][2] - started < generated / 2
+    # One message, edited in place, ends with the complete CoT
+    assert {method for method, _, _ in client.calls} <= {"chat_postMessage", "chat_update"}
+    assert sum(1 for method, _, _ in client.calls if method == "chat_postMessage") == 1
+    assert client.calls[-1][1]["text"].endswith("Step 1: List the pods in staging\nStep 2: Check their status")
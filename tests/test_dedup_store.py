@@ -0,0 +1,36 @@
+import pytest
+from src.slack.dedup_store import DedupStore, MemoryDedupStore, SQLiteDedupStore
+
+
+def test_base_store_is_abstract():
+    with pytest.raises(TypeError):
+        DedupStore()
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_claim_is_once_per_event(backend, tmp_path):
+    store = MemoryDedupStore() if backend == "memory" else SQLiteDedupStore(str(tmp_path / "dedup.db"))
+    assert store.claim("Ev1")
+    assert not store.claim("Ev1")
+    assert store.claim("Ev2")
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_released_event_can_be_claimed_again(backend, tmp_path):
+    store = MemoryDedupStore() if backend == "memory" else SQLiteDedupStore(str(tmp_path / "dedup.db"))
+    assert store.claim("Ev1")
+    store.release("Ev1")
+    assert store.claim("Ev1")
+    store.release("Ev-never-claimed")
+
+
+def test_sqlite_store_keeps_the_newest_max_size_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(SQLiteDedupStore, "PRUNE_EVERY", 10)
+    store = SQLiteDedupStore(str(tmp_path / "dedup.db"), max_size=5)
+    for i in range(20):
+        assert store.claim(f"Ev{i}")
+
+    stats = store.stats()
+    assert stats["size"] == 5 and stats["evicted"] == 15
+    assert not store.claim("Ev19")
+    assert store.claim("Ev0")
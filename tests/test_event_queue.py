@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+from src.slack.event_queue import EventQueue
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(**kwargs):
+        queue = EventQueue(**kwargs)
+        queues.append(queue)
+        return queue
+    yield make
+    for queue in queues:
+        queue.stop(timeout=5)
+
+
+def wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        EventQueue(overflow="drop-oldest")
+
+
+def test_reject_mode_refuses_jobs_beyond_max_size(make_queue):
+    queue = make_queue(workers=1, max_size=2, overflow="reject")
+    assert queue.submit("C1", lambda: None)
+    assert queue.submit("C2", lambda: None)
+    started = time.monotonic()
+    assert not queue.submit("C3", lambda: None)
+    assert time.monotonic() - started < 0.1
+    assert queue.stats()["rejected"] == 1 and queue.depth() == 2
+
+
+def test_defer_mode_waits_for_room(make_queue):
+    release = threading.Event()
+    queue = make_queue(workers=1, max_size=1, overflow="defer", defer_timeout=2)
+    queue.start()
+    queue.submit("C1", release.wait)
+    wait_for(lambda: queue.depth() == 0)
+    queue.submit("C2", lambda: None)
+
+    threading.Timer(0.2, release.set).start()
+    started = time.monotonic()
+    assert queue.submit("C3", lambda: None)
+    assert 0.1 < time.monotonic() - started < 2
+
+
+def test_defer_mode_gives_up_after_the_timeout(make_queue):
+    queue = make_queue(workers=1, max_size=1, overflow="defer", defer_timeout=0.2)
+    queue.submit("C1", lambda: None)
+    started = time.monotonic()
+    assert not queue.submit("C2", lambda: None)
+    assert time.monotonic() - started >= 0.2
+    assert queue.stats()["rejected"] == 1
+
+
+def test_jobs_of_one_key_run_in_order_and_keys_run_concurrently(make_queue):
+    queue = make_queue(workers=4, max_size=32)
+    log = []
+    lock = threading.Lock()
+
+    def job(key, i):
+        def run():
+            with lock:
+                log.append(("start", key, i, time.monotonic()))
+            time.sleep(0.1)
+            with lock:
+                log.append(("end", key, i, time.monotonic()))
+        return run
+
+    for i in range(3):
+        for key in ("C1", "C2", "C3"):
+            queue.submit(key, job(key, i))
+    started = time.monotonic()
+    queue.start()
+    wait_for(lambda: queue.stats()["completed"] == 9)
+
+    for key in ("C1", "C2", "C3"):
+        events = [(event, i, at) for event, k, i, at in log if k == key]
+        # Never two jobs of one channel at once, and in submission order
+        assert [(event, i) for event, i, _ in events] == [(e, i) for i in range(3) for e in ("start", "end")]
+    # Three channels in parallel: about 3 x 0.1s rather than 9 x 0.1s
+    assert time.monotonic() - started < 0.7
+
+
+def test_failing_job_doesnt_stop_the_worker(make_queue):
+    queue = make_queue(workers=1, max_size=4)
+    done = threading.Event()
+    queue.submit("C1", lambda: 1 / 0)
+    queue.submit("C1", done.set)
+    queue.start()
+    assert done.wait(timeout=5)
+    wait_for(lambda: queue.stats()["completed"] == 1)
+    assert queue.stats()["failed"] == 1
+
+
+def test_stopped_queue_rejects_jobs(make_queue):
+    queue = make_queue(workers=1, max_size=4)
+    queue.start()
+    queue.stop(timeout=5)
+    assert not queue.submit("C1", lambda: None)
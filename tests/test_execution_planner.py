@@ -0,0 +1,189 @@
+import time
+import pytest
+from src.commands.execution_planner import build_plan, classify_command
+from src.commands.resource_index import ResourceIndex
+from src.commands import command_executor
+from src.commands.command_executor import execute_kubectl_commands
+
+
+def dependencies(commands: list) -> list:
+    return [sorted(dependencies) for _, dependencies in build_plan(commands)]
+
+
+def test_classify_command():
+    info = classify_command("kubectl rollout restart deployment/api -n staging")
+    assert (info.verb, info.subverb, info.kind, info.name, info.namespace) == ("rollout", "restart", "deployments", "api", "staging")
+    assert info.mutating
+    assert not classify_command("kubectl rollout status deployment/api -n staging").mutating
+    assert classify_command("kubectl get pods -A").all_namespaces
+
+
+@pytest.mark.parametrize("command, kind, name", [
+    ("kubectl get pods -L app -n staging", "pods", None),
+    ("kubectl get pods --field-selector status.phase=Running", "pods", None),
+    ("kubectl get --sort-by .metadata.name pods web-0", "pods", "web-0"),
+    ("kubectl delete pods --all -n staging", "pods", None),
+    ("kubectl get pods --watch web-0", "pods", "web-0"),
+    ("kubectl label deployment api tier=web --overwrite", "deployments", "api"),
+])
+def test_unknown_flag_values_are_not_resource_names(command, kind, name):
+    info = classify_command(command)
+    assert (info.kind, info.name) == (kind, name)
+
+
+def test_selector_reads_dont_look_like_named_reads():
+    commands = ["kubectl scale deployment api --replicas=2 -n staging", "kubectl get deployments -L app -n staging"]
+    assert dependencies(commands) == [[], [0]]
+
+
+def test_independent_reads_have_no_dependencies():
+    assert dependencies(["kubectl get pods -n staging", "kubectl get svc -n staging", "kubectl get pods -n prod"]) == [[], [], []]
+
+
+def test_pod_reads_depend_on_workload_mutations():
+    commands = [
+        "kubectl scale deployment api --replicas=3 -n staging",
+        "kubectl get pods -n staging",
+        "kubectl get pods -n production",
+        "kubectl get pods",
+        "kubectl get pods -A",
+        "kubectl get services -n staging",
+    ]
+    assert dependencies(commands) == [[], [0], [], [0], [0], []]
+
+
+def test_all_namespaces_read_depends_on_namespaced_mutation():
+    assert dependencies(["kubectl rollout restart deployment/api -n staging", "kubectl get deployments -A"]) == [[], [0]]
+
+
+def test_namespace_creation_orders_commands_in_it():
+    assert dependencies(["kubectl create namespace review", "kubectl get pods -n review"]) == [[], [0]]
+
+
+def test_execution_against_fake_kubectl(fake_kubectl):
+    results = execute_kubectl_commands([
+        "kubectl scale deployment api --replicas=3 -n staging",
+        "kubectl get pods -n staging",
+        "kubectl get services -n production",
+        "kubectl get configmaps -n production",
+    ])
+    calls = fake_kubectl.calls()
+
+    assert [result.status for result in results] == ["succeeded"] * 4
+    # The pod listing waits for the scale's rollout instead of a fixed sleep
+    wait = calls["rollout status deployment/api -n staging --timeout=5s"]
+    assert calls["scale deployment api --replicas=3 -n staging"]["end"] <= wait["start"]
+    assert wait["end"] <= calls["get pods -n staging"]["start"]
+    # Independent reads run concurrently
+    services, configmaps = calls["get services -n production"], calls["get configmaps -n production"]
+    assert services["start"] < configmaps["end"] and configmaps["start"] < services["end"]
+
+
+def test_dependents_of_a_failed_command_are_skipped(fake_kubectl):
+    results = execute_kubectl_commands([
+        "kubectl scale deployment missing-app --replicas=2 -n staging",
+        "kubectl get pods -n staging",
+        "kubectl get services -n production",
+    ])
+
+    assert [result.status for result in results] == ["failed", "skipped", "succeeded"]
+
+
+def test_sequential_mode_only_waits_before_commands_that_run(fake_kubectl, monkeypatch):
+    monkeypatch.setattr(command_executor, "EXECUTION_MODE", "sequential")
+    monkeypatch.setenv("FAKE_KUBECTL_DELAY", "0")
+
+    started = time.monotonic()
+    results = execute_kubectl_commands([
+        "kubectl get services -n production",
+        "kubectl scale deployment missing-app --replicas=2 -n staging",
+        "kubectl get pods -n staging",
+        "kubectl rollout status deployment/missing-app -n staging",
+    ], delay=0.3)
+
+    assert [result.status for result in results] == ["succeeded", "failed", "skipped", "skipped"]
+    # One delay between the two commands that ran, none for the skipped ones or after the last
+    assert 0.3 <= time.monotonic() - started < 0.6
+    assert "get pods -n staging" not in fake_kubectl.calls()
+
+
+def test_stderr_error_line_with_exit_code_zero_skips_dependents(fake_kubectl, monkeypatch):
+    monkeypatch.setenv("FAKE_KUBECTL_DELAY", "0")
+    from src.commands import command_executor
+    real_run = command_executor.run_kubectl_command
+
+    def run(command, rewrite=True):
+        result = real_run(command, rewrite)
+        if "scale" in command:
+            result.stderr_error_lines.append("error: deployments.apps \"api\" not found")
+        return result
+    monkeypatch.setattr(command_executor, "run_kubectl_command", run)
+
+    results = execute_kubectl_commands(["kubectl scale deployment api --replicas=3 -n staging", "kubectl get pods -n staging"])
+
+    assert results[0].returncode == 0
+    assert [result.status for result in results] == ["failed", "skipped"]
+
+
+def test_stdout_error_lines_are_output_not_failure():
+    result = command_executor.run_kubectl_command(
+        "sh -c \"echo 'Warning  Failed  kubelet  Error: ImagePullBackOff'; echo 'level=error: retrying'\"",
+        rewrite=False)
+    assert result.success and not result.has_error
+    assert result.status == "succeeded"
+    assert len(result.error_lines) == 2
+
+
+def test_sequential_mode_runs_independent_commands_after_a_failure(fake_kubectl, monkeypatch):
+    from src.commands import command_executor
+    monkeypatch.setattr(command_executor, "EXECUTION_MODE", "sequential")
+
+    results = execute_kubectl_commands([
+        "kubectl scale deployment missing-app --replicas=2 -n staging",
+        "kubectl get pods -n staging",
+        "kubectl get services -n production",
+    ], delay=0)
+
+    assert [result.status for result in results] == ["failed", "skipped", "succeeded"]
+
+
+def test_stderr_error_lines_are_not_crowded_out_by_stdout_rows():
+    rows = "; ".join(f"echo 'pod-{i}   0/1   CrashLoopBackOff   error'" for i in range(30))
+    result = command_executor.run_kubectl_command(
+        f"sh -c \"{rows}; echo 'error: the server has asked for the client to provide credentials' >&2\"",
+        rewrite=False)
+    assert result.has_error
+    assert result.error == "error: the server has asked for the client to provide credentials"
+    assert len(result.error_lines) == command_executor.ERROR_LINE_LIMIT
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = ResourceIndex()
+    monkeypatch.setattr(command_executor, "resource_index", index)
+    monkeypatch.setattr(command_executor, "current_namespace", lambda: "team-a")
+    return index
+
+
+def test_empty_listing_clears_the_namespace(index):
+    index.add("pods", "web-0", "staging")
+    index.add("pods", "web-0", "qa")
+    # kubectl prints it on stderr, the API backend on stdout
+    parser = command_executor.ResourceNameParser("kubectl get pods -n staging")
+    parser.finish("No resources found in staging namespace.")
+    command_executor.parse_resource_names("kubectl get pods -n qa", "No resources found in qa namespace.")
+    assert index.names("pods") == []
+
+
+def test_empty_selector_listing_keeps_other_names(index):
+    index.add("pods", "web-0", "staging")
+    parser = command_executor.ResourceNameParser("kubectl get pods -n staging -l app=api")
+    parser.finish("No resources found in staging namespace.")
+    assert index.names("pods", "staging") == ["web-0"]
+
+
+def test_listings_without_a_namespace_use_the_context_namespace(index):
+    index.add("deployments", "old", "team-a")
+    command_executor.parse_resource_names("kubectl get deployments", "NAME   READY\napi    1/1\n")
+    assert index.names("deployments", "team-a") == ["api"]
+    assert index.names("deployments", "default") == []
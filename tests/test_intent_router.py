@@ -0,0 +1,64 @@
+import pytest
+from src.commands.resource_index import ResourceIndex
+from src.intent_processing.intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    index = ResourceIndex()
+    for name in ["api", "worker", "web"]:
+        index.add("deployments", name, "staging")
+    index.add("deployments", "web-canary", "qa")
+    for name in ["web-0", "worker-5c6d7-abcde"]:
+        index.add("pods", name, "staging")
+    return IntentRouter(index, threshold=0.75)
+
+
+@pytest.mark.parametrize("text, command", [
+    ("get pods in staging", "kubectl get pods -n staging"),
+    ("Can you list all the services?", "kubectl get services"),
+    ("describe pod web-0 in staging", "kubectl describe pods web-0 -n staging"),
+    ("show logs of web-0 -n staging", "kubectl logs web-0 -n staging"),
+    ("scale api to 3 replicas in staging", "kubectl scale deployment api --replicas=3 -n staging"),
+    ("restart the worker deployment in staging", "kubectl rollout restart deployment/worker -n staging"),
+    ("what is the rollout status of web in staging", "kubectl rollout status deployment/web -n staging"),
+])
+def test_templates_fill_commands(router, text, command):
+    routed = router.route(text)
+    assert routed is not None and routed.commands == [command]
+
+
+def test_read_names_are_corrected_in_the_requested_namespace(router):
+    routed = router.route("describe deployment wroker in staging")
+    assert routed.commands == ["kubectl describe deployments worker -n staging"]
+    assert routed.confidence < 1.0
+
+
+def test_unmatched_messages_go_to_the_model(router):
+    assert router.route("why is my app slow since yesterday?") is None
+    assert router.route("get pods in all namespaces") is None
+    assert router.stats()["unmatched"] == 2
+
+
+def test_low_confidence_matches_go_to_the_model(router):
+    assert router.match("describe deployment nosuchthing in staging").confidence < 0.75
+    assert router.route("describe deployment nosuchthing in staging") is None
+    assert router.stats()["low_confidence"] == 1
+    # The same match clears a lower threshold
+    router.threshold = 0.4
+    assert router.route("describe deployment nosuchthing in staging") is not None
+
+
+@pytest.mark.parametrize("text", [
+    "scale wroker to 0 in staging",         # close to a known name, but never corrected for a mutation
+    "scale web to 0 in qa",                  # not the exact name known in qa (web-canary)
+    "restart api in production",             # known in staging, not in production
+    "scale api to 3",                        # no namespace: can't tell which api would be scaled
+])
+def test_mutations_need_the_exact_name_in_the_namespace(router, text):
+    assert router.route(text) is None
+
+
+def test_reads_without_a_namespace_are_not_corrected(router):
+    routed = router.route("describe deployment wroker")
+    assert routed.commands == ["kubectl describe deployments wroker"]
@@ -0,0 +1,216 @@
+import pytest
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from src.commands import command_executor
+from datetime import datetime, timezone
+from src.commands import k8s_api
+from src.commands.k8s_api import KubernetesApiBackend, parse_command, UnsupportedCommand, _pod_status, current_namespace
+
+
+class FakeApi:
+    """
+    Stands in for CoreV1Api / AppsV1Api: records each call and answers from `responses`
+    (method -> value, or an exception to raise).
+    """
+
+    def __init__(self, responses: dict):
+        self.responses = responses
+        self.calls = []
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+            response = self.responses[method]
+            if isinstance(response, Exception):
+                raise response
+            return response
+        return call
+
+
+def pod(name: str, namespace: str = "staging") -> client.V1Pod:
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(name=name, namespace=namespace),
+        status=client.V1PodStatus(phase="Running", container_statuses=[
+            client.V1ContainerStatus(name="app", image="app", image_id="", ready=True, restart_count=2)
+        ]),
+    )
+
+
+def backend(core: dict = None, apps: dict = None) -> KubernetesApiBackend:
+    """
+    A backend with fake API objects instead of a cluster connection.
+    """
+    api = KubernetesApiBackend.__new__(KubernetesApiBackend)
+    api.api_client = client.ApiClient()
+    api.core = FakeApi(core or {})
+    api.apps = FakeApi(apps or {})
+    api.default_namespace = "default"
+    api.readiness_timeout = 5
+    api._dynamic = None
+    return api
+
+
+def test_parse_command():
+    assert parse_command("kubectl get pods -n staging -l app=web") == (["get", "pods"], {"namespace": "staging", "selector": "app=web"})
+    assert parse_command("kubectl scale deployment/api --replicas=3") == (["scale", "deployment/api"], {"replicas": "3"})
+    with pytest.raises(UnsupportedCommand):
+        parse_command("kubectl get pods --sort-by=.metadata.name")
+
+
+@pytest.mark.parametrize("command", [
+    "kubectl logs web-0 -n staging",
+    "kubectl get pods -o wide",
+    "kubectl get pods --sort-by=.status.startTime",
+    "kubectl get replicasets -n staging",
+    "kubectl rollout undo deployment/api",
+    "kubectl scale statefulset db --replicas=2",
+    "kubectl get pods | grep web",
+    "kubectl apply -f deployment.yaml",
+])
+def test_unmapped_commands_fall_back_to_kubectl(command):
+    api = backend()
+    assert api.execute(command) is None
+    assert api.core.calls == [] and api.apps.calls == []
+
+
+def test_get_pods_maps_to_namespaced_list():
+    api = backend(core={"list_namespaced_pod": client.V1PodList(items=[pod("web-0"), pod("web-1")])})
+    returncode, stdout, stderr, data = api.execute("kubectl get pods -n staging -l app=web")
+    assert api.core.calls == [("list_namespaced_pod", ("staging",), {"label_selector": "app=web"})]
+    assert returncode == 0 and stderr == ""
+    assert stdout.splitlines()[0].split() == ["NAME", "READY", "STATUS", "RESTARTS", "AGE"]
+    assert stdout.splitlines()[1].split()[:4] == ["web-0", "1/1", "Running", "2"]
+    assert [item["metadata"]["name"] for item in data] == ["web-0", "web-1"]
+
+
+def test_get_all_namespaces_adds_namespace_column():
+    api = backend(core={"list_pod_for_all_namespaces": client.V1PodList(items=[pod("web-0", "qa")])})
+    _, stdout, _, _ = api.execute("kubectl get po -A")
+    assert api.core.calls == [("list_pod_for_all_namespaces", (), {"label_selector": None})]
+    assert stdout.splitlines()[0].split()[:2] == ["NAMESPACE", "NAME"]
+    assert stdout.splitlines()[1].split()[:2] == ["qa", "web-0"]
+
+
+def test_empty_list_reads_like_kubectl():
+    api = backend(core={"list_namespaced_service": client.V1ServiceList(items=[])})
+    assert api.execute("kubectl get svc")[:2] == (0, "No resources found in default namespace.")
+
+
+def test_scale_patches_the_scale_subresource():
+    api = backend(apps={"patch_namespaced_deployment_scale": client.V1Scale(spec=client.V1ScaleSpec(replicas=3))})
+    returncode, stdout, _, data = api.execute("kubectl scale deployment api --replicas=3 -n staging")
+    assert api.apps.calls == [("patch_namespaced_deployment_scale", ("api", "staging", {"spec": {"replicas": 3}}), {})]
+    assert (returncode, stdout, data["spec"]) == (0, "deployment.apps/api scaled", {"replicas": 3})
+
+
+def test_rollout_restart_sets_the_restarted_at_annotation():
+    api = backend(apps={"patch_namespaced_deployment": client.V1ObjectMeta(name="api")})
+    returncode, stdout, _, _ = api.execute("kubectl rollout restart deployment/api")
+    method, (name, namespace, body), _ = api.apps.calls[0]
+    assert (method, name, namespace) == ("patch_namespaced_deployment", "api", "default")
+    assert "kubectl.kubernetes.io/restartedAt" in body["spec"]["template"]["metadata"]["annotations"]
+    assert (returncode, stdout) == (0, "deployment.apps/api restarted")
+
+
+def test_api_errors_read_like_kubectl_errors():
+    not_found = ApiException(status=404, reason="Not Found")
+    not_found.body = '{"message": "deployments.apps \\"api\\" not found"}'
+    api = backend(apps={"read_namespaced_deployment": not_found})
+    returncode, stdout, stderr, data = api.execute("kubectl get deployment api -n staging")
+    assert (returncode, stdout, data) == (1, "", None)
+    assert stderr == 'Error from server (Not Found): deployments.apps "api" not found'
+
+
+def test_executor_uses_the_api_backend_and_falls_back_to_kubectl(fake_kubectl, monkeypatch):
+    monkeypatch.setenv("FAKE_KUBECTL_DELAY", "0")
+    api = backend(core={"list_namespaced_pod": client.V1PodList(items=[pod("web-0")])})
+    monkeypatch.setattr(command_executor, "EXECUTION_BACKEND", "api")
+    monkeypatch.setattr(command_executor, "get_api_backend", lambda *args: api)
+
+    mapped = command_executor.run_kubectl_command("kubectl get pods -n staging", rewrite=False)
+    fallback = command_executor.run_kubectl_command("kubectl logs web-0 -n staging", rewrite=False)
+
+    assert mapped.success and mapped.data[0]["metadata"]["name"] == "web-0"
+    assert fallback.success and fallback.data is None
+    assert list(fake_kubectl.calls()) == ["logs web-0 -n staging"]
+
+
+def test_executor_uses_kubectl_without_cluster_credentials(fake_kubectl, monkeypatch):
+    monkeypatch.setenv("FAKE_KUBECTL_DELAY", "0")
+    monkeypatch.setattr(command_executor, "EXECUTION_BACKEND", "api")
+    monkeypatch.setattr(command_executor, "get_api_backend", lambda *args: None)
+
+    result = command_executor.run_kubectl_command("kubectl get pods -n staging", rewrite=False)
+
+    assert result.success and "web-0" in result.stdout
+    assert list(fake_kubectl.calls()) == ["get pods -n staging"]
+
+
+def container(ready: bool = False, **state) -> client.V1ContainerStatus:
+    return client.V1ContainerStatus(name="app", image="app", image_id="", ready=ready, restart_count=0,
+                                    state=client.V1ContainerState(**state))
+
+
+def pod_with(containers: list, phase: str = "Running", init_containers: list = None, deleted: bool = False):
+    return client.V1Pod(
+        metadata=client.V1ObjectMeta(name="web-0", deletion_timestamp=datetime.now(timezone.utc) if deleted else None),
+        status=client.V1PodStatus(phase=phase, container_statuses=containers, init_container_statuses=init_containers),
+    )
+
+
+@pytest.mark.parametrize("pod_object, expected", [
+    (pod_with([container(True, running=client.V1ContainerStateRunning())]), "Running"),
+    (pod_with([container(waiting=client.V1ContainerStateWaiting(reason="CrashLoopBackOff"))]), "CrashLoopBackOff"),
+    (pod_with([container(waiting=client.V1ContainerStateWaiting(reason="ImagePullBackOff"))], phase="Pending"), "ImagePullBackOff"),
+    (pod_with([container(terminated=client.V1ContainerStateTerminated(exit_code=0, reason="Completed"))], phase="Succeeded"), "Completed"),
+    (pod_with([container(terminated=client.V1ContainerStateTerminated(exit_code=137))], phase="Failed"), "ExitCode:137"),
+    (pod_with([container(True, running=client.V1ContainerStateRunning())], deleted=True), "Terminating"),
+    (pod_with([container(waiting=client.V1ContainerStateWaiting(reason="PodInitializing"))], phase="Pending",
+              init_containers=[container(running=client.V1ContainerStateRunning()), container()]), "Init:0/2"),
+    (pod_with([container()], phase="Pending",
+              init_containers=[container(terminated=client.V1ContainerStateTerminated(exit_code=1, reason="Error"))]), "Init:Error"),
+])
+def test_pod_status_reads_like_kubectl(pod_object, expected):
+    assert _pod_status(pod_object) == expected
+
+
+def test_only_server_side_apply_uses_the_api(tmp_path):
+    manifest = tmp_path / "namespace.yaml"
+    manifest.write_text("apiVersion: v1\nkind: Namespace\nmetadata:\n  name: review\n")
+    applied = []
+
+    class FakeDynamic:
+        class resources:
+            @staticmethod
+            def get(api_version, kind):
+                return type("Resource", (), {"namespaced": False})()
+
+        @staticmethod
+        def server_side_apply(resource, body, name, namespace, field_manager):
+            applied.append((name, namespace, field_manager))
+            return client.V1ObjectMeta(name=name)
+
+    api = backend()
+    api._dynamic = FakeDynamic
+    assert api.execute(f"kubectl apply -f {manifest}") is None
+    assert api.execute(f"kubectl apply --server-side -f {manifest}")[:2] == (0, "namespace/review serverside-applied")
+    assert applied == [("review", None, "kubectl")]
+
+
+def test_current_namespace_follows_the_kubeconfig_context(tmp_path, monkeypatch):
+    kubeconfig = tmp_path / "config"
+    kubeconfig.write_text(
+        "apiVersion: v1\nkind: Config\ncurrent-context: dev\n"
+        "clusters: [{name: c, cluster: {server: 'https://127.0.0.1'}}]\nusers: [{name: u, user: {}}]\n"
+        "contexts:\n- {name: dev, context: {cluster: c, user: u, namespace: team-a}}\n"
+        "- {name: ops, context: {cluster: c, user: u}}\n")
+    monkeypatch.setattr("kubernetes.config.kube_config.KUBE_CONFIG_DEFAULT_LOCATION", str(kubeconfig))
+    monkeypatch.setattr(k8s_api, "SERVICE_ACCOUNT_NAMESPACE", str(tmp_path / "missing"))
+    assert current_namespace() == "team-a"
+    kubeconfig.write_text(kubeconfig.read_text().replace("current-context: dev", "current-context: ops"))
+    assert current_namespace() == "default"
+    # In-cluster without a kubeconfig: the service account's namespace
+    monkeypatch.setattr("kubernetes.config.kube_config.KUBE_CONFIG_DEFAULT_LOCATION", str(tmp_path / "none"))
+    (tmp_path / "namespace").write_text("team-b")
+    monkeypatch.setattr(k8s_api, "SERVICE_ACCOUNT_NAMESPACE", str(tmp_path / "namespace"))
+    assert current_namespace() == "team-b"
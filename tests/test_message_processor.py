@@ -0,0 +1,102 @@
+import pytest
+from src.commands.resource_index import ResourceIndex
+from src.intent_processing import message_processor
+from src.intent_processing.response_cache import ResponseCache
+
+
+class StubGenerator:
+    """
+    Answers every refinement with `refined`, recording what it was asked.
+    """
+
+    def __init__(self, refined: list):
+        self.refined = refined
+        self.requests = []
+
+    def refine_commands(self, intent, previous_commands, error_message, succeeded_commands=None):
+        self.requests.append((previous_commands, succeeded_commands))
+        return self.refined
+
+
+def test_refinement_runs_skipped_commands_the_model_left_out(fake_kubectl, monkeypatch):
+    monkeypatch.setenv("FAKE_KUBECTL_DELAY", "0")
+    generator = StubGenerator(["kubectl scale deployment api --replicas=2 -n staging"])
+    monkeypatch.setattr(message_processor, "_get_generator", lambda: generator)
+    results = message_processor.execute_kubectl_commands([
+        "kubectl scale deployment missing-app --replicas=2 -n staging",
+        "kubectl get pods -n staging",
+    ])
+    assert [result.status for result in results] == ["failed", "skipped"]
+
+    updates = list(message_processor._refine("scale the app to 2 in staging", results))
+
+    assert generator.requests[0][0] == [result.command for result in results]
+    assert "get pods -n staging" in fake_kubectl.calls()
+    assert updates[-1]["stage"] == "final" and updates[-1]["message"].startswith("✅")
+
+
+class PromptRecorder:
+    """
+    Records the prompts of the two-pass generation.
+    """
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_cot_stream(self, instruction):
+        self.prompts.append(instruction)
+        yield "Step 1: List the pods of web"
+
+    def generate_cot(self, instruction):
+        self.prompts.append(instruction)
+        return "Step 1: List the pods of web"
+
+    def generate_commands(self, cot):
+        self.prompts.append(cot)
+        return ["kubectl get pods -n staging"]
+
+
+def drain(generator):
+    """
+    The return value of a generator function, discarding what it yields.
+    """
+    while True:
+        try:
+            next(generator)
+        except StopIteration as stop:
+            return stop.value
+
+
+def test_prompts_list_the_resources_the_index_knows(monkeypatch):
+    index = ResourceIndex()
+    monkeypatch.setattr(message_processor, "resource_index", index)
+    index.add("deployments", "web", "staging")
+    index.add("pods", "web-0", "staging")
+    generator = PromptRecorder()
+
+    cot, commands = drain(message_processor._generate_two_pass("show the web pods", generator))
+
+    known = "Known resources in the cluster:\ndeployments: web\npods: web-0"
+    assert generator.prompts == [f"show the web pods\n\n{known}", f"{cot}\n\n{known}"]
+    assert commands == ["kubectl get pods -n staging"]
+
+
+def test_prompts_are_unchanged_while_the_index_is_empty(monkeypatch):
+    monkeypatch.setattr(message_processor, "resource_index", ResourceIndex())
+    assert message_processor.with_known_resources("show the web pods") == "show the web pods"
+
+
+def test_cached_plans_face_the_current_policy(monkeypatch):
+    cache = ResponseCache()
+    cache.put("wipe production", "Step 1: Delete the namespace", ["kubectl delete namespace production"])
+    monkeypatch.setattr(message_processor, "response_cache", cache)
+    monkeypatch.setattr(message_processor, "intent_router", None)
+    monkeypatch.setattr(message_processor, "opa_check_commands",
+                        lambda commands: [(False, "deleting namespaces is not allowed") for _ in commands])
+    monkeypatch.setattr(message_processor, "execute_kubectl_commands",
+                        lambda *args, **kwargs: pytest.fail("a denied cached command was executed"))
+
+    updates = list(message_processor.process_slack_message("wipe production"))
+
+    assert updates[-1]["stage"] == "final" and "deleting namespaces is not allowed" in updates[-1]["message"]
+    assert cache.get("wipe production") is None
@@ -0,0 +1,53 @@
+import json
+import pytest
+from src.model import model_server
+from src.model.model_server import StubGenerator
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(model_server, "stub_generator", StubGenerator())
+    monkeypatch.setattr(model_server, "_inflight", 0)
+    return model_server.app.test_client()
+
+
+@pytest.mark.parametrize("op, body", [
+    ("cot", {}),
+    ("cot", {"instruction": 3}),
+    ("cot", {"instruction": "get pods", "temperature": 0.5}),
+    ("cot", ["get pods"]),
+    ("refine", {"intent": "get pods", "previous_commands": "kubectl get pods", "error_message": ""}),
+    ("cot_stream", {"prompt": "get pods"}),
+])
+def test_invalid_request_bodies_are_client_errors(server, op, body):
+    response = server.post(f"/generate/{op}", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["type"] == "ValidationError"
+    assert model_server._inflight == 0
+
+
+def test_errors_inside_generation_are_server_errors(server, monkeypatch):
+    def broken(cot):
+        raise TypeError("unsupported operand type(s)")
+    monkeypatch.setattr(model_server.stub_generator, "generate_commands", broken)
+    response = server.post("/generate/commands", json={"cot": "Step 1: list pods"})
+    assert response.status_code == 500
+    assert response.get_json()["type"] == "TypeError"
+    assert model_server._inflight == 0
+
+
+def test_valid_requests_are_served(server):
+    response = server.post("/generate/refine", json={"intent": "get pods", "previous_commands": ["kubectl get pod"],
+                                                     "error_message": "not found"})
+    assert response.status_code == 200 and response.get_json()["value"]
+    with server.post("/generate/cot_stream", json={"instruction": "get pods"}) as streamed:
+        lines = streamed.get_data(as_text=True).splitlines()
+    assert "Step 2" in json.loads(lines[-1])["value"]
+    assert model_server._inflight == 0
+
+
+def test_stream_closed_before_it_starts_is_no_longer_in_flight(server):
+    response = server.post("/generate/cot_stream", json={"instruction": "get pods"}, buffered=False)
+    assert model_server._inflight == 1
+    response.close()
+    assert model_server._inflight == 0
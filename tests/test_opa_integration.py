@@ -0,0 +1,76 @@
+import pytest
+from src.opa import opa_integration
+
+
+class FakeResponse:
+    def __init__(self, body: dict):
+        self.body = body
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return self.body
+
+
+class FakeOpa:
+    """
+    Answers batched decision queries from `decisions` (command -> deny list), leaving out unknown commands,
+    with the provenance of a bundle at `revision` (none when `revision` is None).
+    """
+
+    def __init__(self, decisions: dict, revision: str = "1"):
+        self.decisions = decisions
+        self.revision = revision
+        self.queries = []
+
+    def post(self, url, json, timeout):
+        commands = json["input"]["commands"]
+        self.queries.append(commands)
+        body = {"result": {cmd: self.decisions[cmd] for cmd in commands if cmd in self.decisions}}
+        if self.revision is not None:
+            body["provenance"] = {"bundles": {"k8s": {"revision": self.revision}}}
+        return FakeResponse(body)
+
+
+@pytest.fixture
+def fake_opa(monkeypatch):
+    def install(decisions: dict, revision: str = "1") -> FakeOpa:
+        opa = FakeOpa(decisions, revision)
+        monkeypatch.setattr(opa_integration, "opa_session", opa)
+        monkeypatch.setattr(opa_integration, "decision_cache", opa_integration.OrderedDict())
+        monkeypatch.setattr(opa_integration, "policy_revision", None)
+        monkeypatch.setattr(opa_integration, "revision_checked_at", 0.0)
+        return opa
+    return install
+
+
+def test_commands_without_a_decision_are_not_cached(fake_opa):
+    opa = fake_opa({"kubectl get pods": []})
+
+    commands = ["kubectl get pods", "kubectl delete ns prod"]
+    assert opa_integration.remote_check_commands(commands) == [(True, ""), (False, "OPA returned no decision for command")]
+    opa.decisions["kubectl delete ns prod"] = ["deleting namespaces is not allowed"]
+    assert opa_integration.remote_check_commands(commands) == [(True, ""), (False, "deleting namespaces is not allowed")]
+
+    assert opa.queries == [[], commands, ["kubectl delete ns prod"]]
+
+
+def test_decisions_are_not_cached_without_a_bundle_revision(fake_opa):
+    opa = fake_opa({"kubectl get pods": []}, revision=None)
+    assert opa_integration.remote_check_commands(["kubectl get pods"]) == [(True, "")]
+    # The policy is replaced through the policy API: same (empty) revision, new decision
+    opa.decisions["kubectl get pods"] = ["Listing pods is not allowed."]
+    assert opa_integration.remote_check_commands(["kubectl get pods"]) == [(False, "Listing pods is not allowed.")]
+    assert opa.queries == [[], ["kubectl get pods"], ["kubectl get pods"]]
+
+
+def test_a_new_bundle_revision_clears_the_cache(fake_opa, monkeypatch):
+    opa = fake_opa({"kubectl get pods": []})
+    assert opa_integration.remote_check_commands(["kubectl get pods"]) == [(True, "")]
+    assert opa_integration.remote_check_commands(["kubectl get pods"]) == [(True, "")]
+    opa.decisions["kubectl get pods"] = ["Listing pods is not allowed."]
+    opa.revision = "2"
+    monkeypatch.setattr(opa_integration, "revision_checked_at", 0.0)
+    assert opa_integration.remote_check_commands(["kubectl get pods"]) == [(False, "Listing pods is not allowed.")]
+    assert opa.queries == [[], ["kubectl get pods"], [], ["kubectl get pods"]]
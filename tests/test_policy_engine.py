@@ -0,0 +1,65 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import pytest
+from src.opa.policy_engine import PolicyEngine
+
+POLICY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "policy.rego")
+DELETE = "Delete commands are not allowed in this cluster."
+NO_NAMESPACE = "No namespace provided in command. Defaulting to staging is required."
+PLACEHOLDER = "Command contains placeholder values. Please replace with actual resource names."
+
+# command -> the deny set OPA returns for policy.rego (sorted, as OPA serializes sets)
+DECISIONS = {
+    "kubectl get pods": [NO_NAMESPACE],
+    "kubectl get pods -n staging": [],
+    "kubectl get pods --namespace=staging": [],
+    "kubectl get pods -A": [NO_NAMESPACE],
+    "kubectl describe deployment api --namespace=staging": [],
+    "kubectl scale deployment api --replicas=3 -n staging": [],
+    "kubectl rollout restart deployment/worker -n staging": [],
+    "kubectl create namespace review-42": [],
+    "kubectl create namespace <name>": [PLACEHOLDER],
+    "KUBECTL DELETE pod web-1 -n staging": [DELETE],
+    "kubectl delete namespace staging": [DELETE, NO_NAMESPACE],
+    "kubectl delete pod web-1": [DELETE, NO_NAMESPACE],
+    "kubectl get pods <pod-name> -n staging": [PLACEHOLDER],
+    "kubectl logs <pod>": [PLACEHOLDER, NO_NAMESPACE],
+    "kubectl apply -f deployment.yaml": [NO_NAMESPACE],
+    "kubectl get deployments -nstaging": [NO_NAMESPACE],
+    "kubectl get events --namespace=": [],
+    "kubectl logs web-0 -n": [NO_NAMESPACE],
+}
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return PolicyEngine.from_file(POLICY)
+
+
+def test_every_deny_rule_of_the_policy_is_loaded(engine):
+    with open(POLICY) as f:
+        source = f.read()
+    assert len(engine.rules) == len(re.findall(r"^deny\s+contains", source, re.MULTILINE))
+    assert engine.default_allow
+
+
+@pytest.mark.parametrize("command, deny_list", DECISIONS.items())
+def test_local_decisions_match_opa(engine, command, deny_list):
+    assert engine.evaluate(command) == (not deny_list, "; ".join(deny_list))
+
+
+def test_unsupported_rule_statements_are_rejected():
+    with pytest.raises(ValueError):
+        PolicyEngine.from_source('deny contains msg if {\n    input.user == "admin"\n    msg := "no admins"\n}\n')
+
+
+@pytest.mark.skipif(shutil.which("opa") is None, reason="opa binary not installed")
+@pytest.mark.parametrize("command", DECISIONS)
+def test_decisions_match_the_opa_binary(engine, command):
+    result = subprocess.run(["opa", "eval", "--format", "json", "--stdin-input", "-d", POLICY, "data.k8s.allow.deny"],
+                            input=json.dumps({"command": command}), capture_output=True, text=True, check=True)
+    deny_list = json.loads(result.stdout)["result"][0]["expressions"][0]["value"]
+    assert engine.deny(command) == sorted(deny_list)
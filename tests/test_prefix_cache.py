@@ -0,0 +1,76 @@
+import pytest
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from src.commands.command_generation import _cot_messages
+from src.model.prefix_cache import PrefixCache
+
+VOCAB_SIZE = 128
+
+
+class CharTokenizer:
+    """
+    One token per character of a "<role>content" rendering, so a system message's ids are a prefix
+    of any prompt starting with it.
+    """
+
+    eos_token_id = 0
+
+    def apply_chat_template(self, messages, return_tensors=None, add_generation_prompt=False, **kwargs):
+        text = "".join(f"<{message['role']}>{message['content']}" for message in messages)
+        if add_generation_prompt:
+            text += "<assistant>"
+        return torch.tensor([[1 + ord(c) % (VOCAB_SIZE - 1) for c in text]])
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    torch.manual_seed(0)
+    # Larger random weights than the default, so the output depends on the whole prompt
+    config = LlamaConfig(vocab_size=VOCAB_SIZE, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=4096,
+                         initializer_range=0.5)
+    return LlamaForCausalLM(config).eval()
+
+
+@pytest.mark.parametrize("intent", [
+    "List the pods in the staging namespace",
+    "Scale the api deployment to 3 replicas in staging",
+])
+def test_greedy_output_is_identical_with_the_prefix_cache(tiny_model, intent):
+    tokenizer = CharTokenizer()
+    cache = PrefixCache(tiny_model, tokenizer)
+    messages = _cot_messages(intent)
+    inputs = tokenizer.apply_chat_template(messages, return_tensors="pt", add_generation_prompt=True)
+    greedy = dict(max_new_tokens=16, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+
+    with torch.no_grad():
+        expected = tiny_model.generate(inputs, **greedy)
+        cached_kwargs = cache.generation_kwargs(messages[0], inputs)
+        actual = tiny_model.generate(inputs, **greedy, **cached_kwargs)
+
+    assert "past_key_values" in cached_kwargs and cache.stats()["hits"] == 1
+    assert actual.tolist() == expected.tolist()
+
+
+def test_a_wrong_prefix_changes_the_output(tiny_model):
+    """
+    The parity check above can fail: greedy output does depend on the cached key/values.
+    """
+    tokenizer = CharTokenizer()
+    messages = _cot_messages("List the pods in the staging namespace")
+    inputs = tokenizer.apply_chat_template(messages, return_tensors="pt", add_generation_prompt=True)
+    cached_kwargs = PrefixCache(tiny_model, tokenizer).generation_kwargs(messages[0], inputs)
+    for layer in cached_kwargs["past_key_values"].layers:
+        layer.values.mul_(-1)
+    greedy = dict(max_new_tokens=16, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+
+    with torch.no_grad():
+        assert tiny_model.generate(inputs, **greedy, **cached_kwargs).tolist() != tiny_model.generate(inputs, **greedy).tolist()
+
+
+def test_prompts_not_starting_with_the_prefix_run_uncached(tiny_model):
+    tokenizer = CharTokenizer()
+    cache = PrefixCache(tiny_model, tokenizer)
+    inputs = tokenizer.apply_chat_template([{"role": "user", "content": "get pods"}], add_generation_prompt=True)
+    assert cache.generation_kwargs(_cot_messages("get pods")[0], inputs) == {}
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,122 @@
+import time
+from types import SimpleNamespace
+import pytest
+from slack.errors import SlackApiError
+from src.slack.slack_delivery import TokenBucket, _pages
+
+
+def test_file_goes_through_the_external_upload_flow(fake_slack):
+    slack_delivery, client = fake_slack
+    thread = slack_delivery.post("C1", "header")
+    slack_delivery.upload("C1", {"filename": "pods.txt", "title": "get pods", "content": "pod-0\n"}, thread)
+    assert slack_delivery.flush(timeout=5)
+
+    methods = [method for method, _, _ in client.calls]
+    assert methods == ["chat_postMessage", "files.getUploadURLExternal", "upload_url", "files.completeUploadExternal"]
+    assert client.calls[1][1]["params"] == {"filename": "pods.txt", "length": 6}
+    assert client.calls[2][1]["data"] == b"pod-0\n"
+    assert client.calls[3][1]["json"] == {"files": [{"id": "F1", "title": "get pods"}], "channel_id": "C1", "thread_ts": "1"}
+
+
+@pytest.mark.parametrize("content", [
+    "abc\n" + "x" * 25 + "\nend\n",
+    "".join(f"pod-{i}   Running\n" for i in range(50)),
+    "x" * 30,
+    "no trailing newline\nlast",
+])
+def test_pages_join_back_into_the_content(content):
+    pages = _pages(content, 10)
+    assert "".join(pages) == content
+    assert all(0 < len(page) <= 10 for page in pages)
+
+
+def test_empty_content_has_no_pages():
+    assert _pages("", 10) == []
+
+
+def slack_error(status: int, headers: dict = None) -> SlackApiError:
+    return SlackApiError(f"HTTP {status}", SimpleNamespace(status_code=status, headers=headers or {}, data={}))
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = time.monotonic()
+    bucket.take(now)
+    bucket.take(now)
+    assert bucket.delay(now) == pytest.approx(0.1)
+    assert bucket.delay(now + 0.1) == 0
+    bucket.pause(5)
+    assert bucket.delay(time.monotonic()) > 4.9
+
+
+def test_calls_to_one_channel_are_paced_by_its_bucket(fake_slack):
+    slack_delivery, client = fake_slack
+    slack_delivery.rate, slack_delivery.burst = 10, 2
+    started = time.monotonic()
+    for i in range(6):
+        slack_delivery.post("C1", f"message {i}")
+    slack_delivery.post("C2", "other channel")
+    assert slack_delivery.flush(timeout=5)
+
+    times = {kwargs["text"]: at - started for _, kwargs, at in client.calls}
+    # Two right away, then one per 1/rate seconds
+    assert times["message 1"] < 0.05
+    assert times["message 5"] >= 0.35
+    # Messages to one channel go out in order, other channels aren't held up
+    assert [kwargs["text"] for _, kwargs, _ in client.calls if kwargs["channel"] == "C1"] == [f"message {i}" for i in range(6)]
+    assert times["other channel"] < 0.05
+
+
+def test_rate_limited_calls_wait_for_retry_after(fake_slack):
+    slack_delivery, client = fake_slack
+    client.fail("chat_postMessage", slack_error(429, {"Retry-After": "0.3"}))
+    started = time.monotonic()
+    message = slack_delivery.post("C1", "hello")
+
+    assert message.wait(timeout=5) is not None
+    first, retry = [at - started for _, _, at in client.calls]
+    assert retry - first >= 0.3
+    assert slack_delivery.stats()["rate_limited"] == 1 and slack_delivery.stats()["retried"] == 1
+
+
+def test_server_errors_and_dropped_connections_are_retried(fake_slack):
+    slack_delivery, client = fake_slack
+    client.fail("chat_postMessage", slack_error(503), ConnectionResetError("reset by peer"))
+    message = slack_delivery.post("C1", "hello")
+
+    assert message.wait(timeout=5) is not None and not message.failed
+    assert len(client.calls) == 3
+    assert slack_delivery.stats()["retried"] == 2
+
+
+def test_client_errors_and_exhausted_retries_fail_the_call(fake_slack):
+    slack_delivery, client = fake_slack
+    client.fail("chat_postMessage", slack_error(404), *[slack_error(500)] * 4)
+    rejected = slack_delivery.post("C1", "to a missing channel")
+    assert slack_delivery.flush(timeout=5)
+    failing = slack_delivery.post("C2", "to a broken Slack")
+    assert slack_delivery.flush(timeout=5)
+
+    assert rejected.failed and failing.failed
+    # The 404 once, the 500 on the first try and max_retries (3) retries
+    assert len(client.calls) == 1 + 4
+    assert slack_delivery.stats()["failed"] == 2
+
+
+def test_edits_queued_behind_one_another_are_merged(fake_slack):
+    slack_delivery, client = fake_slack
+    client.delay = 0.2
+    message = slack_delivery.post("C1", "step 1")
+    # Edits made while the post is queued or in flight: at most one edit waits, the rest merge into it
+    for i in range(2, 7):
+        slack_delivery.update(message, f"step {i}")
+    assert slack_delivery.flush(timeout=5)
+
+    sent = [kwargs["text"] for _, kwargs, _ in client.calls]
+    assert len(sent) <= 2 and sent[-1] == "step 6"
+    assert slack_delivery.stats()["coalesced"] >= 4
+
+    # Once sent, an edit to the same text makes no call
+    slack_delivery.update(message, "step 6")
+    assert slack_delivery.flush(timeout=5)
+    assert len(client.calls) == len(sent)
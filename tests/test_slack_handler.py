@@ -0,0 +1,26 @@
+from src.slack import slack_handler
+from src.slack.dedup_store import MemoryDedupStore
+from src.slack.event_queue import EventQueue
+
+
+def message_event(event_id: str) -> dict:
+    return {"event_id": event_id, "event": {"user": "U1", "channel": "C1", "text": "get pods in staging"}}
+
+
+def test_event_rejected_by_a_full_queue_is_processed_on_retry(monkeypatch):
+    posted = []
+    monkeypatch.setattr(slack_handler, "dedup_store", MemoryDedupStore())
+    monkeypatch.setattr(slack_handler, "event_queue", EventQueue(workers=1, max_size=0, overflow="reject"))
+    monkeypatch.setattr(slack_handler.slack_delivery, "post", lambda channel, text, **kwargs: posted.append(text))
+
+    slack_handler.handle_message_event(message_event("Ev1"))
+    assert "busy" in posted[0]
+
+    # Slack's retry of the rejected event is not a duplicate
+    monkeypatch.setattr(slack_handler, "event_queue", EventQueue(workers=1, max_size=4))
+    slack_handler.handle_message_event(message_event("Ev1"))
+    assert slack_handler.event_queue.depth() == 1
+
+    # A retry of an accepted event is
+    slack_handler.handle_message_event(message_event("Ev1"))
+    assert slack_handler.event_queue.depth() == 1